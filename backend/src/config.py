@@ -1,9 +1,11 @@
 """
 Модуль конфигурации проекта.
 Использует pydantic-settings для загрузки настроек из переменных окружения (.env).
-Содержит класс Settings с параметрами подключения к PostgreSQL.
+Содержит класс Settings с параметрами подключения к PostgreSQL
+(синхронный и асинхронный движки).
 """
 
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,12 +20,43 @@ class Settings(BaseSettings):
     DB_PASS: str
     DB_NAME: str
 
+    # пул асинхронного движка (asyncpg): горячие пути WS-приёма и ML
+    DB_ASYNC_POOL_SIZE: int = 20
+    DB_ASYNC_MAX_OVERFLOW: int = 20
+    DB_ASYNC_POOL_TIMEOUT: float = 10.0
+
+    # секретный ключ HMAC для отпечатка WS-токена (поиск записи по индексу);
+    # обязателен: без ключа отпечаток — публичный хэш токена.
+    WS_TOKEN_FINGERPRINT_KEY: str
+    # прежние ключи через запятую (ротация): токен с отпечатком старого ключа
+    # находится по индексу и получает отпечаток текущего ключа
+    WS_TOKEN_FINGERPRINT_OLD_KEYS: str = ""
+
+    @field_validator("WS_TOKEN_FINGERPRINT_KEY")
+    @classmethod
+    def _fingerprint_key_is_set(cls, value: str) -> str:
+        if len(value) < 16:
+            raise ValueError("WS_TOKEN_FINGERPRINT_KEY must be a secret of at least 16 characters")
+        return value
+
+    @property
+    def ws_token_fingerprint_old_keys(self) -> list:
+        """Прежние ключи отпечатка WS-токенов (WS_TOKEN_FINGERPRINT_OLD_KEYS)."""
+        return [k.strip() for k in self.WS_TOKEN_FINGERPRINT_OLD_KEYS.split(",") if k.strip()]
+
     @property
     def DATABASE_URL_pg(self) -> str:
         """
         Формирует строку подключения к PostgreSQL для SQLAlchemy.
         """
         return f"postgresql://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
+    @property
+    def DATABASE_URL_asyncpg(self) -> str:
+        """
+        Строка подключения для асинхронного движка (драйвер asyncpg).
+        """
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
     # Конфигурация pydantic-settings
     model_config = SettingsConfigDict(env_file=".env")
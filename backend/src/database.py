@@ -3,12 +3,15 @@
 Здесь создаются:
 - sync_engine: движок для синхронных подключений,
 - session_factory: фабрика сессий,
+- async_engine / async_session_factory: асинхронный движок (asyncpg) со своим
+  пулом для горячих путей (приём сигналов, окно, предсказания),
 - BaseModel: абстрактный базовый класс для ORM-моделей,
 """
 
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from src.config import settings
 
@@ -27,6 +30,22 @@ session_factory = sessionmaker(
     autocommit=False,
 )
 
+# Асинхронный движок: соединения asyncpg без пула потоков,
+# отдельный пул от синхронного движка
+async_engine = create_async_engine(
+    url=settings.DATABASE_URL_asyncpg,
+    pool_size=settings.DB_ASYNC_POOL_SIZE,
+    max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+    pool_timeout=settings.DB_ASYNC_POOL_TIMEOUT,
+)
+
+# Фабрика асинхронных сессий; объекты остаются доступными после commit
+async_session_factory = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # Декларативная база для ORM-моделей
 Base = declarative_base()
 
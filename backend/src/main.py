@@ -8,6 +8,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.routers import auth, users, patients, cases, stream, predictions, sim, ws, ws_token, bridge, demo_upload, health
 from src.queries.sync_orm import SyncOrm
+from src.services.ingest_buffer import raw_ingest
+from src.database import async_engine
+from src.services.ml_client import ml_client
+from src.services.ws_manager import manager
+from src.services.retention import storage_maintenance
 
 app = FastAPI(title="Backend", version="1.0.0")
 app.add_middleware(
@@ -19,8 +24,20 @@ app.add_middleware(
 )
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     SyncOrm.create_tables()
+    # секции raw_signals должны существовать до первой вставки
+    storage_maintenance.run_once()
+    storage_maintenance.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # дописать в БД сырые отсчёты, оставшиеся в очереди записи
+    await raw_ingest.stop()
+    await storage_maintenance.stop()
+    await ml_client.close()
+    await manager.stop()
+    await async_engine.dispose()
 
 # AUTH (регистрация / логин):
 #   POST   /auth/register        -> регистрация нового пользователя
@@ -1,21 +1,24 @@
 """
 SQLAlchemy ORM-модели для работы с основной БД.
-Содержит описание всех сущностей: User, Patient, Case, RawSignal, Prediction
+Содержит описание всех сущностей: User, Patient, Case, RawSignal, RawChunk, Prediction
 и связи между ними (1→N, N→1). Наследуются от BaseModel из database.py.
 """
 
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     DateTime,
     ForeignKey,
     Text,
     Float,
+    LargeBinary,
     func,
     UniqueConstraint,
     Index
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from src.database import BaseModel
 
@@ -73,6 +76,9 @@ class Case(BaseModel):
     id = Column(Integer, primary_key=True, index=True)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # политика сохранения признаков ML ({"mode", "every_n", "keys"});
+    # NULL — политика развёртывания (services.feature_policy)
+    feature_policy = Column(JSONB(none_as_null=True), nullable=True)
 
     # внешний ключ: к какому пациенту относится обследование
     patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
@@ -98,8 +104,10 @@ class RawSignal(BaseModel):
     """
     __tablename__ = "raw_signals"
 
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # таблица секционирована по времени (RANGE по timestamp), поэтому
+    # timestamp входит в первичный ключ; секции ведёт services.retention
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())
     bpm = Column(Float, nullable=False)
     uc = Column(Float, nullable=False)
 
@@ -107,59 +115,73 @@ class RawSignal(BaseModel):
     case_id = Column(Integer, ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
     case = relationship("Case", back_populates="raw_signals")
 
+    __table_args__ = (
+        # окно и история: WHERE case_id = ? ORDER BY timestamp DESC
+        Index("ix_raw_signals_case_ts", "case_id", "timestamp"),
+        # диапазонные сканы по времени (retention, выгрузки) — компактный BRIN
+        Index("brin_raw_signals_ts", "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+class RawChunk(BaseModel):
+    """
+    Сырые данные, упакованные чанком: отсчёты одного обследования
+    за RAW_CHUNK_SECONDS секунд в одной строке (RAW_STORAGE=chunks).
+    Формат data — см. services.raw_chunks.
+    """
+    __tablename__ = "raw_chunks"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    case_id = Column(Integer, ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
+    start_ts = Column(DateTime(timezone=True), nullable=False)  # время первого отсчёта
+    end_ts = Column(DateTime(timezone=True), nullable=False)    # время последнего отсчёта
+    n_samples = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        # окно: последние чанки обследования (ORDER BY end_ts DESC LIMIT)
+        Index("ix_raw_chunks_case_end", "case_id", "end_ts"),
+        # история и выгрузка: чанки по порядку
+        Index("ix_raw_chunks_case_start", "case_id", "start_ts"),
+        Index("brin_raw_chunks_end", "end_ts", postgresql_using="brin"),
+    )
+
 
 class Prediction(BaseModel):
     __tablename__ = "predictions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # как raw_signals: секции по created_at, created_at входит в первичный ключ
+    id = Column(BigInteger, primary_key=True, autoincrement=True, index=True)
     model_name = Column(String, nullable=False)
     probability = Column(Float, nullable=False)  # вероятность (0..1)
     label = Column(Integer, nullable=False)      # метка (например, 0/1)
     alert = Column(Integer, nullable=False, default=0)  # тревога (0/1)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())
 
     case_id = Column(Integer, ForeignKey("cases.id", ondelete="CASCADE"), nullable=False)
     case = relationship("Case", back_populates="predictions")
 
-    features = relationship(
-        "PredictionFeature",
-        back_populates="prediction",
-        cascade="all, delete-orphan",
-        passive_deletes=True,
-    )
-
-
-class PredictionFeature(BaseModel):
-    """
-    Одна строка = один признак конкретного предсказания.
-    """
-    __tablename__ = "prediction_features"
-
-    id = Column(Integer, primary_key=True)
-    prediction_id = Column(
-        Integer,
-        ForeignKey("predictions.id", ondelete="CASCADE"),
-        nullable=False,
-        index=True,
-    )
-    key = Column(String, nullable=False)     # имя признака
-    value = Column(Float, nullable=True)     # значение признака (None, если NaN/inf)
-
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-
-    prediction = relationship("Prediction", back_populates="features")
+    # признаки модели одним JSONB {имя: значение} в той же строке
+    # (ранее — строка prediction_features на каждый признак);
+    # отдельные признаки извлекаются по запросу: features -> 'имя'
+    features = Column(JSONB(none_as_null=True), nullable=True)
 
     __table_args__ = (
-        UniqueConstraint("prediction_id", "key", name="uq_predfeature_pred_key"),
-        Index("ix_predfeature_key", "key"),
+        Index("ix_predictions_case_created", "case_id", "created_at"),
+        Index("brin_predictions_created", "created_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
+
 class WSToken(BaseModel):
     __tablename__ = "ws_static_tokens"
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
     case_id = Column(Integer, ForeignKey("cases.id"), index=True, nullable=False)
     token_hash = Column(String(128), nullable=False)
+    # HMAC-SHA256 токена: индексированный поиск записи без перебора bcrypt-хэшей
+    token_fingerprint = Column(String(64))
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     last_seen_at = Column(DateTime(timezone=True))
     revoked_at = Column(DateTime(timezone=True))
@@ -167,4 +189,5 @@ class WSToken(BaseModel):
     __table_args__ = (
         UniqueConstraint("user_id", "case_id", name="uq_ws_static_token_user_case"),
         Index("ix_ws_static_token_hash", "token_hash"),
+        Index("ux_ws_static_token_fingerprint", "token_fingerprint", unique=True),
     )
\ No newline at end of file
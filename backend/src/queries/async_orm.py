@@ -1,17 +1,27 @@
 """
-AsyncOrm — минимальная асинхронная обёртка над SyncOrm.
-Нужна для вызова тяжёлых синхронных операций (insert_signal, get_window, insert_prediction)
-из асинхронных контекстов FastAPI без блокировки event loop.
+AsyncOrm — асинхронный доступ к БД для горячих путей онлайна:
+приём сырых сигналов, чтение окна, запись предсказаний.
 
-Реализовано через asyncio.to_thread: каждая операция выполняется
-в пуле потоков, что предотвращает "фриз" основного цикла.
+Работает на асинхронном движке SQLAlchemy (asyncpg, src.database.async_engine)
+со своим пулом соединений: запросы не занимают потоки пула исполнителя
+и соединения синхронного движка, event loop не блокируется.
+Остальные (редкие) операции остаются в SyncOrm.
 """
 
-import asyncio
 from datetime import datetime
 from typing import List, Optional, Dict
-from src.queries.sync_orm import SyncOrm
+
+from sqlalchemy import delete, select, insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+
+from src.database import async_session_factory
 from src import models
+from src.queries.sync_orm import clean_features, last_chunks_stmt
+from src.services.raw_chunks import decode_chunk, last_samples
+
+# колонки строки raw_chunks (служебные ключи снимков ingest_buffer не пишутся)
+CHUNK_COLUMNS = ("id", "case_id", "start_ts", "end_ts", "n_samples", "data")
 
 
 class AsyncOrm:
@@ -23,18 +33,150 @@ class AsyncOrm:
         """
         Асинхронная вставка одной секунды данных от датчика.
         """
-        return await asyncio.to_thread(SyncOrm.insert_raw_signal, case_id, timestamp, bpm, uc)
+        async with async_session_factory() as session:
+            stmt = (
+                insert(models.RawSignal)
+                .values(case_id=case_id, timestamp=timestamp, bpm=bpm, uc=uc)
+                .returning(models.RawSignal)
+            )
+            try:
+                record = (await session.scalars(stmt)).one()
+                await session.commit()
+            except SQLAlchemyError:
+                await session.rollback()
+                raise
+            return record
+
+    @staticmethod
+    async def insert_signals(rows: List[Dict]) -> int:
+        """
+        Асинхронная пакетная вставка сырых данных (см. services.ingest_buffer).
+        rows: словари с ключами case_id, timestamp, bpm, uc.
+
+        Поведение как у SyncOrm.insert_raw_signals: если пакет отвергнут
+        из-за данных, строки вставляются по одной в savepoint'ах,
+        некорректные пропускаются. Возвращает число вставленных строк.
+        """
+        return await AsyncOrm._insert_many(insert(models.RawSignal), rows)
 
     @staticmethod
-    async def get_window(case_id: int, limit: int = 300) -> List[models.RawSignal]:
+    async def insert_chunks(chunks: List[Dict]) -> int:
+        """
+        Пакетная запись чанков raw_chunks (RAW_STORAGE=chunks), только INSERT.
+        chunks: словари из ChunkBuilder.seal()/segment() с назначенным id
+        (next_chunk_ids); ключ replaces — id сегментов, которые закрытый чанк
+        заменяет: они удаляются в той же транзакции. Повторная запись того же
+        id (повтор после сбоя) пропускается. Возвращает число записанных чанков.
+        """
+        replaces = [i for c in chunks for i in c.get("replaces", ())]
+        rows = [{k: c[k] for k in CHUNK_COLUMNS} for c in chunks]
+        stmt = pg_insert(models.RawChunk).on_conflict_do_nothing(index_elements=[models.RawChunk.id])
+        after = delete(models.RawChunk).where(models.RawChunk.id.in_(replaces)) if replaces else None
+        return await AsyncOrm._insert_many(stmt, rows, after)
+
+    @staticmethod
+    async def next_chunk_ids(n: int) -> List[int]:
+        """n новых id raw_chunks из последовательности таблицы."""
+        if n <= 0:
+            return []
+        async with async_session_factory() as session:
+            res = await session.execute(
+                text("SELECT nextval(pg_get_serial_sequence('raw_chunks', 'id')) FROM generate_series(1, :n)"),
+                {"n": n},
+            )
+            return list(res.scalars())
+
+    @staticmethod
+    async def _insert_many(stmt, rows: List[Dict], after=None) -> int:
+        """Пакетная вставка rows; after — запрос, выполняемый в той же транзакции."""
+        if not rows:
+            return 0
+        async with async_session_factory() as session:
+            try:
+                await session.execute(stmt, rows)
+                if after is not None:
+                    await session.execute(after)
+                await session.commit()
+                return len(rows)
+            except (IntegrityError, DataError):
+                await session.rollback()
+            except SQLAlchemyError:
+                await session.rollback()
+                raise
+
+            inserted = 0
+            try:
+                for row in rows:
+                    try:
+                        async with session.begin_nested():
+                            await session.execute(stmt, [row])
+                        inserted += 1
+                    except (IntegrityError, DataError):
+                        pass
+                if after is not None:
+                    await session.execute(after)
+                await session.commit()
+            except SQLAlchemyError:
+                await session.rollback()
+                raise
+        return inserted
+
+    @staticmethod
+    async def get_window(case_id: int, limit: int = 300) -> List:
         """
         Получить последние N сигналов (по умолчанию окно в 5 минут при fs=1 Гц).
+        Результат возвращается в хронологическом порядке: строки raw_signals
+        и отсчёты, распакованные из raw_chunks (RawSample).
         """
-        return await asyncio.to_thread(SyncOrm.get_raw_signals, case_id, limit)
+        async with async_session_factory() as session:
+            stmt = (
+                select(models.RawSignal)
+                .where(models.RawSignal.case_id == case_id)
+                .order_by(models.RawSignal.timestamp.desc())
+                .limit(limit)
+            )
+            rows = (await session.scalars(stmt)).all()
+            chunks = (await session.execute(last_chunks_stmt(case_id, limit))).all()
+        samples = [s for c in chunks for s in decode_chunk(case_id, c.start_ts, c.n_samples, c.data)]
+        return last_samples(rows, samples, limit)
+
+    # =============================
+    #           CASE
+    # =============================
+    @staticmethod
+    async def get_case_feature_policy(case_id: int) -> Optional[Dict]:
+        """Политика сохранения признаков обследования (None — по умолчанию)."""
+        async with async_session_factory() as session:
+            stmt = select(models.Case.feature_policy).where(models.Case.id == case_id)
+            return (await session.execute(stmt)).scalar_one_or_none()
 
     # =============================
     #        PREDICTIONS
     # =============================
     @staticmethod
     async def insert_prediction(case_id: int, model_name: str, probability: float, label: int, alert: bool, features: Optional[Dict[str, Optional[float]]] = None, ) -> models.Prediction:
-        return await asyncio.to_thread(SyncOrm.insert_prediction, case_id, model_name, probability, label, int(alert), features or {})
\ No newline at end of file
+        """
+        Вставляет предсказание вместе с признаками (JSONB) одним INSERT.
+        Предсказание возвращается сразу из INSERT ... RETURNING (вместе
+        с created_at).
+        """
+        async with async_session_factory() as session:
+            stmt = (
+                insert(models.Prediction)
+                .values(
+                    case_id=case_id,
+                    model_name=model_name,
+                    probability=probability,
+                    label=label,
+                    alert=int(alert),
+                    features=clean_features(features),
+                )
+                .returning(models.Prediction)
+            )
+            try:
+                pred = (await session.scalars(stmt)).one()
+                await session.commit()
+            except SQLAlchemyError:
+                await session.rollback()
+                raise
+            return pred
@@ -5,35 +5,313 @@ Cинхронный слой работы с БД.
 Использует session_factory для управления сессиями и SQLAlchemy ORM.
 """
 
-from typing import Optional, List, Dict
-from datetime import datetime, timezone
-
+from typing import Iterator, Optional, List, Dict, Tuple
+from datetime import datetime, timezone, timedelta
+
+import hashlib
+import heapq
+import hmac
+import math
+import re
 import secrets
-from sqlalchemy import select, inspect, and_, update
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from sqlalchemy.orm import joinedload
+from contextlib import contextmanager
+from operator import itemgetter
+from sqlalchemy import select, insert, inspect, and_, update, text, func, null, tuple_
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import set_committed_value
 from passlib.context import CryptContext
 
+from src.config import settings
 from src.database import Base, sync_engine, session_factory
 from src import models
+from src.services.raw_chunks import decode_chunk, decode_chunk_columns, last_samples
 
 WS_TOKEN_BYTES = 32 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Идемпотентные изменения схемы для БД, созданных до появления колонок/индексов
+# (create_all не меняет существующие таблицы)
+SCHEMA_UPGRADES = [
+    "ALTER TABLE ws_static_tokens ADD COLUMN IF NOT EXISTS token_fingerprint VARCHAR(64)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_ws_static_token_fingerprint ON ws_static_tokens (token_fingerprint)",
+    "CREATE INDEX IF NOT EXISTS ix_raw_signals_case_ts ON raw_signals (case_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS brin_raw_signals_ts ON raw_signals USING brin (timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_predictions_case_created ON predictions (case_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS brin_predictions_created ON predictions USING brin (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_raw_chunks_case_end ON raw_chunks (case_id, end_ts)",
+    # признаки — JSONB в строке предсказания; старые строки prediction_features
+    # переносятся один раз: после переноса таблица переименовывается
+    # в prediction_features_migrated (её можно удалить вручную), и при следующих
+    # запусках блок ничего не делает
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS features JSONB",
+    "ALTER TABLE cases ADD COLUMN IF NOT EXISTS feature_policy JSONB",
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('prediction_features') IS NOT NULL THEN
+            UPDATE predictions p SET features = f.obj
+            FROM (
+                SELECT prediction_id, jsonb_object_agg(key, value) AS obj
+                FROM prediction_features GROUP BY prediction_id
+            ) f
+            WHERE p.id = f.prediction_id AND p.features IS NULL;
+            DROP INDEX IF EXISTS ix_predfeature_key;
+            ALTER TABLE prediction_features RENAME TO prediction_features_migrated;
+        END IF;
+    END $$
+    """,
+]
+
+# начало отсчёта границ секций (понедельник): секции одной длины
+# всегда получают одинаковые границы, сколько бы раз их ни создавали
+PARTITION_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+_PARTITION_BY_RE = re.compile(r"RANGE \((\w+)\)")
+
+# ключ pg_advisory_lock для DDL схемы и секций: воркеры uvicorn
+# выполняют create_tables и обслуживание хранения по очереди
+SCHEMA_LOCK_KEY = 0x4C445420
+
+
+def partition_column(table: str) -> str:
+    """Колонка ключа секционирования таблицы по модели (postgresql_partition_by)."""
+    spec = Base.metadata.tables[table].dialect_options["postgresql"]["partition_by"]
+    return _PARTITION_BY_RE.fullmatch(spec).group(1)
+
+
+def _parse_bound(value: str) -> datetime:
+    """Граница секции из pg_get_expr: '2026-10-12 00:00:00+00'."""
+    if re.search(r"[+-]\d\d$", value):
+        value += ":00"
+    return datetime.fromisoformat(value)
+
+
+def clean_features(features: Optional[Dict]) -> Optional[Dict[str, Optional[float]]]:
+    """Признаки для JSONB: ключи — строки, NaN/inf — None (в JSON их нет)."""
+    if not features:
+        return None
+    out = {}
+    for k, v in features.items():
+        v = None if v is None else float(v)
+        out[str(k)] = v if v is None or math.isfinite(v) else None
+    return out
+
+
+def features_expr(feature_keys: Optional[List[str]]):
+    """
+    Колонка признаков предсказания: весь JSONB (None), только указанные
+    ключи — собираются в БД, без чтения документа клиентом ([...]) —
+    или ничего ([]).
+    """
+    features = models.Prediction.features
+    if feature_keys is None:
+        return features
+    if not feature_keys:
+        return null()
+    return func.jsonb_build_object(*[x for k in feature_keys for x in (k, features[k])])
+
+
+def last_chunks_stmt(case_id: int, limit: int):
+    """
+    Последние чанки обследования, в которых лежат его последние limit
+    отсчётов: чанки берутся от новых к старым, пока не наберётся limit.
+    В чанке хотя бы один отсчёт, поэтому больше limit чанков не нужно:
+    чтение ограничено ORDER BY end_ts DESC LIMIT по ix_raw_chunks_case_end.
+    """
+    chunk = models.RawChunk
+    recent = (
+        select(chunk.id, chunk.end_ts, chunk.n_samples)
+        .where(chunk.case_id == case_id)
+        .order_by(chunk.end_ts.desc(), chunk.id.desc())
+        .limit(limit)
+        .subquery()
+    )
+    before = func.coalesce(
+        func.sum(recent.c.n_samples).over(
+            order_by=(recent.c.end_ts.desc(), recent.c.id.desc()),
+            rows=(None, -1),
+        ),
+        0,
+    )
+    picked = select(recent.c.id, before.label("before")).subquery()
+    return (
+        select(chunk.start_ts, chunk.n_samples, chunk.data)
+        .join(picked, picked.c.id == chunk.id)
+        .where(picked.c.before < limit)
+        .order_by(chunk.start_ts)
+    )
+
 
 class SyncOrm:
     # =============================
     #   СЛУЖЕБНЫЕ ОПЕРАЦИИ
     # =============================
+    @staticmethod
+    @contextmanager
+    def schema_lock() -> Iterator[None]:
+        """
+        Блокировка pg_advisory_lock(SCHEMA_LOCK_KEY) на время DDL: при запуске
+        в несколько воркеров создание таблиц и секций не выполняется параллельно.
+        """
+        with sync_engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": SCHEMA_LOCK_KEY})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": SCHEMA_LOCK_KEY})
+                conn.commit()
+
     @staticmethod
     def create_tables():
         """
         Создание таблиц, если их ещё нет.
-        Если таблицы существуют — ничего не делает.
+        В существующей БД создаются только недостающие таблицы
+        и применяются SCHEMA_UPGRADES. Существующие несекционированные
+        raw_signals/predictions не перестраиваются (см. services.retention).
         """
-        table_names = inspect(sync_engine).get_table_names()
-        if not table_names:
+        with SyncOrm.schema_lock():
+            table_names = inspect(sync_engine).get_table_names()
             Base.metadata.create_all(sync_engine)
+            if table_names:
+                SyncOrm.upgrade_schema()
+
+    @staticmethod
+    def upgrade_schema():
+        """Применяет SCHEMA_UPGRADES к уже существующей БД."""
+        with sync_engine.begin() as conn:
+            for ddl in SCHEMA_UPGRADES:
+                conn.execute(text(ddl))
+
+    # =============================
+    #   СЕКЦИИ И RETENTION
+    # =============================
+    @staticmethod
+    def is_partitioned(table: str) -> bool:
+        """True, если таблица секционирована (relkind = 'p')."""
+        with sync_engine.connect() as conn:
+            kind = conn.execute(
+                text("SELECT relkind FROM pg_class WHERE relname = :t AND relkind IN ('r', 'p')"),
+                {"t": table},
+            ).scalar()
+        return kind == "p"
+
+    @staticmethod
+    def list_partitions(table: str) -> List[Tuple[str, datetime, datetime]]:
+        """Диапазонные секции таблицы: (имя, начало, конец). DEFAULT не входит."""
+        with sync_engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+                    "FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = :t"
+                ),
+                {"t": table},
+            ).all()
+        parts = []
+        for name, bound in rows:
+            m = _BOUND_RE.search(bound or "")
+            if m:
+                parts.append((name, _parse_bound(m.group(1)), _parse_bound(m.group(2))))
+        return sorted(parts, key=lambda p: p[1])
+
+    @staticmethod
+    def ensure_partitions(table: str, now: datetime, interval: timedelta, ahead: int = 2) -> List[str]:
+        """
+        Создаёт секцию DEFAULT и секции от текущей до now + ahead интервалов,
+        а если в DEFAULT есть более старые строки (например, после переноса
+        данных из несекционированной таблицы) — и секции для них.
+        Границы кратны interval от PARTITION_EPOCH. Возвращает имена созданных секций.
+        """
+        q = sync_engine.dialect.identifier_preparer.quote
+        column = q(partition_column(table))
+        default = q(table + "_default")
+        existing = {start for _, start, _ in SyncOrm.list_partitions(table)}
+        k = (now - PARTITION_EPOCH) // interval
+        created = []
+        with sync_engine.begin() as conn:
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {default} PARTITION OF {q(table)} DEFAULT"))
+            oldest = conn.execute(text(f"SELECT min({column}) FROM {default}")).scalar()
+        first = min(k, (oldest - PARTITION_EPOCH) // interval) if oldest is not None else k
+        for i in range(first, k + ahead + 1):
+            lo = PARTITION_EPOCH + i * interval
+            hi = lo + interval
+            if lo in existing:
+                continue
+            name = f"{table}_p{lo:%Y%m%d}"
+            create = (
+                f"CREATE TABLE IF NOT EXISTS {q(name)} PARTITION OF {q(table)} "
+                f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+            )
+            try:
+                with sync_engine.begin() as conn:
+                    conn.execute(text(create))
+                created.append(name)
+                continue
+            except IntegrityError:
+                pass  # в DEFAULT уже есть строки этого диапазона — переносим ниже
+            except SQLAlchemyError as e:
+                # например, пересечение с секцией другой длины
+                print(f"partition {name} was not created: {e}")
+                continue
+
+            # DEFAULT отсоединяется, строки диапазона переезжают в новую секцию
+            try:
+                with sync_engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {q(table)} DETACH PARTITION {default}"))
+                    conn.execute(text(create))
+                    conn.execute(
+                        text(
+                            f"WITH moved AS (DELETE FROM {default} "
+                            f"WHERE {column} >= :lo AND {column} < :hi RETURNING *) "
+                            f"INSERT INTO {q(table)} SELECT * FROM moved"
+                        ),
+                        {"lo": lo, "hi": hi},
+                    )
+                    conn.execute(text(f"ALTER TABLE {q(table)} ATTACH PARTITION {default} DEFAULT"))
+                created.append(name)
+            except SQLAlchemyError as e:
+                print(f"partition {name} was not created: {e}")
+        return created
+
+    @staticmethod
+    def drop_partitions_before(table: str, cutoff: datetime, detach: bool = False) -> List[str]:
+        """
+        Удаляет (или отсоединяет для архивации) секции, целиком лежащие
+        раньше cutoff. Это DROP/DETACH без построчного удаления.
+        """
+        q = sync_engine.dialect.identifier_preparer.quote
+        done = []
+        for name, _, hi in SyncOrm.list_partitions(table):
+            if hi > cutoff:
+                continue
+            ddl = f"ALTER TABLE {q(table)} DETACH PARTITION {q(name)}" if detach else f"DROP TABLE {q(name)}"
+            with sync_engine.begin() as conn:
+                conn.execute(text(ddl))
+            done.append(name)
+        return done
+
+    @staticmethod
+    def delete_rows_before(table: str, column: str, cutoff: datetime, batch: int = 10000) -> int:
+        """
+        Построчное удаление старых строк пакетами по batch (для несекционированных
+        таблиц), чтобы не держать длинную транзакцию. Возвращает число строк.
+        """
+        q = sync_engine.dialect.identifier_preparer.quote
+        stmt = text(
+            f"DELETE FROM {q(table)} WHERE id IN "
+            f"(SELECT id FROM {q(table)} WHERE {q(column)} < :cutoff LIMIT :n)"
+        )
+        total = 0
+        while True:
+            with sync_engine.begin() as conn:
+                n = conn.execute(stmt, {"cutoff": cutoff, "n": batch}).rowcount or 0
+            total += n
+            if n < batch:
+                return total
 
     # =============================
     #          USER
@@ -125,6 +403,22 @@ class SyncOrm:
             session.refresh(case)
             return case
 
+    @staticmethod
+    def set_case_feature_policy(case_id: int, policy: Optional[Dict]) -> Optional[models.Case]:
+        """Задаёт политику сохранения признаков обследования (None — по умолчанию)."""
+        with session_factory() as session:
+            case = session.get(models.Case, case_id)
+            if case is None:
+                return None
+            case.feature_policy = policy
+            try:
+                session.commit()
+            except SQLAlchemyError:
+                session.rollback()
+                raise
+            session.refresh(case)
+            return case
+
     @staticmethod
     def get_cases_by_patient(patient_id: int) -> List[models.Case]:
         """Возвращает все обследования пациента."""
@@ -152,10 +446,50 @@ class SyncOrm:
             return record
 
     @staticmethod
-    def get_raw_signals(case_id: int, limit: int = 300) -> List[models.RawSignal]:
+    def insert_raw_signals(rows: List[Dict]) -> int:
+        """
+        Пакетная вставка сырых данных одним multi-row INSERT.
+        rows: словари с ключами case_id, timestamp, bpm, uc.
+
+        Если пакет отвергнут из-за данных (NOT NULL, FK удалённого
+        обследования), строки вставляются по одной в savepoint'ах,
+        некорректные пропускаются. Ошибки соединения пробрасываются.
+        Возвращает число вставленных строк.
+        """
+        if not rows:
+            return 0
+        with session_factory() as session:
+            try:
+                session.execute(insert(models.RawSignal), rows)
+                session.commit()
+                return len(rows)
+            except (IntegrityError, DataError):
+                session.rollback()
+            except SQLAlchemyError:
+                session.rollback()
+                raise
+
+            inserted = 0
+            try:
+                for row in rows:
+                    try:
+                        with session.begin_nested():
+                            session.execute(insert(models.RawSignal), [row])
+                        inserted += 1
+                    except (IntegrityError, DataError):
+                        pass
+                session.commit()
+            except SQLAlchemyError:
+                session.rollback()
+                raise
+        return inserted
+
+    @staticmethod
+    def get_raw_signals(case_id: int, limit: int = 300) -> List:
         """
         Получает последние N сигналов для окна (по умолчанию 5 минут при fs=1 Гц).
-        Результат возвращается в хронологическом порядке.
+        Результат возвращается в хронологическом порядке: строки raw_signals
+        и отсчёты, распакованные из raw_chunks (RawSample, без id).
         """
         with session_factory() as session:
             stmt = (
@@ -164,7 +498,125 @@ class SyncOrm:
                 .order_by(models.RawSignal.timestamp.desc())
                 .limit(limit)
             )
-            return list(reversed(session.scalars(stmt).all()))
+            rows = session.scalars(stmt).all()
+            chunks = session.execute(last_chunks_stmt(case_id, limit)).all()
+        samples = [s for c in chunks for s in decode_chunk(case_id, c.start_ts, c.n_samples, c.data)]
+        return last_samples(rows, samples, limit)
+
+    @staticmethod
+    def get_raw_range(case_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Tuple[List[float], List[float], List[float]]:
+        """
+        Все отсчёты обследования за [start, end] колонками (время POSIX, bpm, uc)
+        в хронологическом порядке — для истории и прореживания без ORM-объектов.
+        Читаются и строки raw_signals, и чанки raw_chunks.
+        """
+        sig, chunk = models.RawSignal, models.RawChunk
+        rows_stmt = select(func.extract("epoch", sig.timestamp), sig.bpm, sig.uc).where(sig.case_id == case_id)
+        chunks_stmt = select(chunk.start_ts, chunk.n_samples, chunk.data).where(chunk.case_id == case_id)
+        if start is not None:
+            rows_stmt = rows_stmt.where(sig.timestamp >= start)
+            chunks_stmt = chunks_stmt.where(chunk.end_ts >= start)
+        if end is not None:
+            rows_stmt = rows_stmt.where(sig.timestamp <= end)
+            chunks_stmt = chunks_stmt.where(chunk.start_ts <= end)
+
+        with session_factory() as session:
+            rows = session.execute(rows_stmt.order_by(sig.timestamp)).all()
+            chunks = session.execute(chunks_stmt.order_by(chunk.start_ts)).all()
+
+        t = [float(r[0]) for r in rows]
+        bpm = [r[1] for r in rows]
+        uc = [r[2] for r in rows]
+        if chunks:
+            lo = start.timestamp() if start is not None else float("-inf")
+            hi = end.timestamp() if end is not None else float("inf")
+            for c in chunks:
+                ct, cb, cu = decode_chunk_columns(c.start_ts, c.n_samples, c.data)
+                keep = [i for i, x in enumerate(ct) if lo <= x <= hi]
+                t.extend(ct[i] for i in keep)
+                bpm.extend(cb[i] for i in keep)
+                uc.extend(cu[i] for i in keep)
+            # чанки могут перекрываться (повтор CSV в симуляции), а строки
+            # и чанки — чередоваться (режим меняли): общий порядок по времени
+            order = sorted(range(len(t)), key=t.__getitem__)
+            t, bpm, uc = [t[i] for i in order], [bpm[i] for i in order], [uc[i] for i in order]
+        return t, bpm, uc
+
+    @staticmethod
+    def iter_raw_signals(
+        case_id: int,
+        after: Optional[Tuple[datetime, int, int, int]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch: int = 1000,
+    ) -> Iterator[Dict]:
+        """
+        Отсчёты обследования серверными курсорами: строки raw_signals и чанки
+        raw_chunks читаются пакетами по мере потребления и сливаются.
+        Порядок полный, с учётом одинаковых отметок времени (повтор CSV в
+        симуляции, пересечение строк и чанков) — order_key каждого отсчёта:
+        (timestamp, 0, id строки, 0) или (timestamp, 1, id чанка, номер в чанке).
+        after — строго после этого order_key (постраничное чтение),
+        start и end — границы по времени включительно.
+        """
+        sig, chunk = models.RawSignal, models.RawChunk
+        rows_stmt = (
+            select(sig.id, sig.timestamp, sig.bpm, sig.uc)
+            .where(sig.case_id == case_id)
+            .order_by(sig.timestamp, sig.id)
+            .execution_options(yield_per=batch)
+        )
+        chunks_stmt = (
+            select(chunk.id, chunk.start_ts, chunk.n_samples, chunk.data)
+            .where(chunk.case_id == case_id)
+            .order_by(chunk.start_ts, chunk.id)
+            .execution_options(yield_per=max(1, batch // 60))
+        )
+        if after is not None:
+            after_ts, source, ref, _ = after
+            # строки идут раньше отсчётов чанков с тем же временем
+            rows_stmt = rows_stmt.where(
+                tuple_(sig.timestamp, sig.id) > tuple_(after_ts, ref) if source == 0 else sig.timestamp > after_ts
+            )
+            chunks_stmt = chunks_stmt.where(chunk.end_ts >= after_ts)
+        if start is not None:
+            rows_stmt = rows_stmt.where(sig.timestamp >= start)
+            chunks_stmt = chunks_stmt.where(chunk.end_ts >= start)
+        if end is not None:
+            rows_stmt = rows_stmt.where(sig.timestamp <= end)
+            chunks_stmt = chunks_stmt.where(chunk.start_ts <= end)
+
+        def in_range(key: tuple) -> bool:
+            return (
+                (after is None or key > after)
+                and (start is None or key[0] >= start)
+                and (end is None or key[0] <= end)
+            )
+
+        def chunk_samples(chunks) -> Iterator[Dict]:
+            # чанки могут пересекаться по времени, поэтому отсчёты сливаются
+            # через кучу: отсчёт отдаётся, когда начались все чанки до него
+            heap = []
+            for c in chunks:
+                while heap and heap[0][0][0] < c.start_ts:
+                    yield heapq.heappop(heap)[1]
+                for i, s in enumerate(decode_chunk(case_id, c.start_ts, c.n_samples, c.data)):
+                    key = (s.timestamp, 1, c.id, i)
+                    if in_range(key):
+                        heapq.heappush(heap, (key, {**s._asdict(), "order_key": key}))
+            while heap:
+                yield heapq.heappop(heap)[1]
+
+        with session_factory() as session:
+            rows = (
+                {
+                    "id": r.id, "case_id": case_id, "timestamp": r.timestamp, "bpm": r.bpm, "uc": r.uc,
+                    "order_key": (r.timestamp, 0, r.id, 0),
+                }
+                for r in session.execute(rows_stmt)
+            )
+            samples = chunk_samples(session.execute(chunks_stmt))
+            yield from heapq.merge(rows, samples, key=itemgetter("order_key"))
 
     # =============================
     #        PREDICTIONS
@@ -172,7 +624,7 @@ class SyncOrm:
     @staticmethod
     def insert_prediction(case_id: int, model_name: str, probability: float, label: int, alert: bool, features: Optional[Dict[str, Optional[float]]] = None) -> models.Prediction:
         """
-        Вставляет предсказание модели в таблицу predictions.
+        Вставляет предсказание модели вместе с признаками (JSONB) одной строкой.
         """
         with session_factory() as session:
             pred = models.Prediction(
@@ -181,46 +633,70 @@ class SyncOrm:
                 probability=probability,
                 label=label,
                 alert=int(alert),
+                features=clean_features(features),
             )
             session.add(pred)
             try:
-                session.flush()  # получаем pred.id до коммита
-
-                if features:
-                    items = [
-                        models.PredictionFeature(
-                            prediction_id=pred.id,
-                            key=str(k),
-                            value=v,
-                        )
-                        for k, v in features.items()
-                    ]
-                    if items:
-                        session.bulk_save_objects(items)
-
                 session.commit()
             except SQLAlchemyError:
                 session.rollback()
                 raise
 
             session.refresh(pred)
-            pred.features
             return pred
 
     @staticmethod
-    def get_predictions(case_id: int, limit: int = 1) -> List[models.Prediction]:
-        """Возвращает предсказания для указанного обследования."""
+    def get_predictions(case_id: int, limit: int = 1, feature_keys: Optional[List[str]] = None) -> List[models.Prediction]:
+        """
+        Возвращает предсказания для указанного обследования.
+        feature_keys — вернуть только эти признаки (извлекаются из JSONB в БД);
+        пустой список — без признаков.
+        """
         with session_factory() as session:
             stmt = (
                 select(models.Prediction)
-                .options(joinedload(models.Prediction.features))
                 .where(models.Prediction.case_id == case_id)
                 .order_by(models.Prediction.created_at.desc())
                 .limit(limit)
             )
-            rows = session.execute(stmt).unique().scalars().all()
+            if feature_keys is None:
+                rows = session.scalars(stmt).all()
+            else:
+                # весь JSONB не читаем: нужные ключи собираются в БД
+                stmt = stmt.add_columns(features_expr(feature_keys)).options(defer(models.Prediction.features))
+                rows = []
+                for pred, values in session.execute(stmt).all():
+                    set_committed_value(pred, "features", values)
+                    rows.append(pred)
             return list(reversed(rows))
-        
+
+    @staticmethod
+    def iter_predictions(case_id: int, after: Optional[Tuple[datetime, int]] = None, feature_keys: Optional[List[str]] = None, batch: int = 1000) -> Iterator[Dict]:
+        """
+        Предсказания обследования по возрастанию (created_at, id) серверным
+        курсором: строки читаются из БД пакетами по batch по мере потребления.
+        after — ключ последней прочитанной строки (постраничное чтение).
+        feature_keys — как в get_predictions.
+        """
+        p = models.Prediction
+        stmt = (
+            select(
+                p.id, p.case_id, p.model_name, p.probability, p.label, p.alert, p.created_at,
+                features_expr(feature_keys).label("features"),
+            )
+            .where(p.case_id == case_id)
+            .order_by(p.created_at, p.id)
+            .execution_options(yield_per=batch)
+        )
+        if after is not None:
+            stmt = stmt.where(tuple_(p.created_at, p.id) > tuple_(*after))
+        with session_factory() as session:
+            for row in session.execute(stmt):
+                item = row._asdict()
+                item["alert"] = bool(item["alert"])
+                item["features"] = item["features"] or {}
+                yield item
+
     # =============================
     #        WS STATIC TOKEN
     # =============================
@@ -229,6 +705,16 @@ class SyncOrm:
         """Хэш токена через passlib CryptContext."""
         return pwd_context.hash(plain)
 
+    @staticmethod
+    def _ws_token_fingerprint(plain: str, key: Optional[str] = None) -> str:
+        """
+        Отпечаток токена для поиска по индексу: HMAC-SHA256 с ключом
+        WS_TOKEN_FINGERPRINT_KEY (или переданным key — прежним ключом).
+        Подлинность по-прежнему подтверждает bcrypt.
+        """
+        key = (key or settings.WS_TOKEN_FINGERPRINT_KEY).encode()
+        return hmac.new(key, plain.encode(), hashlib.sha256).hexdigest()
+
     @staticmethod
     def _verify_ws_token(plain: str, hashed: str) -> bool:
         """Проверяет соответствие plain↔hash через passlib."""
@@ -264,6 +750,7 @@ class SyncOrm:
                 user_id=user_id,
                 case_id=case_id,
                 token_hash=token_hash,
+                token_fingerprint=SyncOrm._ws_token_fingerprint(plain),
             )
             session.add(rec)
             try:
@@ -364,36 +851,47 @@ class SyncOrm:
     def find_user_by_ws_token(case_id: int, token_plain: str) -> Optional[models.User]:
         """
         Находит владельца opaque WS-токена для заданного case_id.
-        - Ищет активные записи WSToken (revoked_at IS NULL) по case_id.
-        - Для каждой записи сверяет passlib-хэш через _verify_ws_token().
+        - Ищет активную запись WSToken по отпечатку токена (уникальный индекс):
+          текущим ключом или одним из WS_TOKEN_FINGERPRINT_OLD_KEYS, затем
+          один раз сверяет passlib-хэш через _verify_ws_token(). Отпечаток
+          прежним ключом переписывается текущим.
+        - Перебор bcrypt — только по записям без отпечатка (созданным до его
+          появления): при совпадении запись получает отпечаток, так что
+          перебор для неё однократный. Неизвестный токен при заполненных
+          отпечатках не стоит ни одной проверки bcrypt.
         - При успехе обновляет last_seen_at и возвращает ORM-пользователя.
-        - Если ни одна запись не подошла — возвращает None.
+        - Если запись не найдена или хэш не совпал — возвращает None.
         """
+        fingerprint = SyncOrm._ws_token_fingerprint(token_plain)
+        fingerprints = [fingerprint] + [
+            SyncOrm._ws_token_fingerprint(token_plain, key) for key in settings.ws_token_fingerprint_old_keys
+        ]
+        active = and_(
+            models.WSToken.case_id == case_id,
+            models.WSToken.revoked_at.is_(None),
+        )
 
         with session_factory() as session:
-            q = select(models.WSToken).where(
-                and_(
-                    models.WSToken.case_id == case_id,
-                    models.WSToken.revoked_at.is_(None),
-                )
-            )
-            records = session.scalars(q).all()
-            if not records:
-                return None
-
-            for rec in records:
-                try:
-                    ok = SyncOrm._verify_ws_token(token_plain, rec.token_hash)
-                except Exception:
-                    ok = False
-
-                if ok:
-                    rec.last_seen_at = datetime.now(timezone.utc)
-                    try:
-                        session.commit()
-                    except SQLAlchemyError:
-                        session.rollback()
-
-                    return SyncOrm.get_user(rec.user_id)
-
-            return None
\ No newline at end of file
+            rec = session.scalars(
+                select(models.WSToken).where(active, models.WSToken.token_fingerprint.in_(fingerprints))
+            ).first()
+            if rec is not None:
+                if not SyncOrm._verify_ws_token(token_plain, rec.token_hash):
+                    return None
+            else:
+                # записи без отпечатка: однократная проверка bcrypt и заполнение
+                legacy = session.scalars(
+                    select(models.WSToken).where(active, models.WSToken.token_fingerprint.is_(None))
+                ).all()
+                rec = next((r for r in legacy if SyncOrm._verify_ws_token(token_plain, r.token_hash)), None)
+                if rec is None:
+                    return None
+            rec.token_fingerprint = fingerprint
+
+            user_id = rec.user_id
+            rec.last_seen_at = datetime.now(timezone.utc)
+            try:
+                session.commit()
+            except SQLAlchemyError:
+                session.rollback()
+            return session.get(models.User, user_id)
\ No newline at end of file
@@ -1,12 +1,15 @@
 """
 Роуты FastAPI для работы с обследованиями (Case).
-Позволяют создавать обследование для пациента и получать список всех обследований пациента.
+Позволяют создавать обследование для пациента, получать список всех обследований пациента
+и задавать политику сохранения признаков ML для обследования.
 """
 
+import anyio
 from fastapi import APIRouter, HTTPException
 from typing import List
-from src.schemas import CaseCreate, CaseRead
+from src.schemas import CaseCreate, CaseRead, FeaturePolicyIn
 from src.queries.sync_orm import SyncOrm
+from src.services.ml_client import ml_client
 
 router = APIRouter()
 
@@ -35,3 +38,39 @@ def list_cases(patient_id: int):
     if not cases:
         return []
     return cases
+
+
+@router.put("/{case_id}/feature-policy", response_model=CaseRead)
+async def set_feature_policy(case_id: int, policy: FeaturePolicyIn):
+    """
+    Задаёт политику сохранения признаков для обследования.
+    Применяется при следующем подключении источника (WS, симуляция).
+    Ключи keys проверяются по признакам, которые возвращает ML-сервис:
+    неизвестные отклоняются (422), иначе они молча не сохранялись бы.
+    """
+    if policy.keys:
+        known = await ml_client.feature_names()
+        if known is None:
+            print(f"feature policy of case {case_id}: ML service is unavailable, keys are not checked")
+        else:
+            unknown = [k for k in policy.keys if k not in known]
+            if unknown:
+                raise HTTPException(status_code=422, detail={
+                    "error": "UNKNOWN_FEATURES",
+                    "message": "ML-сервис не возвращает эти признаки",
+                    "unknown": unknown,
+                    "available": known,
+                })
+    case = await anyio.to_thread.run_sync(SyncOrm.set_case_feature_policy, case_id, policy.model_dump())
+    if case is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return case
+
+
+@router.delete("/{case_id}/feature-policy", response_model=CaseRead)
+def reset_feature_policy(case_id: int):
+    """Возвращает обследованию политику развёртывания (FEATURES_PERSIST)."""
+    case = SyncOrm.set_case_feature_policy(case_id, None)
+    if case is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return case
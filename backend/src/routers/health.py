@@ -1,7 +1,21 @@
 from fastapi import APIRouter
 
+from src.services.ml_client import ml_client
+from src.services.ws_manager import manager
+
 router = APIRouter()
 
 @router.get("/health")
 def health_check():
-    return {"status": "ok", "service": "backend"}
\ No newline at end of file
+    return {"status": "ok", "service": "backend"}
+
+@router.get("/metrics/ml-client")
+def ml_client_metrics():
+    """Метрики клиента ML: breaker, загрузка, исходы и задержки вызовов."""
+    return ml_client.stats()
+
+
+@router.get("/metrics/ws")
+def ws_metrics():
+    """Метрики рассылки WS: очереди, задержки и отключённые отстающие подписчики."""
+    return manager.stats()
@@ -1,20 +1,31 @@
 """
 Роуты FastAPI для работы с предсказаниями ML-модели.
 - POST / — добавление результата предсказания в БД,
-- GET /by-case/{case_id} — получение всех предсказаний для конкретного обследования (case).
+- GET /by-case/{case_id} — получение всех предсказаний для конкретного обследования (case),
+  при необходимости только с выбранными признаками (?features=a,b),
+- GET /by-case/{case_id}/page — постраничное чтение по курсору,
+- GET /export/{case_id} — потоковая выгрузка (NDJSON или CSV).
 """
 
-from typing import List, Optional
+from contextlib import closing
+from itertools import islice
+from typing import List, Literal, Optional
 from datetime import datetime, timezone
 
 import anyio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from src.schemas import PredictionCreate, PredictionRead
+from src.schemas import PredictionCreate, PredictionRead, PredictionPage
 from src.queries.sync_orm import SyncOrm
+from src.services.export import MEDIA_TYPES, csv_stream, decode_cursor, encode_cursor, ndjson_stream, dumps
 
 router = APIRouter()
 
+def _feature_keys(features: Optional[str]) -> Optional[List[str]]:
+    """?features=a,b -> ["a", "b"]; не задан — None (все признаки)."""
+    return None if features is None else [k.strip() for k in features.split(",") if k.strip()]
+
 def _serialize(pred) -> dict:
     return {
         "id": pred.id,
@@ -24,10 +35,7 @@ def _serialize(pred) -> dict:
         "label": int(pred.label),
         "alert": bool(pred.alert),
         "created_at": pred.created_at,
-        "features": {
-            pf.key: (None if pf.value is None else float(pf.value))
-            for pf in getattr(pred, "features", [])
-        },
+        "features": pred.features or {},
     }
 
 
@@ -59,9 +67,14 @@ async def insert_prediction(pred: PredictionCreate):
 
 
 @router.get("/by-case/{case_id}", response_model=List[PredictionRead])
-async def list_predictions(case_id: int, limit: int = 300):
+async def list_predictions(case_id: int, limit: int = 300, features: Optional[str] = None):
+    """
+    Предсказания обследования. features — список признаков через запятую,
+    которые нужно вернуть (по умолчанию все); пустая строка — без признаков.
+    """
+    keys = _feature_keys(features)
     try:
-        objs = await anyio.to_thread.run_sync(SyncOrm.get_predictions, case_id, limit)
+        objs = await anyio.to_thread.run_sync(SyncOrm.get_predictions, case_id, limit, keys)
         return [_serialize(o) for o in objs]
     except Exception as e:
         raise HTTPException(
@@ -71,4 +84,74 @@ async def list_predictions(case_id: int, limit: int = 300):
                 "message": "Не удалось получить предсказания",
                 "extra": f"{e}",
             },
-        )
\ No newline at end of file
+        )
+
+
+def _read_page(case_id: int, after, limit: int, keys) -> list:
+    with closing(SyncOrm.iter_predictions(case_id, after=after, feature_keys=keys, batch=limit)) as rows:
+        return list(islice(rows, limit))
+
+
+@router.get("/by-case/{case_id}/page", response_model=PredictionPage)
+async def list_predictions_page(
+    case_id: int,
+    after: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    features: Optional[str] = None,
+):
+    """
+    Предсказания обследования по возрастанию времени, страницами по limit.
+    after — курсор next из предыдущей страницы; features — как в /by-case.
+    """
+    try:
+        after_key = None
+        if after:
+            ts, (id_,) = decode_cursor(after, 1)
+            after_key = (ts, id_)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        items = await anyio.to_thread.run_sync(_read_page, case_id, after_key, limit, _feature_keys(features))
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "PREDICTION_LIST_FAILURE",
+                "message": "Не удалось получить предсказания",
+                "extra": f"{e}",
+            },
+        )
+    last = items[-1] if len(items) == limit else None
+    return {"items": items, "next": encode_cursor(last["created_at"], last["id"]) if last else None}
+
+
+@router.get("/export/{case_id}")
+def export_predictions(
+    case_id: int,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    features: Optional[str] = None,
+):
+    """
+    Потоковая выгрузка предсказаний обследования (серверный курсор,
+    память не зависит от числа строк). features — как в /by-case;
+    в CSV выбранные признаки идут отдельными колонками, все признаки —
+    одной колонкой features (JSON).
+    """
+    keys = _feature_keys(features)
+    rows = SyncOrm.iter_predictions(case_id, feature_keys=keys)
+    if format == "ndjson":
+        body = ndjson_stream({**r, "created_at": r["created_at"].isoformat()} for r in rows)
+    else:
+        base = ["id", "created_at", "model_name", "probability", "label", "alert"]
+        if keys is None:
+            columns = base + ["features"]
+            to_row = lambda r: [r[c] for c in base] + [dumps(r["features"])]
+        else:
+            columns = base + keys
+            to_row = lambda r: [r[c] for c in base] + [r["features"].get(k) for k in keys]
+        body = csv_stream(({**r, "created_at": r["created_at"].isoformat()} for r in rows), columns, to_row)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="case_{case_id}_predictions.{format}"'},
+    )
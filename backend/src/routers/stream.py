@@ -2,13 +2,22 @@
 Роуты FastAPI для работы с потоковыми данными (RawSignal).
 Реализованы операции:
 - POST /data — приём одного сигнала от датчика (bpm + uc) и сохранение в БД,
-- GET /data/{case_id} — получение последних N сигналов для конкретного обследования (case).
+- GET /data/{case_id} — получение последних N сигналов для конкретного обследования (case),
+- GET /data/{case_id}/page — постраничное чтение всех сигналов по курсору,
+- GET /export/{case_id} — потоковая выгрузка сигналов (NDJSON или CSV),
+- GET /history/{case_id} — прореженная история за диапазон времени (обзорные графики).
 """
 
-from fastapi import APIRouter, HTTPException
-from typing import List
-from src.schemas import RawSignalCreate, RawSignalRead
+from contextlib import closing
+from datetime import datetime
+from itertools import islice
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from src.schemas import RawSignalCreate, RawSignalRead, RawSignalPage, RawHistoryRead
 from src.queries.sync_orm import SyncOrm
+from src.services.downsample import downsample
+from src.services.export import MEDIA_TYPES, csv_stream, decode_cursor, encode_cursor, ndjson_stream
 
 router = APIRouter()
 
@@ -34,3 +43,80 @@ def get_signals(case_id: int, limit: int = 300):
         return SyncOrm.get_raw_signals(case_id, limit)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch signals: {e}")
+
+
+@router.get("/data/{case_id}/page", response_model=RawSignalPage)
+def get_signals_page(case_id: int, after: Optional[str] = None, limit: int = Query(1000, ge=1, le=10000)):
+    """
+    Сигналы обследования по возрастанию времени, страницами по limit.
+    after — курсор next из предыдущей страницы; без него — с начала записи.
+    """
+    try:
+        after_key = None
+        if after:
+            ts, key = decode_cursor(after, 3)
+            after_key = (ts, *key)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        with closing(SyncOrm.iter_raw_signals(case_id, after=after_key, batch=limit)) as rows:
+            items = list(islice(rows, limit))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to fetch signals: {e}")
+    next_cursor = encode_cursor(*items[-1]["order_key"]) if len(items) == limit else None
+    return {"items": items, "next": next_cursor}
+
+
+@router.get("/export/{case_id}")
+def export_signals(
+    case_id: int,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """
+    Потоковая выгрузка сигналов обследования за [start, end] (по умолчанию
+    вся запись): строки читаются из БД серверным курсором и отдаются по мере
+    чтения, память не зависит от длины записи.
+    """
+    rows = (
+        {"timestamp": r["timestamp"].isoformat(), "bpm": float(r["bpm"]), "uc": float(r["uc"])}
+        for r in SyncOrm.iter_raw_signals(case_id, start=start, end=end)
+    )
+    body = ndjson_stream(rows) if format == "ndjson" else csv_stream(rows, ["timestamp", "bpm", "uc"])
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="case_{case_id}_signals.{format}"'},
+    )
+
+
+@router.get("/history/{case_id}", response_model=RawHistoryRead)
+def get_history(
+    case_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = Query(1000, ge=10, le=10000),
+    method: Literal["lttb", "minmax"] = "lttb",
+):
+    """
+    История обследования за [start, end] (по умолчанию — вся запись),
+    прореженная до points точек на канал с сохранением формы кривой.
+    Объём ответа не зависит от длины записи.
+    """
+    try:
+        t, bpm, uc = SyncOrm.get_raw_range(case_id, start, end)
+        bpm_t, bpm_v = downsample(t, bpm, points, method)
+        uc_t, uc_v = downsample(t, uc, points, method)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to fetch history: {e}")
+    return {
+        "case_id": case_id,
+        "method": method,
+        "points": points,
+        "total": len(t),
+        "start": t[0] if t else None,
+        "end": t[-1] if t else None,
+        "bpm": {"t": bpm_t.tolist(), "v": bpm_v.tolist()},
+        "uc": {"t": uc_t.tolist(), "v": uc_v.tolist()},
+    }
@@ -3,20 +3,29 @@
 """
 WS-инжест: принимает точки t,bpm,uc. Шаги:
 1) insert raw -> 2) окно 300s -> 3) ML POST -> 4) insert prediction
-5) broadcast prediction/alert -> 6) broadcast raw.
+5-6) broadcast prediction/alert/raw (одна рассылка на отсчёт).
+Окно берётся из кольцевого буфера в памяти (services.window_buffer),
+который заполняется из БД один раз при подключении.
+Query: token, H, stride; batch=1 — сообщения одного отсчёта одним кадром
+{"type": "batch", "payload": [...]}.
+Соединение подписано на рассылку комнаты, пока не пришлёт первый отсчёт:
+источник данных (usb_bridge, csv_ws_publisher) выводится из рассылки
+и получает только личные сообщения (hello, ml_error), поэтому не
+отключается как отстающий, даже если не читает сокет.
 """
-import os
 from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, Optional
 
-import httpx
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 
 from src.security import get_current_user_ws
 from src.services.ws_manager import manager
+from src.services.window_buffer import window_buffers
+from src.services.ingest_buffer import raw_ingest
+from src.services.ml_client import ml_client
+from src.services.feature_policy import FeaturePolicy, default_policy
 from src.queries.async_orm import AsyncOrm
 
-WINDOW_SECONDS = 300
 router = APIRouter()
 
 def _sanitize_h(h) -> float:
@@ -38,19 +47,17 @@ def _unwrap(msg: Dict[str, Any]) -> Dict[str, Any]:
         "uc": msg.get("uc") or msg.get("toco") or msg.get("uterine"),
     }
 
-async def _call_ml(window_payload: dict) -> dict:
-    ml_url = os.getenv("ML_URL")
-    if not ml_url:
-        raise RuntimeError("ML_URL is not set")
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        r = await client.post(ml_url, json=window_payload)
-        r.raise_for_status()
-        return r.json()
-
 @router.websocket("/case/{case_id}")
 async def ws_case(websocket: WebSocket, case_id: int, user=Depends(get_current_user_ws)):
     await websocket.accept()
-    await manager.join(case_id, websocket)
+    # какие признаки ML запрашивать и сохранять с предсказаниями
+    feature_tracker = FeaturePolicy.from_dict(
+        await AsyncOrm.get_case_feature_policy(case_id), default_policy
+    ).tracker()
+    # batch=1: сообщения одного отсчёта приходят одним кадром {"type": "batch"}
+    batch = websocket.query_params.get("batch", "0").lower() in ("1", "true", "yes")
+    sub = await manager.join(case_id, websocket, batch=batch)
+    window = await window_buffers.acquire(case_id)
     H_min = _sanitize_h(websocket.query_params.get("H", 5.0))
     try:
         stride_s = max(1.0, float(websocket.query_params.get("stride", 1.0)))
@@ -58,13 +65,14 @@ async def ws_case(websocket: WebSocket, case_id: int, user=Depends(get_current_u
         stride_s = 1.0
 
     # hello
-    await websocket.send_json({
+    sub.send({
         "type": "hello",
         "payload": {"case_id": case_id, "user_id": getattr(user, "id", None), "H": H_min}
     })
 
     base_t0: Optional[datetime] = None  # для преобразования относительного t в абсолютный timestamp
-    last_ml_ts: Optional[datetime] = None
+    last_ml_ts: Optional[float] = None
+    publisher = False  # соединение прислало отсчёт: это источник, а не зритель
 
     try:
         while True:
@@ -73,38 +81,41 @@ async def ws_case(websocket: WebSocket, case_id: int, user=Depends(get_current_u
                 continue
 
             row = _unwrap(data)
+            if not publisher:
+                publisher = True
+                await manager.detach(case_id, websocket)
 
             # инициализация нуля времени по первой точке
             if base_t0 is None:
                 first_t = float(row["t"]) if row.get("t") is not None else 0.0
                 base_t0 = _now_utc() - timedelta(seconds=first_t)
 
-            # 1) RAW -> БД
+            # 1) RAW -> очередь записи в БД (пакетная вставка)
             t_val = row.get("t")
             ts = base_t0 + timedelta(seconds=float(t_val)) if t_val is not None else _now_utc()
             bpm = None if row.get("bpm") in (None, "") else float(row["bpm"])
             uc  = None if row.get("uc")  in (None, "") else float(row["uc"])
-            await AsyncOrm.insert_signal(case_id, ts, bpm, uc)
+            await raw_ingest.add(case_id, ts, bpm, uc)
+            window.append(ts.timestamp(), bpm, uc)
+
+            raw_msg = {"type": "raw", "payload": {"t": float(t_val) if t_val is not None else None, "bpm": bpm, "uc": uc}}
+            tick = []  # сообщения отсчёта рассылаются вместе
 
             # 2) окно и 3) ML
-            window = await AsyncOrm.get_window(case_id, limit=WINDOW_SECONDS)
-            if len(window) >= WINDOW_SECONDS:
-                t0_abs = window[0].timestamp
-                now_ts = window[-1].timestamp
-                if last_ml_ts and (now_ts - last_ml_ts).total_seconds() < stride_s:
+            if window.full:
+                now_ts = window.last_ts
+                if last_ml_ts and (now_ts - last_ml_ts) < stride_s:
                     # пропускаем вызов ML до следующего шага
-                    await manager.broadcast(case_id, {"type":"raw","payload":{"t": float(t_val) if t_val is not None else None, "bpm": bpm, "uc": uc}})
+                    await manager.broadcast(case_id, raw_msg)
                     continue
                 payload = {
-                    "window": {
-                        "t": [(s.timestamp - t0_abs).total_seconds() for s in window],
-                        "bpm": [float(s.bpm) for s in window],
-                        "uc": [float(s.uc) for s in window],
-                    },
-                    "H": H_min
+                    "window": window.window_payload(),
+                    "H": H_min,
+                    "case_id": case_id,
+                    "features": feature_tracker.request_keys(),
                 }
                 try:
-                    ml_res = await _call_ml(payload)
+                    ml_res = await ml_client.predict(payload, case_id=case_id)
                     # 4) prediction -> БД
                     obj = await AsyncOrm.insert_prediction(
                         case_id=case_id,
@@ -112,38 +123,37 @@ async def ws_case(websocket: WebSocket, case_id: int, user=Depends(get_current_u
                         probability=float(ml_res.get("proba", 0.0)),
                         label=int(ml_res.get("label", 0)),
                         alert=bool(ml_res.get("alert", False)),
-                        features=ml_res.get("features") or {},
+                        features=feature_tracker.persist(ml_res.get("features"), bool(ml_res.get("alert", False))),
                     )
                     last_ml_ts = now_ts
                     # 5) broadcast prediction/alert
                     t_center = (getattr(obj, "created_at", ts)).timestamp()
-                    await manager.broadcast(
-                        case_id,
-                        {"type": "prediction", "payload": {"t_center": t_center, "proba": float(obj.probability)}}
-                    )
-                    await manager.broadcast(
-                        case_id,
-                        {"type": "alert", "payload": {"t": t_center, "state": ("on" if bool(obj.alert) else "off"), "reason": None}}
-                    )
+                    tick.append({"type": "prediction", "payload": {"t_center": t_center, "proba": float(obj.probability)}})
+                    tick.append({"type": "alert", "payload": {"t": t_center, "state": ("on" if bool(obj.alert) else "off"), "reason": None}})
                     last_ml_ts = now_ts
                 except Exception as e:
                     # не рвём поток
-                    try:
-                        await websocket.send_json({"type": "ml_error", "payload": {"detail": str(e)}})
-                    except Exception:
-                        pass
-
-            # 6) broadcast raw``
-            await manager.broadcast(
-                case_id,
-                {"type": "raw", "payload": {"t": float(t_val) if t_val is not None else None, "bpm": bpm, "uc": uc}}
-            )
+                    sub.send({"type": "ml_error", "payload": {"detail": str(e)}})
+
+            # 6) broadcast prediction/alert/raw — каждое сообщение кодируется один раз
+            tick.append(raw_msg)
+            await manager.broadcast_many(case_id, tick)
          
 
     except WebSocketDisconnect:
         await manager.leave(case_id, websocket)
     except Exception:
+        # сначала останавливаем писателя подписчика, затем пишем в сокет сами
+        await manager.leave(case_id, websocket)
         try:
             await websocket.send_json({"type": "error", "payload": {"detail": "server_error"}})
-        finally:
-            await manager.leave(case_id, websocket)
+        except Exception:
+            pass
+    finally:
+        # писатель источника уже не в комнате — leave его не остановит
+        await sub.stop()
+        await window_buffers.release(case_id)
+        try:
+            await raw_ingest.flush(case_id)
+        except Exception as e:
+            print(f"raw ingest flush failed for case {case_id}: {e}")
@@ -4,10 +4,13 @@
 """
 
 from typing import Optional
+
+import anyio
 from fastapi import APIRouter, HTTPException, Query
 from src.schemas import WSTokenCreateResp, WSTokenCreate, WSTokenExistsResp, WSTokenRevokeResp, WSTokenRevoke
 
 from src.queries.sync_orm import SyncOrm
+from src.security import invalidate_ws_auth
 
 router = APIRouter()
 
@@ -51,12 +54,13 @@ def ws_token_exists(
 
 
 @router.post("/revoke", response_model=WSTokenRevokeResp)
-def revoke_ws_token(payload: WSTokenRevoke):
+async def revoke_ws_token(payload: WSTokenRevoke):
     """
     Отзывает активный токен для (user_id, case_id), если он есть.
+    Кэш проверок токена сбрасывается во всех воркерах.
     """
     try:
-        changed = SyncOrm.revoke_ws_token(payload.user_id, payload.case_id)
+        changed = await anyio.to_thread.run_sync(SyncOrm.revoke_ws_token, payload.user_id, payload.case_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail={
             "error": "WS_TOKEN_REVOKE_FAILED",
@@ -64,4 +68,6 @@ def revoke_ws_token(payload: WSTokenRevoke):
             "extra": str(e),
         })
 
+    if changed:
+        await invalidate_ws_auth(payload.case_id)
     return WSTokenRevokeResp(status="revoked" if changed else "not_found")
\ No newline at end of file
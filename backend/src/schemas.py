@@ -84,11 +84,22 @@ class CaseCreate(CaseBase):
     patient_id: int
 
 
+class FeaturePolicyIn(BaseModel):
+    """
+    Политика сохранения признаков ML для обследования
+    (см. services.feature_policy).
+    """
+    mode: Literal["all", "none", "every_n", "alerts"] = "all"
+    every_n: int = Field(10, ge=1, description="Для every_n: сохранять признаки каждого N-го предсказания")
+    keys: Optional[List[str]] = Field(None, description="Сохранять только эти признаки; None — все")
+
+
 class CaseRead(ORMModel, CaseBase):
     """Ответ с данными обследования."""
     id: int
     patient_id: int
     created_at: datetime
+    feature_policy: Optional[Dict] = None
 
 
 # =========================
@@ -108,14 +119,44 @@ class RawSignalCreate(BaseModel):
 
 
 class RawSignalRead(ORMModel):
-    """Ответ с сохранёнными сигналами (bpm + uc)."""
-    id: int
+    """
+    Ответ с сохранёнными сигналами (bpm + uc).
+    id нет у отсчётов, хранящихся чанками (RAW_STORAGE=chunks).
+    """
+    id: Optional[int] = None
     case_id: int
     timestamp: datetime
     bpm: float
     uc: float
 
 
+class RawSignalPage(BaseModel):
+    """Страница сигналов; next — курсор следующей страницы (None — последняя)."""
+    items: List[RawSignalRead]
+    next: Optional[str] = None
+
+
+class SeriesRead(BaseModel):
+    """Один канал: время (POSIX, с) и значения."""
+    t: List[float]
+    v: List[float]
+
+
+class RawHistoryRead(BaseModel):
+    """
+    Прореженная история обследования для обзорного графика.
+    total — сколько отсчётов в диапазоне до прореживания.
+    """
+    case_id: int
+    method: Literal["lttb", "minmax"]
+    points: int
+    total: int
+    start: Optional[float] = None
+    end: Optional[float] = None
+    bpm: SeriesRead
+    uc: SeriesRead
+
+
 # =========================
 #       ML PREDICTION
 # =========================
@@ -142,6 +183,12 @@ class PredictionRead(ORMModel, PredictionBase):
     created_at: datetime
 
 
+class PredictionPage(BaseModel):
+    """Страница предсказаний; next — курсор следующей страницы (None — последняя)."""
+    items: List[PredictionRead]
+    next: Optional[str] = None
+
+
 # =========================
 #     МОДЕЛИ ЗАПРОСОВ
 # =========================
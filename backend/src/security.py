@@ -3,10 +3,79 @@
 Только WebSocket-аутентификация по opaque-токену:
 ws://.../ws/case/{case_id}?token=<OPAQUE>[&H=...&stride=...]
 """
-from typing import Optional
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
 from fastapi import HTTPException, WebSocket, status
 from src.queries.sync_orm import SyncOrm
 from src.schemas import CurrentUser
+from src.services.ws_manager import manager
+
+# успешные проверки токена кэшируются на WS_AUTH_CACHE_TTL_S секунд:
+# переподключения после обрыва сети не повторяют bcrypt и запрос к БД
+WS_AUTH_CACHE_TTL_S = float(os.getenv("WS_AUTH_CACHE_TTL_S", "30"))
+_WS_AUTH_CACHE_MAX = 10000
+
+# ключ — (case_id, отпечаток токена); сам токен в памяти не храним
+_ws_auth_cache: Dict[Tuple[int, str], Tuple[float, CurrentUser]] = {}
+_ws_auth_inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+
+WS_AUTH_INVALIDATE = "ws_auth_invalidate"
+
+
+def _drop_ws_auth_cache(case_id: int):
+    for key in list(_ws_auth_cache):
+        if key[0] == case_id:
+            _ws_auth_cache.pop(key, None)
+
+
+# сброс приходит и от других воркеров через шину WSManager (services.pubsub)
+manager.on_event(WS_AUTH_INVALIDATE, _drop_ws_auth_cache)
+
+
+async def invalidate_ws_auth(case_id: int):
+    """
+    Сбрасывает кэш проверок токенов обследования (после отзыва токена)
+    в этом процессе и, через шину, во всех остальных воркерах.
+    """
+    await manager.publish_event(WS_AUTH_INVALIDATE, case_id)
+
+
+def _lookup_ws_user(case_id: int, token: str) -> Optional[CurrentUser]:
+    db_user = SyncOrm.find_user_by_ws_token(case_id, token)
+    return CurrentUser(id=db_user.id, email=db_user.email) if db_user else None
+
+
+async def _resolve_ws_user(case_id: int, token: str) -> Optional[CurrentUser]:
+    """
+    Проверка токена вне event loop (bcrypt и запрос к БД — в пуле потоков).
+    Одновременные хэндшейки с одним токеном ждут одну проверку.
+    """
+    key = (case_id, SyncOrm._ws_token_fingerprint(token))
+    now = time.monotonic()
+    hit = _ws_auth_cache.get(key)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+
+    fut = _ws_auth_inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(asyncio.to_thread(_lookup_ws_user, case_id, token))
+        _ws_auth_inflight[key] = fut
+        fut.add_done_callback(lambda _: _ws_auth_inflight.pop(key, None))
+    user = await asyncio.shield(fut)
+
+    if user is not None and WS_AUTH_CACHE_TTL_S > 0:
+        # кэшируем только при подключённой шине: иначе сброс после отзыва
+        # из другого воркера сюда не дойдёт
+        await manager.start()
+        if len(_ws_auth_cache) >= _WS_AUTH_CACHE_MAX:
+            for k in [k for k, (exp, _) in _ws_auth_cache.items() if exp <= now]:
+                _ws_auth_cache.pop(k, None)
+            if len(_ws_auth_cache) >= _WS_AUTH_CACHE_MAX:
+                _ws_auth_cache.clear()
+        _ws_auth_cache[key] = (now + WS_AUTH_CACHE_TTL_S, user)
+    return user
 
 # ====================================
 #        WS-АУТЕНТИФИКАЦИЯ
@@ -17,10 +86,8 @@ async def get_current_user_ws(websocket: WebSocket) -> CurrentUser:
     Аутентификация для WS-хэндшейка:
     - token берём из query (?token=...), либо как fallback — из Authorization: Bearer ...
     - case_id берём из path_params (/ws/case/{case_id}) или из query (?case_id=...|case=...).
-    - Валидация токена поручается SyncOrm:
-        * при наличии SyncOrm.find_user_by_ws_token(case_id, token) — используем его;
-        * иначе ожидаем user_id в query (?user_id=...) или заголовке X-User-Id и вызываем
-            SyncOrm.validate_ws_token(user_id, case_id, token)   SyncOrm.get_user(user_id).
+    - Валидация токена поручается SyncOrm.find_user_by_ws_token(case_id, token)
+      (в пуле потоков); успешный результат кэшируется на WS_AUTH_CACHE_TTL_S.
     """
     # 1) Токен: из query (браузерный стандарт) или из Authorization (нестандартный клиент)
     token = websocket.query_params.get("token")
@@ -44,18 +111,14 @@ async def get_current_user_ws(websocket: WebSocket) -> CurrentUser:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         raise HTTPException(status_code=401, detail="missing_case_id")
 
-    # 3) Валидация токена без прямого доступа к БД (без SQLAlchemy)
-    db_user = None
+    # 3) Валидация токена: поиск по отпечатку + одна проверка bcrypt, с кэшем
     try:
-        db_user = SyncOrm.find_user_by_ws_token(case_id, token)  # type: ignore[attr-defined]
+        user = await _resolve_ws_user(case_id, token)
     except Exception:
-        db_user = None
+        user = None
 
-    if not db_user:
+    if not user:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         raise HTTPException(status_code=401, detail="invalid_ws_token")
 
-    return CurrentUser(
-        id=db_user.id,
-        email=db_user.email
-    )
\ No newline at end of file
+    return user
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Прореживание длинных записей для обзорных графиков.
+
+Запись родов на несколько часов — десятки тысяч точек на канал; для
+графика шириной в экран достаточно ~1000 точек, если сохранить форму
+кривой (пики, децелерации, схватки). Методы:
+- lttb   — Largest-Triangle-Three-Buckets: из каждой корзины берётся точка,
+  образующая наибольший треугольник с выбранной точкой предыдущей
+  корзины и средним следующей;
+- minmax — минимум и максимум каждой корзины (огибающая, не теряет
+  экстремумы).
+
+Считается на NumPy: minmax целиком векторно, в LTTB векторно внутри
+корзины (выбор точки зависит от точки предыдущей корзины).
+Каналы прореживаются независимо; нечисловые значения (NaN) пропускаются.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def _bucket_edges(size: int, buckets: int) -> np.ndarray:
+    """Границы buckets непустых корзин по size точкам (buckets <= size)."""
+    return np.linspace(0, size, buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Индексы n точек по LTTB; первая и последняя точки сохраняются всегда."""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    # корзины внутренних точек 1..size-2
+    edges = 1 + _bucket_edges(size - 2, n - 2)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # «следующая» точка для каждой корзины: среднее следующей, для последней — конец
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Индексы минимума и максимума каждой из n // 2 корзин (по времени)."""
+    size = len(x)
+    buckets = n // 2
+    if n >= size or buckets < 1:
+        return np.arange(size)
+
+    edges = _bucket_edges(size, buckets)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    # внутри корзины индексы упорядочены по значению: первый — минимум, последний — максимум
+    order = np.lexsort((y, bucket))
+    picked = np.concatenate([order[edges[:-1]], order[edges[1:] - 1]])
+    return np.unique(picked)
+
+
+def downsample(t, values, n: int, method: str = "lttb") -> Tuple[np.ndarray, np.ndarray]:
+    """Прореженный канал (время, значения) не длиннее n точек."""
+    if method not in METHODS:
+        raise ValueError(f"unknown downsampling method: {method!r}")
+    x = np.asarray(t, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    ok = np.isfinite(y)
+    if not ok.all():
+        x, y = x[ok], y[ok]
+    idx = lttb_indices(x, y, n) if method == "lttb" else minmax_indices(x, y, n)
+    return x[idx], y[idx]
@@ -0,0 +1,91 @@
+"""
+Политика сохранения признаков ML вместе с предсказаниями.
+
+Признаки нужны в основном для разборов отдельных обследований, поэтому
+сохранять их на каждом шаге (раз в секунду) обычно незачем. Режимы:
+- all     — признаки каждого предсказания (поведение по умолчанию);
+- none    — не сохранять;
+- every_n — признаки каждого every_n-го предсказания;
+- alerts  — только при смене состояния тревоги (и у первого предсказания).
+keys — сохранять только эти признаки (для любого режима, кроме none).
+
+Политика развёртывания задаётся FEATURES_PERSIST, FEATURES_PERSIST_EVERY_N
+и FEATURES_PERSIST_KEYS (через запятую), политика обследования —
+cases.feature_policy (PUT /cases/{id}/feature-policy) и применяется
+при (пере)подключении источника.
+
+Признаки, которые не будут сохранены, не запрашиваются у ML-сервиса:
+в запрос /predict передаётся список нужных ключей (пустой — без признаков).
+"""
+
+import os
+from typing import Dict, List, Optional
+
+MODES = ("all", "none", "every_n", "alerts")
+
+
+class FeaturePolicy:
+    def __init__(self, mode: str = "all", every_n: int = 1, keys: Optional[List[str]] = None):
+        if mode not in MODES:
+            raise ValueError(f"unknown feature policy mode: {mode!r}")
+        self.mode = mode
+        self.every_n = max(1, int(every_n))
+        self.keys = list(keys) if keys else None
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict], default: "FeaturePolicy") -> "FeaturePolicy":
+        """Политика обследования (cases.feature_policy) поверх политики развёртывания."""
+        if not data:
+            return default
+        return cls(
+            data.get("mode", default.mode),
+            data.get("every_n", default.every_n),
+            data.get("keys", default.keys),
+        )
+
+    def to_dict(self) -> dict:
+        return {"mode": self.mode, "every_n": self.every_n, "keys": self.keys}
+
+    def tracker(self) -> "FeatureTracker":
+        return FeatureTracker(self)
+
+
+class FeatureTracker:
+    """
+    Состояние политики для одного источника (WS-инжест, симуляция):
+    какие признаки запросить у ML и какие из них сохранить.
+    """
+
+    def __init__(self, policy: FeaturePolicy):
+        self.policy = policy
+        self._count = 0          # успешных предсказаний
+        self._alert: Optional[bool] = None
+
+    def request_keys(self) -> Optional[List[str]]:
+        """Поле features запроса к ML: None — все признаки, [] — никаких."""
+        p = self.policy
+        if p.mode == "none" or (p.mode == "every_n" and self._count % p.every_n):
+            return []
+        return p.keys
+
+    def persist(self, features: Optional[Dict], alert: bool) -> Optional[Dict]:
+        """Признаки для сохранения с очередным предсказанием (None — не сохранять)."""
+        p = self.policy
+        n, self._count = self._count, self._count + 1
+        prev, self._alert = self._alert, bool(alert)
+        if not features or p.mode == "none":
+            return None
+        if p.mode == "every_n" and n % p.every_n:
+            return None
+        if p.mode == "alerts" and prev == bool(alert):
+            return None
+        if p.keys is not None:
+            return {k: features[k] for k in p.keys if k in features}
+        return features
+
+
+default_policy = FeaturePolicy(
+    os.getenv("FEATURES_PERSIST", "all").lower(),
+    int(os.getenv("FEATURES_PERSIST_EVERY_N", "10")),
+    [k.strip() for k in os.getenv("FEATURES_PERSIST_KEYS", "").split(",") if k.strip()] or None,
+)
@@ -0,0 +1,228 @@
+"""
+Отложенная (write-behind) запись сырых сигналов.
+
+Отсчёты всех обследований копятся в памяти и сбрасываются в raw_signals
+одним multi-row INSERT раз в RAW_FLUSH_MS мс или по накоплении
+RAW_FLUSH_ROWS строк — вместо отдельной транзакции на каждую секунду
+каждого обследования.
+
+- Память ограничена: при RAW_MAX_PENDING строк в очереди add() ждёт,
+  пока БД не догонит (backpressure на источник).
+- При ошибке БД строки возвращаются в начало очереди и пишутся повторно;
+  строки, отвергнутые самой БД (NOT NULL, FK), отбрасываются.
+- flush() сбрасывает всё накопленное (отключение источника, остановка
+  симуляции), stop() — при остановке приложения.
+
+RAW_STORAGE=chunks — колоночный режим (services.raw_chunks): отсчёты
+обследования собираются в открытый чанк, который закрывается по истечении
+RAW_CHUNK_SECONDS секунд записи, при отключении источника (flush(case_id))
+или если источник замолчал. Пока чанк открыт, раз в RAW_CHUNK_FLUSH_S
+секунд новые отсчёты дописываются сегментом — новой строкой raw_chunks
+(только INSERT, без переписывания строк), поэтому при аварийном
+завершении процесса теряется не больше RAW_CHUNK_FLUSH_S секунд записи.
+При закрытии чанк пишется одной строкой, а его сегменты удаляются в той
+же транзакции: за чанк данные пишутся примерно дважды (сегменты + итоговая
+строка) вместо переписывания растущего снимка на каждой контрольной точке.
+Очередь и пакеты в этом режиме считаются в строках raw_chunks.
+"""
+
+import asyncio
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.queries.async_orm import AsyncOrm
+from src.services.raw_chunks import ChunkBuilder
+
+RAW_STORAGE = os.getenv("RAW_STORAGE", "rows").lower()
+
+
+class RawIngestBuffer:
+    def __init__(
+        self,
+        flush_ms: float = 250.0,
+        max_rows: int = 1000,
+        max_pending: int = 50000,
+        storage: str = "rows",
+        chunk_seconds: float = 60.0,
+        chunk_flush_seconds: float = 5.0,
+    ):
+        if storage not in ("rows", "chunks"):
+            raise ValueError(f"unknown RAW_STORAGE: {storage!r}")
+        self.flush_s = flush_ms / 1000.0
+        self.max_rows = max_rows
+        self.max_pending = max(max_pending, max_rows)
+        self.storage = storage
+        self.chunk_s = chunk_seconds
+        self.chunk_flush_s = chunk_flush_seconds
+        self._rows: List[Dict] = []  # строки raw_signals или снимки чанков
+        self._open: Dict[int, ChunkBuilder] = {}
+        self._opened_at: Dict[int, float] = {}
+        self._saved_at: Dict[int, float] = {}
+        self._wake = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.invalid = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    async def add(self, case_id: int, timestamp: datetime, bpm: float, uc: float):
+        """Ставит отсчёт в очередь записи; ждёт, если очередь заполнена."""
+        self._ensure_started()
+        if len(self._rows) >= self.max_pending:
+            self._wake.set()
+            async with self._space:
+                await self._space.wait_for(lambda: len(self._rows) < self.max_pending)
+        if self.storage == "chunks":
+            self._add_to_chunk(case_id, timestamp, bpm, uc)
+        else:
+            self._rows.append({"case_id": case_id, "timestamp": timestamp, "bpm": bpm, "uc": uc})
+        if len(self._rows) >= self.max_rows:
+            self._wake.set()
+
+    def _add_to_chunk(self, case_id: int, timestamp: datetime, bpm: float, uc: float):
+        if bpm is None or uc is None or timestamp is None or math.isnan(bpm) or math.isnan(uc):
+            # такие строки отвергла бы и таблица raw_signals (NOT NULL)
+            self.invalid += 1
+            return
+        chunk = self._open.get(case_id)
+        if chunk is not None and not chunk.accepts(timestamp, self.chunk_s):
+            self._seal(case_id)
+            chunk = None
+        if chunk is None:
+            chunk = self._open[case_id] = ChunkBuilder(case_id, timestamp)
+            self._opened_at[case_id] = self._saved_at[case_id] = time.monotonic()
+        chunk.append(timestamp, bpm, uc)
+
+    def _queue_chunk(self, chunk: ChunkBuilder, final: bool):
+        # builder нужен _write, чтобы назначить строке id и связать сегменты с итоговой строкой
+        row = chunk.seal() if final else chunk.segment()
+        self._rows.append({**row, "builder": chunk, "final": final})
+
+    def _seal(self, case_id: int):
+        """Закрывает открытый чанк обследования и ставит его в очередь записи."""
+        chunk = self._open.pop(case_id, None)
+        self._opened_at.pop(case_id, None)
+        self._saved_at.pop(case_id, None)
+        if chunk is None or not len(chunk):
+            return
+        if chunk.segments == 1 and chunk.saved == len(chunk):
+            # единственный сегмент уже содержит весь чанк
+            return
+        self._queue_chunk(chunk, final=True)
+
+    def _checkpoint(self):
+        """Ставит в очередь сегменты открытых чанков, не записанных дольше RAW_CHUNK_FLUSH_S."""
+        if self.chunk_flush_s <= 0:
+            return
+        deadline = time.monotonic() - self.chunk_flush_s
+        for case_id, chunk in self._open.items():
+            if self._saved_at[case_id] <= deadline and len(chunk) > chunk.saved:
+                self._saved_at[case_id] = time.monotonic()
+                self._queue_chunk(chunk, final=False)
+
+    def _seal_stale(self):
+        """Закрывает чанки источников, которые замолчали дольше RAW_CHUNK_SECONDS."""
+        deadline = time.monotonic() - 2 * self.chunk_s
+        for case_id, opened_at in list(self._opened_at.items()):
+            if opened_at < deadline:
+                self._seal(case_id)
+
+    async def flush(self, case_id: Optional[int] = None):
+        """
+        Записывает все накопленные строки пакетами по max_rows.
+        В режиме чанков предварительно закрывает открытый чанк
+        обследования case_id (без case_id — все открытые чанки).
+        """
+        for cid in ([case_id] if case_id is not None else list(self._open)):
+            self._seal(cid)
+        await self._write()
+
+    async def _write(self):
+        insert = AsyncOrm.insert_chunks if self.storage == "chunks" else AsyncOrm.insert_signals
+        async with self._flush_lock:
+            try:
+                while self._rows:
+                    batch = self._rows[:self.max_rows]
+                    del self._rows[:self.max_rows]
+                    try:
+                        if self.storage == "chunks":
+                            batch = await self._assign_chunk_ids(batch)
+                        inserted = await insert(batch)
+                    except BaseException:
+                        self._rows[:0] = batch
+                        raise
+                    if inserted < len(batch):
+                        print(f"raw ingest: dropped {len(batch) - inserted} invalid {self.storage}")
+            finally:
+                async with self._space:
+                    self._space.notify_all()
+
+    @staticmethod
+    async def _assign_chunk_ids(batch: List[Dict]) -> List[Dict]:
+        """
+        Назначает id новым строкам чанков. Сегменты чанка, закрытого в этом
+        же пакете, не пишутся — их данные уже в итоговой строке; итоговая
+        строка получает replaces — id записанных ранее сегментов.
+        """
+        closed = {id(r["builder"]) for r in batch if r.get("builder") is not None and r["final"]}
+        batch = [
+            r for r in batch
+            if r.get("builder") is None or r["final"] or id(r["builder"]) not in closed
+        ]
+        fresh = [r for r in batch if r.get("builder") is not None]
+        for r, chunk_id in zip(fresh, await AsyncOrm.next_chunk_ids(len(fresh))):
+            builder = r.pop("builder")
+            r["id"] = chunk_id
+            if r["final"]:
+                r["replaces"] = list(builder.segment_ids)
+            else:
+                builder.segment_ids.append(chunk_id)
+        return batch
+
+    async def stop(self):
+        """Останавливает фоновую запись и сбрасывает остаток."""
+        if self._task is not None:
+            # фоновая задача завершается сама после очередного сброса,
+            # чтобы не прерывать вставку на середине
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                self._seal_stale()
+                self._checkpoint()
+                await self._write()
+            except Exception as e:
+                print(f"raw ingest flush failed ({len(self._rows)} {self.storage} pending): {e}")
+                if not self._closing:
+                    await asyncio.sleep(1.0)
+
+
+raw_ingest = RawIngestBuffer(
+    flush_ms=float(os.getenv("RAW_FLUSH_MS", "250")),
+    max_rows=int(os.getenv("RAW_FLUSH_ROWS", "1000")),
+    max_pending=int(os.getenv("RAW_MAX_PENDING", "50000")),
+    storage=RAW_STORAGE,
+    chunk_seconds=float(os.getenv("RAW_CHUNK_SECONDS", "60")),
+    chunk_flush_seconds=float(os.getenv("RAW_CHUNK_FLUSH_S", "5")),
+)
@@ -0,0 +1,241 @@
+"""
+Общий клиент ML-сервиса для WS-инжеста и симуляции.
+
+- Один httpx.AsyncClient с keep-alive пулом соединений на процесс
+  (вместо нового клиента и TCP-соединения на каждый вызов).
+- Ограничение одновременных вызовов: глобально (ML_MAX_INFLIGHT) и на
+  обследование (ML_MAX_INFLIGHT_PER_CASE). Вызов сверх лимита по
+  обследованию сразу отклоняется, глобальный слот ждём не дольше
+  ML_QUEUE_TIMEOUT_S — для онлайна лучше пропустить шаг, чем копить очередь.
+- Бюджет времени: ML_TIMEOUT_S на запрос, ML_CONNECT_TIMEOUT_S на соединение.
+- Circuit breaker: после ML_BREAKER_FAILURES ошибок подряд вызовы
+  ML_BREAKER_RESET_S секунд отклоняются без обращения к сервису, затем
+  пропускается один пробный вызов (half-open).
+- Гистограмма задержек и счётчики исходов: stats(), GET /metrics/ml-client.
+- feature_names() — признаки, которые возвращает ML-сервис (GET /features
+  рядом с ML_URL), с кэшем на ML_FEATURES_TTL_S секунд; по ним проверяются
+  ключи политики сохранения признаков.
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+# верхние границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class MLUnavailable(RuntimeError):
+    """Вызов ML отклонён без обращения к сервису (breaker открыт, лимиты)."""
+
+
+class MLClient:
+    def __init__(
+        self,
+        url: Optional[str],
+        *,
+        max_inflight: int = 32,
+        max_inflight_per_case: int = 1,
+        timeout_s: float = 5.0,
+        connect_timeout_s: float = 1.0,
+        queue_timeout_s: float = 1.0,
+        breaker_failures: int = 5,
+        breaker_reset_s: float = 10.0,
+        features_ttl_s: float = 300.0,
+    ):
+        self.url = url
+        self.max_inflight = max(1, max_inflight)
+        self.max_inflight_per_case = max(1, max_inflight_per_case)
+        self.timeout = httpx.Timeout(timeout_s, connect=connect_timeout_s)
+        self.queue_timeout_s = queue_timeout_s
+        self.breaker_failures = max(1, breaker_failures)
+        self.breaker_reset_s = breaker_reset_s
+        self.features_ttl_s = features_ttl_s
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._per_case: Dict[int, int] = {}
+        self._inflight = 0
+
+        # circuit breaker
+        self._failures = 0
+        self._open_until = 0.0
+        self._probe = False
+
+        # кэш feature_names(): (список, время получения)
+        self._features: Optional[List[str]] = None
+        self._features_at = 0.0
+
+        # метрики
+        self.outcomes = Counter()
+        self._hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._latency_sum = 0.0
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_inflight,
+                    max_keepalive_connections=self.max_inflight,
+                ),
+            )
+            self._slots = asyncio.Semaphore(self.max_inflight)
+        return self._client
+
+    @property
+    def state(self) -> str:
+        if self._failures < self.breaker_failures:
+            return "closed"
+        return "open" if time.monotonic() < self._open_until or self._probe else "half_open"
+
+    def _admit(self) -> bool:
+        """
+        Решение breaker'а: пропустить вызов или отказать сразу.
+        Возвращает True, если вызов — пробный (half-open): только он
+        освобождает слот пробы, вызовы, начатые до открытия, — нет.
+        """
+        state = self.state
+        if state == "open":
+            self.outcomes["breaker_open"] += 1
+            raise MLUnavailable("ML service circuit is open")
+        if state == "half_open":
+            self._probe = True  # пробный вызов — один, остальные ждут его исхода
+            return True
+        return False
+
+    def _record(self, ok: bool, elapsed: float, probe: bool):
+        if ok:
+            self._failures = 0
+        else:
+            self._failures += 1
+            if self._failures >= self.breaker_failures:
+                self._open_until = time.monotonic() + self.breaker_reset_s
+        if probe:
+            self._probe = False
+        ms = elapsed * 1000.0
+        self._hist[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self._latency_sum += ms
+
+    async def predict(self, payload: dict, case_id: Optional[int] = None) -> dict:
+        """POST окна в ML-сервис; ответ — JSON сервиса (proba, label, alert, features)."""
+        if not self.url:
+            raise RuntimeError("ML_URL is not set")
+        client = self._ensure_client()
+        probe = self._admit()
+
+        if case_id is not None:
+            if self._per_case.get(case_id, 0) >= self.max_inflight_per_case:
+                self.outcomes["case_busy"] += 1
+                if probe:
+                    self._probe = False
+                raise MLUnavailable(f"ML call for case {case_id} is already in flight")
+            self._per_case[case_id] = self._per_case.get(case_id, 0) + 1
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_s)
+            except asyncio.TimeoutError:
+                self.outcomes["queue_timeout"] += 1
+                if probe:
+                    self._probe = False
+                raise MLUnavailable("too many ML calls in flight") from None
+
+            self._inflight += 1
+            t0 = time.perf_counter()
+            ok: Optional[bool] = None  # None — вызов отменён, breaker не трогаем
+            try:
+                r = await client.post(self.url, json=payload)
+                r.raise_for_status()
+                res = r.json()
+                ok = True
+                self.outcomes["ok"] += 1
+                return res
+            except httpx.HTTPStatusError as e:
+                # 4xx — ошибка запроса, а не недоступность сервиса
+                self.outcomes["http_error"] += 1
+                ok = e.response.status_code < 500
+                raise
+            except httpx.TimeoutException:
+                self.outcomes["timeout"] += 1
+                ok = False
+                raise
+            except Exception:
+                self.outcomes["error"] += 1
+                ok = False
+                raise
+            finally:
+                self._inflight -= 1
+                self._slots.release()
+                if ok is not None:
+                    self._record(ok, time.perf_counter() - t0, probe)
+                elif probe:
+                    self._probe = False
+        finally:
+            if case_id is not None:
+                n = self._per_case.get(case_id, 1) - 1
+                if n > 0:
+                    self._per_case[case_id] = n
+                else:
+                    self._per_case.pop(case_id, None)
+
+    async def feature_names(self) -> Optional[List[str]]:
+        """
+        Признаки, которые ML-сервис вычисляет и возвращает в ответе
+        (модель и ML_EXTRA_FEATURES). None — сервис не ответил.
+        """
+        if not self.url:
+            return None
+        if self._features is not None and time.monotonic() - self._features_at < self.features_ttl_s:
+            return self._features
+        try:
+            r = await self._ensure_client().get(httpx.URL(self.url).join("features"))
+            r.raise_for_status()
+            self._features = list(r.json()["features"])
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            print(f"ml client: feature list is unavailable: {e}")
+            return None
+        self._features_at = time.monotonic()
+        return self._features
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        """Состояние breaker'а, загрузка, исходы вызовов и гистограмма задержек (мс)."""
+        n = sum(self._hist)
+        buckets = {f"le_{b}": c for b, c in zip(LATENCY_BUCKETS_MS, self._hist)}
+        buckets["le_inf"] = self._hist[-1]
+        return {
+            "url": self.url,
+            "breaker": self.state,
+            "consecutive_failures": self._failures,
+            "inflight": self._inflight,
+            "max_inflight": self.max_inflight,
+            "max_inflight_per_case": self.max_inflight_per_case,
+            "outcomes": dict(self.outcomes),
+            "latency_ms": {
+                "count": n,
+                "mean": (self._latency_sum / n) if n else 0.0,
+                "buckets": buckets,
+            },
+        }
+
+
+ml_client = MLClient(
+    os.getenv("ML_URL"),
+    max_inflight=int(os.getenv("ML_MAX_INFLIGHT", "32")),
+    max_inflight_per_case=int(os.getenv("ML_MAX_INFLIGHT_PER_CASE", "1")),
+    timeout_s=float(os.getenv("ML_TIMEOUT_S", "5.0")),
+    connect_timeout_s=float(os.getenv("ML_CONNECT_TIMEOUT_S", "1.0")),
+    queue_timeout_s=float(os.getenv("ML_QUEUE_TIMEOUT_S", "1.0")),
+    breaker_failures=int(os.getenv("ML_BREAKER_FAILURES", "5")),
+    breaker_reset_s=float(os.getenv("ML_BREAKER_RESET_S", "10.0")),
+    features_ttl_s=float(os.getenv("ML_FEATURES_TTL_S", "300")),
+)
@@ -0,0 +1,214 @@
+"""
+Шина рассылки WS-сообщений между процессами бэкенда.
+
+WSManager доставляет сообщения своим подписчикам сам, а через шину
+публикует их для подписчиков, подключённых к другим воркерам uvicorn.
+
+Реализации (WS_PUBSUB):
+- "auto" (по умолчанию) — "postgres", если воркеров несколько
+  (WEB_CONCURRENCY > 1, переменная, из которой uvicorn берёт --workers),
+  иначе "local": одному процессу NOTIFY на каждый отсчёт не нужен;
+- "postgres" — LISTEN/NOTIFY в PostgreSQL, который уже
+  есть в стеке. Один канал на все обследования; каждый воркер слушает
+  его отдельным соединением asyncpg и отбрасывает свои же публикации.
+  Публикация не ждёт БД: сообщения копятся в очереди и отправляются
+  пакетом pg_notify одним обращением.
+- "local" — один процесс, шина ничего не делает.
+
+Формат уведомления: строки "<origin>\\n<case_id>\\n<f><json>..." — готовые
+JSON-тексты (кодирование один раз), f = "1" для сообщений, которые можно
+отбросить при переполнении очереди подписчика. Служебные события
+процессов (например, сброс кэша проверок WS-токена после отзыва) идут
+строкой "e<имя события>" и передаются обработчику on_event.
+"""
+
+import asyncio
+import os
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+import asyncpg
+
+from src.database import async_engine
+
+WS_PUBSUB = os.getenv("WS_PUBSUB", "auto").lower()
+WS_PUBSUB_CHANNEL = os.getenv("WS_PUBSUB_CHANNEL", "ctg_ws")
+
+# лимит payload у NOTIFY — 8000 байт
+NOTIFY_MAX_BYTES = 7900
+
+Frames = List[Tuple[str, bool]]  # (JSON-текст, можно отбросить)
+Deliver = Callable[[int, Frames], None]
+OnEvent = Callable[[str, int], None]  # (имя события, case_id)
+
+
+class LocalBus:
+    """Один процесс: доставка только локальным подписчикам."""
+
+    async def start(self, deliver: Deliver, on_event: Optional[OnEvent] = None):
+        pass
+
+    def publish(self, case_id: int, frames: Frames):
+        pass
+
+    def publish_event(self, name: str, case_id: int):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "local"}
+
+
+class PostgresBus:
+    """Рассылка между процессами через LISTEN/NOTIFY."""
+
+    def __init__(self, connect_kwargs: dict, channel: str = WS_PUBSUB_CHANNEL, max_pending: int = 10000):
+        self.connect_kwargs = connect_kwargs
+        self.channel = channel
+        self.max_pending = max_pending
+        self.origin = uuid.uuid4().hex[:12]
+        self._deliver: Optional[Deliver] = None
+        self._on_event: Optional[OnEvent] = None
+        self._pending: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # метрики
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.connected = False
+
+    async def start(self, deliver: Deliver, on_event: Optional[OnEvent] = None):
+        if self._tasks:
+            return
+        self._deliver = deliver
+        self._on_event = on_event
+        self._pending = asyncio.Queue(self.max_pending)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._listen()), loop.create_task(self._publish_loop())]
+
+    def publish(self, case_id: int, frames: Frames):
+        """Ставит сообщения в очередь публикации; не ждёт БД."""
+        if self._pending is None:
+            return
+        payload = "\n".join([self.origin, str(case_id), *(("1" if d else "0") + t for t, d in frames)])
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            self.dropped += 1
+            print(f"ws pubsub: message for case {case_id} is too large for NOTIFY, delivered locally only")
+            return
+        self._enqueue(payload)
+
+    def publish_event(self, name: str, case_id: int):
+        """Служебное событие для остальных процессов (без подписчиков WS)."""
+        if self._pending is None:
+            return
+        self._enqueue("\n".join([self.origin, str(case_id), "e" + name]))
+
+    def _enqueue(self, payload: str):
+        try:
+            self._pending.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _on_notify(self, conn, pid, channel, payload: str):
+        origin, case_id, *lines = payload.split("\n")
+        if origin == self.origin:
+            return
+        self.received += 1
+        frames = [(line[1:], line[0] == "1") for line in lines if line[0] != "e"]
+        if frames:
+            self._deliver(int(case_id), frames)
+        if self._on_event is not None:
+            for line in lines:
+                if line[0] == "e":
+                    self._on_event(line[1:], int(case_id))
+
+    async def _connect(self) -> asyncpg.Connection:
+        return await asyncpg.connect(**self.connect_kwargs)
+
+    async def _listen(self):
+        """Слушающее соединение; при обрыве — переподключение."""
+        while True:
+            conn = None
+            try:
+                conn = await self._connect()
+                closed = asyncio.get_running_loop().create_future()
+                conn.add_termination_listener(lambda c: closed.done() or closed.set_result(None))
+                await conn.add_listener(self.channel, self._on_notify)
+                self.connected = True
+                await closed
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ws pubsub listener error: {e}")
+            finally:
+                self.connected = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(1.0)
+
+    async def _publish_loop(self):
+        conn = None
+        try:
+            while True:
+                batch = [await self._pending.get()]
+                while not self._pending.empty() and len(batch) < 500:
+                    batch.append(self._pending.get_nowait())
+                try:
+                    if conn is None or conn.is_closed():
+                        conn = await self._connect()
+                    await conn.executemany("SELECT pg_notify($1, $2)", [(self.channel, p) for p in batch])
+                    self.published += len(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.dropped += len(batch)
+                    print(f"ws pubsub publish failed ({len(batch)} messages dropped): {e}")
+                    if conn is not None:
+                        conn.terminate()
+                    conn = None
+                    await asyncio.sleep(1.0)
+        finally:
+            if conn is not None:
+                conn.terminate()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "backend": "postgres",
+            "channel": self.channel,
+            "origin": self.origin,
+            "connected": self.connected,
+            "pending": self._pending.qsize() if self._pending is not None else 0,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+
+def resolve_backend(name: str, workers: int) -> str:
+    """Шина для WS_PUBSUB: "auto" — postgres только при нескольких воркерах."""
+    if name == "auto":
+        return "postgres" if workers > 1 else "local"
+    return name
+
+
+def make_bus():
+    backend = resolve_backend(WS_PUBSUB, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+    if backend == "local":
+        return LocalBus()
+    if backend == "postgres":
+        # параметры подключения те же, что у асинхронного движка
+        _, kwargs = async_engine.dialect.create_connect_args(async_engine.url)
+        return PostgresBus(kwargs)
+    raise ValueError(f"unknown WS_PUBSUB backend: {WS_PUBSUB!r}")
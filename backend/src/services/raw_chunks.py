@@ -0,0 +1,172 @@
+"""
+Колоночное хранение сырых сигналов чанками (RAW_STORAGE=chunks).
+
+Вместо строки raw_signals на каждую секунду (id, timestamp, два float8,
+case_id и ~24 байта заголовка кортежа) отсчёты обследования упаковываются
+в чанк — одну строку raw_chunks на RAW_CHUNK_SECONDS секунд:
+case_id, start_ts, end_ts, n_samples и data (bytea).
+
+Формат data (версия 1): байт версии + zlib от
+- n смещений времени от предыдущего отсчёта, мс (uint32; первое — 0),
+- n значений bpm (float32),
+- n значений uc (float32),
+все little-endian. Смещения почти всегда одинаковые (1000 мс при 1 Гц)
+и сжимаются практически в ноль; точность — миллисекунды по времени
+и float32 по значениям, чего для bpm/uc достаточно.
+
+Чанк собирается в памяти (ChunkBuilder) и закрывается, когда покрыл
+RAW_CHUNK_SECONDS секунд, время пошло назад или источник отключился.
+Пока чанк открыт, новые отсчёты периодически дописываются в БД
+сегментами — отдельными строками raw_chunks того же формата (только
+INSERT, строки не переписываются). При закрытии чанк записывается одной
+строкой, а его сегменты удаляются в той же транзакции; читатели склеивают
+любые строки обследования по времени, поэтому сегменты видны сразу.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+RAW_CHUNK_FORMAT = 1
+# предел отсчётов в одном чанке на случай источников с высокой частотой
+CHUNK_MAX_SAMPLES = 4096
+
+_LITTLE = sys.byteorder == "little"
+
+
+class RawSample(NamedTuple):
+    """Отсчёт, прочитанный из чанка (у него нет собственного id)."""
+    case_id: int
+    timestamp: datetime
+    bpm: float
+    uc: float
+    id: Optional[int] = None
+
+
+def _to_bytes(a: array) -> bytes:
+    if not _LITTLE:
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    a = array(typecode)
+    a.frombytes(data)
+    if not _LITTLE:
+        a.byteswap()
+    return a
+
+
+def encode_chunk(deltas_ms: array, bpm: array, uc: array) -> bytes:
+    body = _to_bytes(deltas_ms) + _to_bytes(bpm) + _to_bytes(uc)
+    return struct.pack("<B", RAW_CHUNK_FORMAT) + zlib.compress(body, 1)
+
+
+def _decode_body(n: int, data: bytes):
+    version = data[0]
+    if version != RAW_CHUNK_FORMAT:
+        raise ValueError(f"unknown raw chunk format: {version}")
+    body = zlib.decompress(data[1:])
+    deltas = _from_bytes("I", body[:4 * n])
+    bpm = _from_bytes("f", body[4 * n:8 * n])
+    uc = _from_bytes("f", body[8 * n:12 * n])
+    return deltas, bpm, uc
+
+
+def decode_chunk(case_id: int, start_ts: datetime, n: int, data: bytes) -> List[RawSample]:
+    """Отсчёты чанка в хронологическом порядке."""
+    deltas, bpm, uc = _decode_body(n, data)
+    out = []
+    offset = 0
+    for i in range(n):
+        offset += deltas[i]
+        out.append(RawSample(case_id, start_ts + timedelta(milliseconds=offset), bpm[i], uc[i]))
+    return out
+
+
+def decode_chunk_columns(start_ts: datetime, n: int, data: bytes) -> Tuple[List[float], array, array]:
+    """Колонки чанка без объектов отсчётов: (время POSIX, bpm, uc)."""
+    deltas, bpm, uc = _decode_body(n, data)
+    t0 = start_ts.timestamp()
+    times = []
+    offset = 0
+    for d in deltas:
+        offset += d
+        times.append(t0 + offset / 1000.0)
+    return times, bpm, uc
+
+
+def last_samples(rows: Iterable, samples: Iterable[RawSample], limit: int) -> list:
+    """
+    Последние limit отсчётов из строк raw_signals и отсчётов чанков
+    (в БД могут быть оба вида, если режим хранения меняли).
+    """
+    merged = sorted([*rows, *samples], key=lambda s: s.timestamp)
+    return merged[-limit:] if limit > 0 else []
+
+
+class ChunkBuilder:
+    """Открытый (ещё не записанный) чанк одного обследования."""
+
+    __slots__ = ("saved", "segments", "segment_ids", "case_id", "start_ts", "last_ts",
+                 "_last_ms", "_deltas", "_bpm", "_uc")
+
+    def __init__(self, case_id: int, start_ts: datetime):
+        self.saved = 0                    # отсчётов, уже поставленных в запись
+        self.segments = 0                 # сегментов, поставленных в запись
+        self.segment_ids: List[int] = []  # id записанных сегментов (удаляются при закрытии)
+        self.case_id = case_id
+        self.start_ts = start_ts
+        self.last_ts = start_ts
+        self._last_ms = 0
+        self._deltas = array("I")
+        self._bpm = array("f")
+        self._uc = array("f")
+
+    def __len__(self) -> int:
+        return len(self._bpm)
+
+    def accepts(self, timestamp: datetime, span_s: float) -> bool:
+        """Можно ли дописать отсчёт в этот чанк."""
+        return (
+            timestamp >= self.last_ts
+            and (timestamp - self.start_ts).total_seconds() < span_s
+            and len(self) < CHUNK_MAX_SAMPLES
+        )
+
+    def append(self, timestamp: datetime, bpm: float, uc: float):
+        ms = int(round((timestamp - self.start_ts).total_seconds() * 1000.0))
+        self._deltas.append(max(0, ms - self._last_ms))
+        self._bpm.append(bpm)
+        self._uc.append(uc)
+        self._last_ms = max(ms, self._last_ms)
+        self.last_ts = timestamp
+
+    def seal(self) -> dict:
+        """Строка raw_chunks со всеми отсчётами чанка."""
+        self.saved = len(self)
+        return self._row(0)
+
+    def segment(self) -> dict:
+        """Строка raw_chunks с отсчётами, добавленными после прошлой записи."""
+        start, self.saved = self.saved, len(self)
+        self.segments += 1
+        return self._row(start)
+
+    def _row(self, start: int) -> dict:
+        deltas = self._deltas[start:]
+        # первый отсчёт строки — её start_ts
+        first_ts = self.start_ts + timedelta(milliseconds=sum(self._deltas[:start + 1]))
+        deltas[0] = 0
+        return {
+            "id": None,
+            "case_id": self.case_id,
+            "start_ts": first_ts,
+            "end_ts": self.last_ts,
+            "n_samples": len(self) - start,
+            "data": encode_chunk(deltas, self._bpm[start:], self._uc[start:]),
+        }
@@ -0,0 +1,133 @@
+"""
+Обслуживание хранения временных рядов: секции raw_signals/predictions и retention.
+
+raw_signals секционирована по timestamp, predictions — по created_at
+(RANGE, секции по RAW_PARTITION_DAYS дней; колонка берётся из модели).
+Задача обслуживания:
+- заранее создаёт секции на RAW_PARTITIONS_AHEAD интервалов вперёд
+  (и секцию DEFAULT для строк вне диапазонов);
+- при RAW_RETENTION_DAYS > 0 убирает секции raw_signals старше срока
+  целиком: DROP (RAW_RETENTION_MODE=drop) или DETACH — секция остаётся
+  отдельной таблицей для архивации (pg_dump) и удаляется вручную;
+- при PREDICTIONS_RETENTION_DAYS > 0 так же (DROP) убирает старые секции
+  predictions (признаки хранятся в той же строке);
+- чанки raw_chunks (RAW_STORAGE=chunks) старше RAW_RETENTION_DAYS
+  удаляются пакетным DELETE.
+
+Секционированными таблицы создаются только в новой БД: существующая
+обычная таблица автоматически не перестраивается (это перезапись всех
+строк), для неё retention выполняется пакетным DELETE, а в режиме detach
+не выполняется вовсе — архивировать нечего, удалять строки молча нельзя.
+Ручной перенос описан в backend/README.md.
+
+Запускается при старте приложения и далее раз в RETENTION_INTERVAL_S
+секунд; проход выполняется под SyncOrm.schema_lock, поэтому воркеры
+не создают и не удаляют секции одновременно.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from src.queries.sync_orm import SyncOrm, partition_column
+
+RAW_TABLE = "raw_signals"
+PREDICTIONS_TABLE = "predictions"
+CHUNK_TABLE = "raw_chunks"
+
+
+class StorageMaintenance:
+    def __init__(
+        self,
+        *,
+        partition_days: int = 7,
+        partitions_ahead: int = 2,
+        raw_retention_days: int = 0,
+        raw_retention_mode: str = "drop",
+        predictions_retention_days: int = 0,
+        interval_s: float = 3600.0,
+    ):
+        if raw_retention_mode not in ("drop", "detach"):
+            raise ValueError(f"unknown RAW_RETENTION_MODE: {raw_retention_mode!r}")
+        self.partition_interval = timedelta(days=max(1, partition_days))
+        self.partitions_ahead = max(0, partitions_ahead)
+        self.raw_retention = timedelta(days=raw_retention_days) if raw_retention_days > 0 else None
+        self.detach = raw_retention_mode == "detach"
+        self.predictions_retention = timedelta(days=predictions_retention_days) if predictions_retention_days > 0 else None
+        self.interval_s = interval_s
+        self._task: Optional[asyncio.Task] = None
+        self._warned = set()
+        self.last_run: dict = {}
+
+    def run_once(self, now: Optional[datetime] = None) -> dict:
+        """Один проход обслуживания (синхронно). Возвращает отчёт."""
+        now = now or datetime.now(timezone.utc)
+        report = {"at": now.isoformat()}
+        with SyncOrm.schema_lock():
+            report[RAW_TABLE] = self._maintain(RAW_TABLE, self.raw_retention, self.detach, now)
+            report[PREDICTIONS_TABLE] = self._maintain(PREDICTIONS_TABLE, self.predictions_retention, False, now)
+            if self.raw_retention is not None:
+                # чанки (RAW_STORAGE=chunks): строк в десятки раз меньше, хватает DELETE
+                report["chunks_deleted"] = SyncOrm.delete_rows_before(CHUNK_TABLE, "end_ts", now - self.raw_retention)
+        self.last_run = report
+        return report
+
+    def _maintain(self, table: str, retention: Optional[timedelta], detach: bool, now: datetime) -> dict:
+        """Секции и retention одной таблицы."""
+        out = {"partitioned": SyncOrm.is_partitioned(table)}
+        if out["partitioned"]:
+            out["created"] = SyncOrm.ensure_partitions(table, now, self.partition_interval, self.partitions_ahead)
+            if retention is not None:
+                out["detached" if detach else "dropped"] = SyncOrm.drop_partitions_before(
+                    table, now - retention, detach=detach
+                )
+            return out
+
+        if table not in self._warned:
+            self._warned.add(table)
+            print(f"storage maintenance: {table} is not partitioned (created before partitioning), "
+                  f"retention falls back to batched DELETE; see backend/README.md to migrate")
+        if retention is None:
+            return out
+        if detach:
+            out["skipped"] = "detach requires a partitioned table"
+        else:
+            out["deleted"] = SyncOrm.delete_rows_before(table, partition_column(table), now - retention)
+        return out
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                report = await asyncio.to_thread(self.run_once)
+                tables = (report[RAW_TABLE], report[PREDICTIONS_TABLE])
+                if report.get("chunks_deleted") or any(
+                    t.get(k) for t in tables for k in ("created", "dropped", "detached", "deleted")
+                ):
+                    print(f"storage maintenance: {report}")
+            except Exception as e:
+                print(f"storage maintenance failed: {e}")
+
+
+storage_maintenance = StorageMaintenance(
+    partition_days=int(os.getenv("RAW_PARTITION_DAYS", "7")),
+    partitions_ahead=int(os.getenv("RAW_PARTITIONS_AHEAD", "2")),
+    raw_retention_days=int(os.getenv("RAW_RETENTION_DAYS", "0")),
+    raw_retention_mode=os.getenv("RAW_RETENTION_MODE", "drop").lower(),
+    predictions_retention_days=int(os.getenv("PREDICTIONS_RETENTION_DAYS", "0")),
+    interval_s=float(os.getenv("RETENTION_INTERVAL_S", "3600")),
+)
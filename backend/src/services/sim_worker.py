@@ -9,19 +9,15 @@ import asyncio
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 
-import httpx
 from src.queries.async_orm import AsyncOrm
+from src.services.window_buffer import window_buffers
+from src.services.ingest_buffer import raw_ingest
+from src.services.ml_client import ml_client
+from src.services.feature_policy import FeaturePolicy, default_policy
 
-WINDOW_SECONDS = 300
 DEFAULT_H_MIN = 5.0  # мин вперёд
 STRIDE_S = 1.0
 
-async def call_ml(payload: dict) -> dict:
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        resp = await client.post(os.getenv("ML_URL"), json=payload)
-        resp.raise_for_status()
-        return resp.json()
-
 async def start_stream_worker(case_id: int, hz: float, H_min: float = DEFAULT_H_MIN, stride_s: float = 1.0):
     """
     Читает CSV, на каждом тике берёт следующую строку (t,bpm,uc),
@@ -52,23 +48,29 @@ async def start_stream_worker(case_id: int, hz: float, H_min: float = DEFAULT_H_
     start_wall_clock = datetime.now(timezone.utc)
     i = 0
 
+    # какие признаки ML запрашивать и сохранять с предсказаниями
+    feature_tracker = FeaturePolicy.from_dict(
+        await AsyncOrm.get_case_feature_policy(case_id), default_policy
+    ).tracker()
+    # окно в памяти: заполняется из БД один раз при старте
+    window = await window_buffers.acquire(case_id)
+
     try:
-        last_ml_ts: datetime | None = None
+        last_ml_ts: float | None = None
         while True:
             t_sec, bpm, uc = rows[i]
             ts = start_wall_clock + timedelta(seconds=t_sec)
 
-            await AsyncOrm.insert_signal(case_id, ts, bpm, uc)
+            await raw_ingest.add(case_id, ts, bpm, uc)
+            window.append(ts.timestamp(), bpm, uc)
 
-            window = await AsyncOrm.get_window(case_id, limit=WINDOW_SECONDS)
-            if len(window) >= WINDOW_SECONDS:
-                t0 = window[0].timestamp
-                now_ts = window[-1].timestamp
+            if window.full:
+                now_ts = window.last_ts
                 # дергаем ML не чаще stride_s
                 if last_ml_ts and now_ts <= last_ml_ts:
                     last_ml_ts = None
                     
-                if last_ml_ts and (now_ts - last_ml_ts).total_seconds() < float(stride_s):
+                if last_ml_ts and (now_ts - last_ml_ts) < float(stride_s):
                     # пропускаем вызов ML, но двигаем источник и спим, иначе зациклимся на одной точке
                     i += 1
                     if i >= len(rows):
@@ -76,22 +78,20 @@ async def start_stream_worker(case_id: int, hz: float, H_min: float = DEFAULT_H_
                     await asyncio.sleep(period)
                     continue
                 payload = {
-                    "window": {
-                        "t": [(s.timestamp - t0).total_seconds() for s in window],
-                        "bpm": [float(s.bpm) for s in window],
-                        "uc": [float(s.uc) for s in window],
-                    },
-                    "H": float(H_min)
+                    "window": window.window_payload(),
+                    "H": float(H_min),
+                    "case_id": case_id,
+                    "features": feature_tracker.request_keys(),
                 }
                 try:
-                    ml_res = await call_ml(payload)
+                    ml_res = await ml_client.predict(payload, case_id=case_id)
                     await AsyncOrm.insert_prediction(
                         case_id,
                         ml_res.get("model_name", "model_v1"),
                         float(ml_res.get("proba", 0.0)),
                         int(ml_res.get("label", 0)),
                         bool(ml_res.get("alert", False)),
-                        ml_res.get("features") or {},
+                        feature_tracker.persist(ml_res.get("features"), bool(ml_res.get("alert", False))),
                     )
                     last_ml_ts = now_ts
                 except Exception as e:
@@ -107,4 +107,10 @@ async def start_stream_worker(case_id: int, hz: float, H_min: float = DEFAULT_H_
         raise
     except Exception as e:
         print(f"stream worker crashed case {case_id}: {e}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        await window_buffers.release(case_id)
+        try:
+            await raw_ingest.flush(case_id)
+        except Exception as e:
+            print(f"raw ingest flush failed for case {case_id}: {e}")
\ No newline at end of file
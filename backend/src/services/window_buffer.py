@@ -0,0 +1,144 @@
+"""
+Кольцевые буферы окна сигналов по обследованиям.
+
+Для вызова ML на каждом отсчёте нужны последние WINDOW_SECONDS точек
+(t, bpm, uc). Вместо запроса к БД на каждый отсчёт окно хранится
+в памяти: буфер заполняется из БД один раз при (пере)подключении
+источника, дальше в него дописываются новые отсчёты.
+"""
+
+import asyncio
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from src.queries.async_orm import AsyncOrm
+from src.services.ingest_buffer import raw_ingest
+
+WINDOW_SECONDS = 300
+
+
+class CaseWindow:
+    """
+    Последние size отсчётов одного обследования.
+
+    Каждая точка пишется дважды (pos и pos + size), поэтому окно всегда
+    лежит в массиве непрерывным срезом и собирается без сдвигов.
+    Время хранится как POSIX-секунды (float).
+    """
+
+    __slots__ = ("size", "_t", "_bpm", "_uc", "_head", "_count")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._t = array("d", bytes(16 * size))
+        self._bpm = array("d", bytes(16 * size))
+        self._uc = array("d", bytes(16 * size))
+        self._head = 0   # позиция следующей записи
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        return self._count == self.size
+
+    @property
+    def last_ts(self) -> Optional[float]:
+        return self._t[(self._head - 1) % self.size] if self._count else None
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    def append(self, ts: float, bpm: float, uc: float):
+        """
+        Добавляет отсчёт. Если время пошло назад (новая временная шкала,
+        например повтор CSV в симуляции), окно начинается заново.
+        """
+        if self._count and ts < self.last_ts:
+            self.clear()
+        i, j = self._head, self._head + self.size
+        self._t[i] = self._t[j] = ts
+        self._bpm[i] = self._bpm[j] = bpm
+        self._uc[i] = self._uc[j] = uc
+        self._head = (i + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+
+    def _slice(self) -> slice:
+        if self.full:
+            return slice(self._head, self._head + self.size)
+        return slice(0, self._count)
+
+    def arrays(self) -> Tuple[List[float], List[float], List[float]]:
+        """Окно в хронологическом порядке: (время POSIX, bpm, uc)."""
+        s = self._slice()
+        return self._t[s].tolist(), self._bpm[s].tolist(), self._uc[s].tolist()
+
+    def window_payload(self) -> dict:
+        """Окно в формате ML-сервиса: t — секунды от начала окна."""
+        ts, bpm, uc = self.arrays()
+        t0 = ts[0] if ts else 0.0
+        return {"t": [x - t0 for x in ts], "bpm": bpm, "uc": uc}
+
+
+class WindowBuffers:
+    """
+    Буферы по case_id со счётчиком источников: буфер заполняется из БД
+    при первом acquire и удаляется, когда последний источник отключился.
+
+    Общей блокировки нет: заполнение из БД идёт отдельной задачей на case_id,
+    одновременные acquire того же обследования ждут её, а другие
+    обследования не ждут чужих flush/get_window.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._windows: Dict[int, CaseWindow] = {}
+        self._refs: Dict[int, int] = {}
+        self._loading: Dict[int, asyncio.Task] = {}
+
+    async def acquire(self, case_id: int) -> CaseWindow:
+        """Буфер обследования; при первом подключении — заполнить из БД."""
+        self._refs[case_id] = self._refs.get(case_id, 0) + 1
+        try:
+            win = self._windows.get(case_id)
+            if win is None:
+                task = self._loading.get(case_id)
+                if task is None:
+                    task = self._loading[case_id] = asyncio.ensure_future(self._load(case_id))
+                # отмена одного ожидающего не отменяет заполнение для остальных
+                win = await asyncio.shield(task)
+            return win
+        except BaseException:
+            self._unref(case_id)
+            raise
+
+    async def _load(self, case_id: int) -> CaseWindow:
+        try:
+            # отсчёты из очереди записи должны попасть в окно из БД
+            await raw_ingest.flush(case_id)
+            win = CaseWindow(self.size)
+            for s in await AsyncOrm.get_window(case_id, limit=self.size):
+                win.append(s.timestamp.timestamp(), float(s.bpm), float(s.uc))
+            # все источники могли отключиться, пока шло чтение
+            if self._refs.get(case_id):
+                self._windows[case_id] = win
+            return win
+        finally:
+            self._loading.pop(case_id, None)
+
+    async def release(self, case_id: int):
+        self._unref(case_id)
+
+    def _unref(self, case_id: int):
+        n = self._refs.get(case_id, 0) - 1
+        if n > 0:
+            self._refs[case_id] = n
+        else:
+            self._refs.pop(case_id, None)
+            self._windows.pop(case_id, None)
+
+
+window_buffers = WindowBuffers(WINDOW_SECONDS)
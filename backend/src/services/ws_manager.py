@@ -1,32 +1,288 @@
-from typing import Dict, Set
-from fastapi import WebSocket
-from asyncio import Lock
+"""
+Комнаты WebSocket по case_id и неблокирующая рассылка.
+
+У каждого подписчика своя ограниченная очередь исходящих сообщений
+и задача-писатель: broadcast только раскладывает сообщение по очередям
+и не ждёт сети, поэтому медленный клиент не тормозит приём сигналов
+и других зрителей.
+
+Переполнение очереди (WS_SEND_QUEUE сообщений):
+- raw: вытесняется самый старый raw в очереди (или отбрасывается новый,
+  если в очереди только важные сообщения);
+- prediction / alert и служебные сообщения не отбрасываются никогда:
+  если для них нет места, подписчик отключается как отстающий;
+- подписчик отключается и тогда, когда самое старое неотправленное
+  сообщение ждёт дольше WS_MAX_LAG_S секунд.
+
+Сообщение кодируется в JSON один раз на рассылку (orjson, если установлен)
+и уходит всем подписчикам готовым текстом. Сообщения одного отсчёта
+(prediction, alert, raw) рассылаются вместе: подписчики с ?batch=1
+получают их одним кадром {"type": "batch", "payload": [...]}.
+
+Между воркерами uvicorn сообщения передаются через шину (services.pubsub,
+WS_PUBSUB): своим подписчикам менеджер доставляет напрямую, остальным
+воркерам — публикацией готовых JSON-текстов.
+
+Соединение, которое присылает отсчёты (источник), выводится из рассылки
+комнаты (detach): отчёты по своим же данным ему не нужны, а источник,
+не читающий сокет, иначе был бы отключён как отстающий (1013)
+и приём остановился бы.
+
+Метрики очередей и задержек по подписчикам: stats(), GET /metrics/ws.
+"""
+
+import asyncio
+import os
+import time
+import json
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from fastapi import WebSocket, status
+
+from src.services.pubsub import Frames, make_bus
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - без orjson работает стандартный json
+    orjson = None
+
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "256"))
+WS_MAX_LAG_S = float(os.getenv("WS_MAX_LAG_S", "10"))
+
+# типы сообщений, которые можно отбрасывать при переполнении
+DROPPABLE = {"raw"}
+
+
+def encode(message) -> str:
+    """JSON-текст сообщения для отправки текстовым кадром."""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+
+class Subscriber:
+    """Очередь исходящих сообщений и писатель одного WebSocket."""
+
+    def __init__(self, ws: WebSocket, max_queue: int = WS_SEND_QUEUE, max_lag_s: float = WS_MAX_LAG_S, batch: bool = False):
+        self.ws = ws
+        self.batch = batch  # принимает сообщения отсчёта одним кадром
+        self.max_queue = max(1, max_queue)
+        self.max_lag_s = max_lag_s
+        self._queue: deque = deque()  # (время постановки, можно отбросить, JSON-текст)
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.evicting = False
+        # метрики
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def lag(self) -> float:
+        """Сколько ждёт самое старое неотправленное сообщение, с."""
+        return time.monotonic() - self._queue[0][0] if self._queue else 0.0
+
+    def send(self, message: dict) -> bool:
+        """Личное сообщение подписчику (hello, ml_error) через его очередь."""
+        return self.offer(encode(message), message.get("type") in DROPPABLE)
+
+    def offer(self, text: str, droppable: bool = False) -> bool:
+        """
+        Ставит готовый JSON-текст в очередь без ожидания.
+        False — подписчик не успевает и должен быть отключён.
+        """
+        if self.closed:
+            return False
+        if self._queue and self.lag > self.max_lag_s:
+            return False
+        if len(self._queue) >= self.max_queue:
+            victim = next((i for i, item in enumerate(self._queue) if item[1]), None)
+            if victim is not None:
+                del self._queue[victim]
+                self.dropped += 1
+            elif droppable:
+                self.dropped += 1
+                return True
+            else:
+                return False
+        self._queue.append((time.monotonic(), droppable, text))
+        self._ready.set()
+        return True
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                queued_at, _, text = self._queue.popleft()
+                await self.ws.send_text(text)
+                self.sent += 1
+                self.max_lag = max(self.max_lag, time.monotonic() - queued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # сокет умер: дальше не пишем, комната уберёт подписчика
+            self.closed = True
+
+    async def stop(self, code: Optional[int] = None):
+        """Останавливает писателя; с code — закрывает сокет."""
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        if code is not None:
+            try:
+                await self.ws.close(code=code)
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "lag_ms": self.lag * 1000.0,
+            "max_lag_ms": self.max_lag * 1000.0,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
 
 class WSManager:
     def __init__(self):
-        self._rooms: Dict[int, Set[WebSocket]] = {}
-        self._lock = Lock()
-    # Добавляем соединение в комнату
-    async def join(self, case_id: int, ws: WebSocket):
+        self._rooms: Dict[int, Dict[WebSocket, Subscriber]] = {}
+        self._lock = asyncio.Lock()
+        self._evictions: set = set()
+        self.evicted = 0
+        self.bus = make_bus()
+        self._bus_started = False
+        self._event_handlers: Dict[str, List[Callable[[int], None]]] = {}
+
+    async def start(self):
+        """Подключает шину между процессами (при первом join/broadcast)."""
+        if not self._bus_started:
+            self._bus_started = True
+            await self.bus.start(self._deliver, self._on_event)
+
+    def on_event(self, name: str, handler: Callable[[int], None]):
+        """Регистрирует обработчик служебного события (handler(case_id))."""
+        self._event_handlers.setdefault(name, []).append(handler)
+
+    async def publish_event(self, name: str, case_id: int):
+        """Служебное событие: обрабатывается в этом процессе и во всех остальных."""
+        await self.start()
+        self._on_event(name, case_id)
+        self.bus.publish_event(name, case_id)
+
+    def _on_event(self, name: str, case_id: int):
+        for handler in self._event_handlers.get(name, ()):
+            handler(case_id)
+
+    async def stop(self):
+        await self.bus.stop()
+        self._bus_started = False
+
+    # Добавляем соединение в комнату; писатель стартует сразу
+    async def join(self, case_id: int, ws: WebSocket, batch: bool = False) -> Subscriber:
+        await self.start()
+        sub = Subscriber(ws, batch=batch)
+        sub.start()
         async with self._lock:
-            self._rooms.setdefault(case_id, set()).add(ws)
-    # Удаляем и чистим пустые комнаты
-    async def leave(self, case_id: int, ws: WebSocket):
+            self._rooms.setdefault(case_id, {})[ws] = sub
+        return sub
+
+    async def detach(self, case_id: int, ws: WebSocket):
+        """
+        Убирает соединение из рассылки комнаты, не останавливая его писателя:
+        источник данных (usb_bridge, csv_ws_publisher) получает только личные
+        сообщения (hello, ml_error) и не отключается как отстающий, даже если
+        не читает сокет. Писатель останавливает владелец (Subscriber.stop).
+        """
         async with self._lock:
-            if case_id in self._rooms:
-                self._rooms[case_id].discard(ws)
-                if not self._rooms[case_id]:
+            room = self._rooms.get(case_id)
+            if room is not None:
+                room.pop(ws, None)
+                if not room:
                     self._rooms.pop(case_id, None)
 
+    # Удаляем и чистим пустые комнаты
+    async def leave(self, case_id: int, ws: WebSocket, code: Optional[int] = None):
+        async with self._lock:
+            room = self._rooms.get(case_id)
+            sub = room.pop(ws, None) if room is not None else None
+            if room is not None and not room:
+                self._rooms.pop(case_id, None)
+        if sub is not None:
+            await sub.stop(code)
+
     async def broadcast(self, case_id: int, message: dict):
-        # молча удаляем "мертвые" сокеты
-        dead = []
-        for ws in list(self._rooms.get(case_id, [])):
-            try:
-                await ws.send_json(message)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            await self.leave(case_id, ws)
+        await self.broadcast_many(case_id, [message])
+
+    async def broadcast_many(self, case_id: int, messages: List[dict]):
+        """
+        Рассылает сообщения одного отсчёта. Каждое кодируется один раз;
+        подписчикам с batch — одним кадром-конвертом из тех же закодированных строк.
+        Те же тексты публикуются в шину для подписчиков других воркеров.
+        """
+        if not messages:
+            return
+        await self.start()
+        singles = [(encode(m), m.get("type") in DROPPABLE) for m in messages]
+        self._deliver(case_id, singles)
+        self.bus.publish(case_id, singles)
+
+    def _deliver(self, case_id: int, singles: Frames):
+        """Раскладывает закодированные сообщения по очередям подписчиков процесса."""
+        room = self._rooms.get(case_id)
+        if not room:
+            return
+        envelope = None
+        for ws, sub in list(room.items()):
+            if sub.batch and len(singles) > 1:
+                if envelope is None:
+                    # конверт собирается из уже закодированных сообщений
+                    text = '{"type":"batch","payload":[' + ",".join(t for t, _ in singles) + "]}"
+                    envelope = (text, all(d for _, d in singles))
+                ok = sub.offer(*envelope)
+            else:
+                ok = all([sub.offer(text, droppable) for text, droppable in singles])
+            if not ok:
+                self._evict(case_id, ws, sub)
+
+    def _evict(self, case_id: int, ws: WebSocket, sub: Subscriber):
+        # мёртвых и отстающих отключаем в фоне, не задерживая рассылку
+        if sub.evicting:
+            return
+        sub.evicting = True
+        self.evicted += 1
+        task = asyncio.get_running_loop().create_task(
+            self.leave(case_id, ws, code=status.WS_1013_TRY_AGAIN_LATER)
+        )
+        self._evictions.add(task)
+        task.add_done_callback(self._evictions.discard)
+
+    def stats(self) -> dict:
+        """Метрики очередей подписчиков по комнатам."""
+        return {
+            "send_queue": WS_SEND_QUEUE,
+            "max_lag_s": WS_MAX_LAG_S,
+            "evicted": self.evicted,
+            "bus": self.bus.stats(),
+            "rooms": {
+                case_id: [sub.stats() for sub in room.values()]
+                for case_id, room in self._rooms.items()
+            },
+        }
 
-manager = WSManager()
\ No newline at end of file
+manager = WSManager()
@@ -0,0 +1,58 @@
+"""
+Тесты бэкенда запускаются из каталога backend/ (модули — src.*):
+
+    cd backend && python -m pytest -q tests
+
+Настройки БД берутся из окружения, как у приложения; без них подставляются
+значения-заглушки, достаточные для импорта src (соединение не открывается).
+Тесты, которым нужна PostgreSQL, используют фикстуру db и пропускаются,
+если БД недоступна.
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+for name, value in {
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_USER": "postgres",
+    "DB_PASS": "postgres",
+    "DB_NAME": "ctg_test",
+    "WS_TOKEN_FINGERPRINT_KEY": "test-fingerprint-key",
+    "WS_PUBSUB": "local",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture(scope="session")
+def db():
+    """Схема и секции в тестовой БД (как при старте); пропуск, если БД недоступна."""
+    from sqlalchemy.exc import OperationalError
+    from src.database import sync_engine
+    from src.queries.sync_orm import SyncOrm
+    from src.services.retention import storage_maintenance
+
+    try:
+        with sync_engine.connect():
+            pass
+    except OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available: {e.orig}")
+    SyncOrm.create_tables()
+    storage_maintenance.run_once()
+    return sync_engine
+
+
+@pytest.fixture
+def case_id(db) -> int:
+    """Новое обследование (пользователь и пациент создаются под него)."""
+    from src.queries.sync_orm import SyncOrm
+
+    user = SyncOrm.create_user(f"test-{uuid.uuid4().hex}@example.com", "password")
+    patient = SyncOrm.create_patient(user.id, "Test patient")
+    return SyncOrm.create_case(patient.id).id
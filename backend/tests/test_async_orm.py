@@ -0,0 +1,87 @@
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from src.database import async_engine, sync_engine
+from src.queries.async_orm import AsyncOrm
+from src.queries.sync_orm import SyncOrm
+from src.services.raw_chunks import ChunkBuilder
+
+T0 = datetime(2026, 10, 18, 9, 0, tzinfo=timezone.utc)
+
+
+def run(coro):
+    """Один event loop на тест: пул asyncpg закрывается, соединения не переходят в чужой loop."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(main())
+
+
+def test_insert_signal_and_window_order(case_id):
+    rec = run(AsyncOrm.insert_signal(case_id, T0, 141.0, 12.0))
+    assert rec.id is not None and rec.case_id == case_id and rec.timestamp == T0
+
+    rows = [{"case_id": case_id, "timestamp": T0 + timedelta(seconds=s), "bpm": 140.0 + s, "uc": 10.0}
+            for s in range(1, 8)]
+    assert run(AsyncOrm.insert_signals(rows)) == 7
+    window = run(AsyncOrm.get_window(case_id, limit=5))
+    # последние limit отсчётов в хронологическом порядке
+    assert [s.bpm for s in window] == [143.0, 144.0, 145.0, 146.0, 147.0]
+    assert [s.timestamp for s in window] == sorted(s.timestamp for s in window)
+
+
+def test_insert_signals_skips_rejected_rows(case_id):
+    rows = [{"case_id": case_id, "timestamp": T0 + timedelta(seconds=s), "bpm": 130.0 + s, "uc": 5.0}
+            for s in range(4)]
+    rows.insert(2, {"case_id": 2**31 - 1, "timestamp": T0, "bpm": 1.0, "uc": 1.0})  # нет такого обследования
+    assert run(AsyncOrm.insert_signals(rows)) == 4
+    assert [s.bpm for s in run(AsyncOrm.get_window(case_id, limit=10))] == [130.0, 131.0, 132.0, 133.0]
+    assert run(AsyncOrm.insert_signals([])) == 0
+
+
+def test_chunk_segments_are_replaced_by_sealed_chunk(case_id):
+    builder = ChunkBuilder(case_id, T0)
+    for s in range(3):
+        builder.append(T0 + timedelta(seconds=s), 120.0 + s, 7.0)
+    segment = {**builder.segment(), "id": run(AsyncOrm.next_chunk_ids(1))[0]}
+    assert run(AsyncOrm.insert_chunks([segment])) == 1
+    # повтор той же записи (после сбоя) не дублирует строку
+    run(AsyncOrm.insert_chunks([segment]))
+    for s in range(3, 6):
+        builder.append(T0 + timedelta(seconds=s), 120.0 + s, 7.0)
+    sealed = {**builder.seal(), "id": run(AsyncOrm.next_chunk_ids(1))[0], "replaces": [segment["id"]]}
+    assert run(AsyncOrm.insert_chunks([sealed])) == 1
+    with sync_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*), max(n_samples) FROM raw_chunks WHERE case_id = :c"),
+                            {"c": case_id}).one() == (1, 6)
+
+    # окно собирается из строк raw_signals и распакованных чанков
+    run(AsyncOrm.insert_signal(case_id, T0 + timedelta(seconds=6), 126.0, 7.0))
+    window = run(AsyncOrm.get_window(case_id, limit=4))
+    assert [s.bpm for s in window] == [123.0, 124.0, 125.0, 126.0]
+
+    ids = run(AsyncOrm.next_chunk_ids(3))
+    assert len(set(ids)) == 3 and min(ids) > sealed["id"]
+    assert run(AsyncOrm.next_chunk_ids(0)) == []
+
+
+def test_feature_policy_and_prediction(case_id):
+    assert run(AsyncOrm.get_case_feature_policy(case_id)) is None
+    SyncOrm.set_case_feature_policy(case_id, {"mode": "none"})
+    assert run(AsyncOrm.get_case_feature_policy(case_id)) == {"mode": "none"}
+
+    pred = run(AsyncOrm.insert_prediction(case_id, "m", 0.75, 1, True,
+                                          {"baseline": 140.0, "stv": math.nan, "bpm_sd": None}))
+    assert pred.id is not None and pred.created_at is not None
+    assert (pred.case_id, pred.probability, pred.label, pred.alert) == (case_id, 0.75, 1, 1)
+    # NaN в JSONB не пишется
+    assert pred.features == {"baseline": 140.0, "stv": None, "bpm_sd": None}
+    assert run(AsyncOrm.insert_prediction(case_id, "m", 0.1, 0, False)).features is None
+
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.services.downsample import downsample, lttb_indices, minmax_indices
+
+
+def _lttb_reference(x, y, n):
+    """LTTB в исходной формулировке (Steinarsson, 2013) на чистом Python."""
+    size = len(x)
+    every = (size - 2) / (n - 2)
+    out = [0]
+    a = 0
+    for i in range(n - 2):
+        nxt_lo = int(math.floor((i + 1) * every)) + 1
+        nxt_hi = min(int(math.floor((i + 2) * every)) + 1, size)
+        avg_x = sum(x[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        avg_y = sum(y[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        lo = int(math.floor(i * every)) + 1
+        hi = int(math.floor((i + 1) * every)) + 1
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(size - 1)
+    return out
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(0)
+    x = np.arange(5000, dtype=np.float64)
+    y = 140 + 10 * np.sin(x / 200) + rng.normal(0, 3, x.size)
+    y[1234] = 60.0  # узкая децелерация
+    return x, y
+
+
+@pytest.mark.parametrize("n", [3, 10, 333, 1000])
+def test_lttb_matches_reference(signal, n):
+    x, y = signal
+    idx = lttb_indices(x, y, n)
+    assert len(idx) == n and idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert idx.tolist() == _lttb_reference(x.tolist(), y.tolist(), n)
+
+
+def test_lttb_keeps_short_series():
+    x = np.arange(5.0)
+    assert lttb_indices(x, x, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb_indices(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_minmax_keeps_bucket_extremes(signal):
+    x, y = signal
+    n = 100
+    idx = minmax_indices(x, y, n)
+    assert len(idx) <= n and np.all(np.diff(idx) > 0)
+    edges = np.linspace(0, len(x), n // 2 + 1).astype(int)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        inside = idx[(idx >= lo) & (idx < hi)]
+        assert y[inside].min() == y[lo:hi].min() and y[inside].max() == y[lo:hi].max()
+    assert 1234 in idx
+
+
+def test_downsample_skips_nan_and_checks_method():
+    t = np.arange(10.0)
+    v = t.copy()
+    v[[2, 5]] = np.nan
+    x, y = downsample(t, v, 100)
+    assert x.tolist() == [0, 1, 3, 4, 6, 7, 8, 9] and np.isfinite(y).all()
+    x, y = downsample(t, v, 4, method="minmax")
+    assert len(x) <= 4 and x[0] == 0 and x[-1] == 9
+    with pytest.raises(ValueError):
+        downsample(t, v, 4, method="mean")
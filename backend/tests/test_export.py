@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from src import models
+from src.database import session_factory
+from src.queries.sync_orm import SyncOrm
+from src.routers.predictions import list_predictions_page
+from src.routers.stream import get_signals_page
+from src.services.export import decode_cursor, encode_cursor
+from src.services.raw_chunks import ChunkBuilder
+
+# секции создаются от текущей даты (фикстура db), данные пишутся в них
+T0 = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(ts, 0, 42, 7)
+    assert decode_cursor(cursor, 3) == (ts, (0, 42, 7))
+    assert decode_cursor(encode_cursor(ts, 5), 1) == (ts, (5,))
+
+
+@pytest.mark.parametrize("cursor", ["123", "123-1-2", "abc-1", ""])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 1)
+
+
+def _pages(read, limit):
+    items, after = [], None
+    while True:
+        page = read(after, limit)
+        items += page["items"]
+        after = page["next"]
+        if after is None:
+            return items
+
+
+@pytest.fixture
+def signals(case_id):
+    """
+    Строки 0..99 с и повтор 0..49 с (одинаковое время), чанки 40..99 с
+    и пересекающийся с ним 70..129 с — 270 отсчётов.
+    """
+    with session_factory() as s:
+        for i in list(range(100)) + list(range(50)):
+            s.add(models.RawSignal(case_id=case_id, timestamp=T0 + timedelta(seconds=i), bpm=100 + i, uc=i))
+        for a, b in ((40, 100), (70, 130)):
+            chunk = ChunkBuilder(case_id, T0 + timedelta(seconds=a))
+            for i in range(a, b):
+                chunk.append(T0 + timedelta(seconds=i), 200 + i, i)
+            s.add(models.RawChunk(**chunk.seal()))
+        s.commit()
+    return case_id
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50, 1000])
+def test_signal_pages_return_every_sample_once(signals, limit):
+    items = _pages(lambda after, n: get_signals_page(signals, after, n), limit)
+    keys = [r["order_key"] for r in items]
+    assert len(keys) == 270 and len(set(keys)) == 270
+    assert keys == sorted(keys)
+
+
+def test_bad_signal_cursor_is_400(signals):
+    with pytest.raises(HTTPException) as e:
+        get_signals_page(signals, "123-1", 10)
+    assert e.value.status_code == 400
+
+
+def test_export_bounds_are_inclusive(signals):
+    at = T0 + timedelta(seconds=10)
+    rows = list(SyncOrm.iter_raw_signals(signals, start=at, end=at))
+    assert [r["timestamp"] for r in rows] == [at, at]
+    rows = list(SyncOrm.iter_raw_signals(signals, start=T0 + timedelta(seconds=129)))
+    assert [r["order_key"][1] for r in rows] == [1]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 1000])
+def test_prediction_pages_with_equal_timestamps(case_id, limit):
+    with session_factory() as s:
+        for i in range(10):
+            s.add(models.Prediction(
+                case_id=case_id, model_name="m", probability=0.5, label=0, alert=0,
+                created_at=T0 + timedelta(seconds=i // 4),
+            ))
+        s.commit()
+
+    def read(after, n):
+        return asyncio.run(list_predictions_page(case_id, after, n, None))
+
+    items = _pages(read, limit)
+    keys = [(r["created_at"], r["id"]) for r in items]
+    assert len(keys) == 10 and len(set(keys)) == 10 and keys == sorted(keys)
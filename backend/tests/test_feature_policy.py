@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.routers import cases
+from src.schemas import FeaturePolicyIn
+from src.services.feature_policy import FeaturePolicy
+
+FEATURES = {"stv": 3.0, "ltv": 10.0, "bpm_median": 140.0}
+
+
+def _run(policy, alerts):
+    """(request_keys, persist) на каждом шаге; ML возвращает запрошенные признаки."""
+    tracker = policy.tracker()
+    out = []
+    for alert in alerts:
+        keys = tracker.request_keys()
+        returned = FEATURES if keys is None else {k: FEATURES[k] for k in keys if k in FEATURES}
+        out.append((keys, tracker.persist(returned, alert)))
+    return out
+
+
+def test_all_requests_and_persists_every_step():
+    assert _run(FeaturePolicy("all"), [False, True, True]) == [(None, FEATURES)] * 3
+
+
+def test_none_requests_nothing():
+    assert _run(FeaturePolicy("none", keys=["stv"]), [False, True]) == [([], None)] * 2
+    # даже если ML вернул признаки, они не сохраняются
+    assert FeaturePolicy("none").tracker().persist(FEATURES, True) is None
+
+
+def test_every_n_requests_features_only_on_persisted_steps():
+    steps = _run(FeaturePolicy("every_n", every_n=3), [False] * 7)
+    assert [keys for keys, _ in steps] == [None, [], [], None, [], [], None]
+    assert [i for i, (_, saved) in enumerate(steps) if saved is not None] == [0, 3, 6]
+
+
+def test_alerts_persists_first_prediction_and_alert_changes():
+    steps = _run(FeaturePolicy("alerts"), [False, False, True, True, False])
+    assert [saved is not None for _, saved in steps] == [True, False, True, False, True]
+    # признаки нужны на любом шаге: смена тревоги известна только из ответа
+    assert all(keys is None for keys, _ in steps)
+
+
+def test_keys_limit_request_and_persisted_features():
+    steps = _run(FeaturePolicy("all", keys=["stv", "bpm_median"]), [False, False])
+    assert steps == [(["stv", "bpm_median"], {"stv": 3.0, "bpm_median": 140.0})] * 2
+    tracker = FeaturePolicy("every_n", every_n=2, keys=["ltv"]).tracker()
+    assert tracker.request_keys() == ["ltv"]
+    assert tracker.persist(FEATURES, False) == {"ltv": 10.0}
+    assert tracker.request_keys() == []
+
+
+def test_empty_response_is_not_persisted():
+    tracker = FeaturePolicy("all").tracker()
+    assert tracker.persist({}, False) is None and tracker.persist(None, False) is None
+
+
+def test_case_policy_overrides_deployment_policy():
+    default = FeaturePolicy("every_n", every_n=5, keys=["stv"])
+    assert FeaturePolicy.from_dict(None, default) is default
+    policy = FeaturePolicy.from_dict({"mode": "alerts"}, default)
+    assert policy.to_dict() == {"mode": "alerts", "every_n": 5, "keys": ["stv"]}
+    with pytest.raises(ValueError):
+        FeaturePolicy("sometimes")
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    saved = []
+
+    def set_case_feature_policy(case_id, policy):
+        saved.append((case_id, policy))
+        return {"id": case_id, "feature_policy": policy}
+
+    monkeypatch.setattr(cases.SyncOrm, "set_case_feature_policy", set_case_feature_policy)
+    return saved
+
+
+def _put(monkeypatch, known, policy):
+    async def feature_names():
+        return known
+
+    monkeypatch.setattr(cases.ml_client, "feature_names", feature_names)
+    return asyncio.run(cases.set_feature_policy(7, FeaturePolicyIn(**policy)))
+
+
+def test_put_policy_rejects_keys_the_ml_service_does_not_return(monkeypatch, stored):
+    with pytest.raises(HTTPException) as e:
+        _put(monkeypatch, ["stv", "ltv"], {"mode": "all", "keys": ["stv", "stv_typo"]})
+    assert e.value.status_code == 422
+    assert e.value.detail["unknown"] == ["stv_typo"]
+    assert stored == []
+
+
+def test_put_policy_accepts_known_keys_and_unchecked_when_ml_is_down(monkeypatch, stored):
+    _put(monkeypatch, ["stv", "ltv"], {"mode": "alerts", "keys": ["ltv"]})
+    _put(monkeypatch, None, {"mode": "all", "keys": ["anything"]})
+    assert [p["keys"] for _, p in stored] == [["ltv"], ["anything"]]
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.services import ingest_buffer
+from src.services.ingest_buffer import RawIngestBuffer
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeDB:
+    """AsyncOrm.insert_signals: пишет пакеты в written, может падать или ждать."""
+
+    def __init__(self):
+        self.written = []
+        self.fail = 0
+        self.gate = None
+
+    async def insert_signals(self, rows):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("db is down")
+        self.written.append([r["bpm"] for r in rows])
+        return len(rows)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(ingest_buffer.AsyncOrm, "insert_signals", db.insert_signals)
+    return db
+
+
+async def _add(buf, values, case_id=1):
+    for v in values:
+        await buf.add(case_id, T0 + timedelta(seconds=v), float(v), 0.0)
+
+
+def test_rows_are_written_in_batches(fake_db):
+    async def main():
+        buf = RawIngestBuffer(flush_ms=10_000, max_rows=3)
+        await _add(buf, range(7))
+        await buf.flush()
+        await buf.stop()
+
+    asyncio.run(main())
+    assert fake_db.written == [[0.0, 1.0, 2.0], [3.0, 4.0, 5.0], [6.0]]
+
+
+def test_failed_batch_is_retried_in_order(fake_db):
+    fake_db.fail = 1
+
+    async def main():
+        buf = RawIngestBuffer(flush_ms=10_000, max_rows=10)
+        await _add(buf, range(3))
+        with pytest.raises(ConnectionError):
+            await buf.flush()
+        assert len(buf) == 3  # строки вернулись в очередь
+        await _add(buf, [3])
+        await buf.flush()
+        await buf.stop()
+
+    asyncio.run(main())
+    assert fake_db.written == [[0.0, 1.0, 2.0, 3.0]]
+
+
+def test_add_waits_while_queue_is_full(fake_db):
+    async def main():
+        fake_db.gate = asyncio.Event()  # БД «не отвечает»
+        buf = RawIngestBuffer(flush_ms=10_000, max_rows=2, max_pending=4)
+        await _add(buf, range(2))  # полный пакет: фоновая запись зависает на нём
+        await asyncio.sleep(0.01)
+        await _add(buf, range(2, 6))
+        assert len(buf) == 4
+        blocked = asyncio.create_task(_add(buf, [6]))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()  # очередь полна: источник ждёт
+
+        fake_db.gate.set()
+        await asyncio.wait_for(blocked, 1.0)
+        await buf.stop()
+
+    asyncio.run(main())
+    assert [v for batch in fake_db.written for v in batch] == [float(i) for i in range(7)]
+
+
+def test_stop_writes_the_rest(fake_db):
+    async def main():
+        buf = RawIngestBuffer(flush_ms=10_000, max_rows=100)
+        await _add(buf, range(5))
+        await buf.stop()
+        return len(buf)
+
+    assert asyncio.run(main()) == 0
+    assert fake_db.written == [[0.0, 1.0, 2.0, 3.0, 4.0]]
@@ -0,0 +1,223 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.services.ml_client import MLClient, MLUnavailable
+
+URL = "http://ml.test/predict"
+
+
+class FakeML:
+    """ML-сервис на httpx.MockTransport: статус ответа и задержка задаются по case в теле запроса."""
+
+    def __init__(self):
+        self.status = {}
+        self.gates = {}
+        self.calls = []
+
+    async def handler(self, request):
+        case = json.loads(request.content)["case"]
+        self.calls.append(case)
+        if case in self.gates:
+            await self.gates[case].wait()
+        return httpx.Response(self.status.get(case, 200), json={"proba": 0.5, "label": 0, "alert": 0})
+
+    def gate(self, case) -> asyncio.Event:
+        self.gates[case] = asyncio.Event()
+        return self.gates[case]
+
+
+def _client(fake, **kwargs) -> MLClient:
+    client = MLClient(URL, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+    client._slots = asyncio.Semaphore(client.max_inflight)
+    return client
+
+
+def _call(client, case):
+    return asyncio.ensure_future(client.predict({"case": case}, case_id=case))
+
+
+async def _settle(task):
+    try:
+        await task
+    except (httpx.HTTPError, MLUnavailable):
+        pass
+
+
+def test_per_case_limit_rejects_second_call():
+    async def main():
+        fake = FakeML()
+        client = _client(fake, max_inflight_per_case=1)
+        gate = fake.gate(1)
+        first = _call(client, 1)
+        await asyncio.sleep(0.01)
+        with pytest.raises(MLUnavailable):
+            await _call(client, 1)
+        # другое обследование не ждёт
+        assert (await _call(client, 2))["proba"] == 0.5
+        gate.set()
+        await first
+        assert client._per_case == {}
+        return client, fake
+
+    client, fake = asyncio.run(main())
+    assert fake.calls == [1, 2]
+    assert client.outcomes["case_busy"] == 1 and client.outcomes["ok"] == 2
+
+
+def test_global_limit_times_out_in_queue():
+    async def main():
+        fake = FakeML()
+        client = _client(fake, max_inflight=2, queue_timeout_s=0.05)
+        gate = fake.gate(1)
+        fake.gates[2] = gate
+        busy = [_call(client, 1), _call(client, 2)]
+        await asyncio.sleep(0.01)
+        assert client.stats()["inflight"] == 2
+        with pytest.raises(MLUnavailable):
+            await _call(client, 3)
+        gate.set()
+        await asyncio.gather(*busy)
+        # слот освободился — вызов проходит
+        await _call(client, 3)
+        return client, fake
+
+    client, fake = asyncio.run(main())
+    assert client.outcomes["queue_timeout"] == 1
+    assert fake.calls == [1, 2, 3] and client._inflight == 0
+
+
+def test_breaker_opens_probes_and_closes():
+    async def main():
+        fake = FakeML()
+        client = _client(fake, breaker_failures=2, breaker_reset_s=60.0)
+        fake.status[1] = 503
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await _call(client, 1)
+        assert client.state == "open"
+        with pytest.raises(MLUnavailable):
+            await _call(client, 2)
+        assert fake.calls == [1, 1]
+
+        client._open_until = 0.0  # прошло breaker_reset_s
+        assert client.state == "half_open"
+        gate = fake.gate(2)
+        probe = _call(client, 2)
+        await asyncio.sleep(0.01)
+        # пока проба в полёте, остальные отклоняются
+        assert client.state == "open"
+        with pytest.raises(MLUnavailable):
+            await _call(client, 3)
+        gate.set()
+        await probe
+        assert client.state == "closed" and client.stats()["consecutive_failures"] == 0
+        await _call(client, 3)
+        return client
+
+    client = asyncio.run(main())
+    assert client.outcomes["breaker_open"] == 2
+
+
+def test_failed_probe_reopens_breaker():
+    async def main():
+        fake = FakeML()
+        client = _client(fake, breaker_failures=1, breaker_reset_s=60.0)
+        fake.status[1] = 500
+        await _settle(_call(client, 1))
+        client._open_until = 0.0
+        await _settle(_call(client, 1))  # проба тоже неудачна
+        assert client.state == "open" and client._probe is False
+        return client
+
+    asyncio.run(main())
+
+
+def test_only_the_probe_releases_the_probe_slot():
+    async def main():
+        fake = FakeML()
+        client = _client(fake, breaker_failures=1, breaker_reset_s=60.0)
+        # вызов, начатый до открытия breaker'а, ещё висит
+        fake.status[1] = 500
+        old_gate = fake.gate(1)
+        old = _call(client, 1)
+        fake.status[2] = 500
+        await _settle(_call(client, 2))
+        assert client.state == "open"
+
+        client._open_until = 0.0
+        probe_gate = fake.gate(3)
+        probe = _call(client, 3)
+        await asyncio.sleep(0.01)
+        assert client._probe is True
+
+        # старый вызов завершается ошибкой во время пробы: слот пробы не освобождается
+        old_gate.set()
+        await _settle(old)
+        client._open_until = 0.0
+        assert client.state == "open"
+        with pytest.raises(MLUnavailable):
+            await _call(client, 4)
+
+        # отказ по лимиту обследования во время half-open тоже не трогает пробу
+        with pytest.raises(MLUnavailable):
+            await _call(client, 3)
+        assert client._probe is True
+
+        probe_gate.set()
+        await probe
+        assert client.state == "closed"
+        return fake
+
+    fake = asyncio.run(main())
+    assert 4 not in fake.calls
+
+
+def test_client_errors_do_not_trip_breaker():
+    async def main():
+        fake = FakeML()
+        client = _client(fake, breaker_failures=1)
+        fake.status[1] = 422
+        with pytest.raises(httpx.HTTPStatusError):
+            await _call(client, 1)
+        assert client.state == "closed"
+        return client
+
+    client = asyncio.run(main())
+    assert client.outcomes["http_error"] == 1
+    assert client.stats()["latency_ms"]["count"] == 1
+
+
+def test_feature_names_are_fetched_next_to_predict_url_and_cached():
+    requests = []
+
+    async def handler(request):
+        requests.append(str(request.url))
+        return httpx.Response(200, json={"features": ["stv", "ltv"]})
+
+    async def main():
+        client = MLClient(URL, features_ttl_s=60)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        assert await client.feature_names() == ["stv", "ltv"]
+        assert await client.feature_names() == ["stv", "ltv"]
+        await client.close()
+
+    asyncio.run(main())
+    assert requests == ["http://ml.test/features"]
+
+
+def test_feature_names_unavailable():
+    async def handler(request):
+        return httpx.Response(503)
+
+    async def main():
+        client = MLClient(URL)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        assert await client.feature_names() is None
+        assert await MLClient(None).feature_names() is None
+        await client.close()
+
+    asyncio.run(main())
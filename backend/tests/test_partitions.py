@@ -0,0 +1,158 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from src.queries import sync_orm
+from src.queries.sync_orm import PARTITION_EPOCH, SyncOrm, _parse_bound, partition_column
+from src.services import retention
+from src.services.retention import StorageMaintenance
+
+WEEK = timedelta(days=7)
+NOW = datetime(2026, 10, 15, 12, 30, tzinfo=timezone.utc)  # четверг
+
+
+def test_partition_columns_come_from_models():
+    assert partition_column("raw_signals") == "timestamp"
+    assert partition_column("predictions") == "created_at"
+
+
+@pytest.mark.parametrize("value,expected", [
+    ("2026-10-12 00:00:00+00", datetime(2026, 10, 12, tzinfo=timezone.utc)),
+    ("2026-10-12 03:00:00+03", datetime(2026, 10, 12, tzinfo=timezone.utc)),
+    ("2026-10-12 05:30:00+05:30", datetime(2026, 10, 12, tzinfo=timezone.utc)),
+])
+def test_parse_bound(value, expected):
+    assert _parse_bound(value) == expected
+
+
+def test_partition_epoch_is_a_monday():
+    assert PARTITION_EPOCH.weekday() == 0 and PARTITION_EPOCH.tzinfo is not None
+
+
+class FakeStorage:
+    """SyncOrm без БД: записывает вызовы обслуживания."""
+
+    def __init__(self, partitioned=True):
+        self.partitioned = partitioned
+        self.calls = []
+
+    @contextmanager
+    def schema_lock(self):
+        self.calls.append(("lock",))
+        yield
+
+    def is_partitioned(self, table):
+        return self.partitioned
+
+    def ensure_partitions(self, table, now, interval, ahead):
+        self.calls.append(("ensure", table, now, interval, ahead))
+        return []
+
+    def drop_partitions_before(self, table, cutoff, detach=False):
+        self.calls.append(("drop", table, cutoff, detach))
+        return []
+
+    def delete_rows_before(self, table, column, cutoff):
+        self.calls.append(("delete", table, column, cutoff))
+        return 0
+
+
+def _patch(monkeypatch, storage):
+    for name in ("schema_lock", "is_partitioned", "ensure_partitions", "drop_partitions_before", "delete_rows_before"):
+        monkeypatch.setattr(retention.SyncOrm, name, getattr(storage, name))
+
+
+def test_retention_cutoffs_on_partitioned_tables(monkeypatch):
+    storage = FakeStorage()
+    _patch(monkeypatch, storage)
+    StorageMaintenance(partition_days=7, partitions_ahead=3, raw_retention_days=30,
+                       predictions_retention_days=90).run_once(NOW)
+    assert storage.calls == [
+        ("lock",),
+        ("ensure", "raw_signals", NOW, WEEK, 3),
+        ("drop", "raw_signals", NOW - timedelta(days=30), False),
+        ("ensure", "predictions", NOW, WEEK, 3),
+        ("drop", "predictions", NOW - timedelta(days=90), False),
+        ("delete", "raw_chunks", "end_ts", NOW - timedelta(days=30)),
+    ]
+
+
+def test_retention_disabled_only_creates_partitions(monkeypatch):
+    storage = FakeStorage()
+    _patch(monkeypatch, storage)
+    report = StorageMaintenance(partition_days=1, partitions_ahead=-1).run_once(NOW)
+    assert [c[0] for c in storage.calls] == ["lock", "ensure", "ensure"]
+    assert storage.calls[1][3:] == (timedelta(days=1), 0)
+    assert "chunks_deleted" not in report
+
+
+def test_retention_on_legacy_tables(monkeypatch):
+    storage = FakeStorage(partitioned=False)
+    _patch(monkeypatch, storage)
+    report = StorageMaintenance(raw_retention_days=10, predictions_retention_days=20).run_once(NOW)
+    assert ("delete", "raw_signals", "timestamp", NOW - timedelta(days=10)) in storage.calls
+    assert ("delete", "predictions", "created_at", NOW - timedelta(days=20)) in storage.calls
+    assert report["raw_signals"]["deleted"] == 0
+
+    # detach без секций не удаляет строки молча
+    storage.calls.clear()
+    report = StorageMaintenance(raw_retention_days=10, raw_retention_mode="detach").run_once(NOW)
+    assert report["raw_signals"]["skipped"]
+    assert not any(c[0] == "delete" and c[1] == "raw_signals" for c in storage.calls)
+
+
+def test_unknown_retention_mode():
+    with pytest.raises(ValueError):
+        StorageMaintenance(raw_retention_mode="archive")
+
+
+# --- секции в PostgreSQL ---
+
+@pytest.fixture
+def partitioned_raw(db):
+    if not SyncOrm.is_partitioned("raw_signals"):
+        pytest.skip("raw_signals is not partitioned in this database")
+
+
+def _ranges(table):
+    return {name: (lo, hi) for name, lo, hi in SyncOrm.list_partitions(table)}
+
+
+def test_ensure_partitions_aligns_to_epoch_and_is_idempotent(partitioned_raw, case_id):
+    old = datetime(2025, 3, 5, 10, tzinfo=timezone.utc)
+    with sync_orm.sync_engine.begin() as conn:
+        conn.execute(text("INSERT INTO raw_signals (timestamp, bpm, uc, case_id) VALUES (:ts, 140, 10, :c)"),
+                     {"ts": old, "c": case_id})
+        assert conn.execute(text("SELECT count(*) FROM raw_signals_default WHERE case_id = :c"),
+                            {"c": case_id}).scalar() == 1
+
+    now = datetime(2025, 3, 20, tzinfo=timezone.utc)
+    created = SyncOrm.ensure_partitions("raw_signals", now, WEEK, ahead=2)
+    ranges = _ranges("raw_signals")
+    # от секции старой строки до now + 2 недели, границы кратны неделе от PARTITION_EPOCH
+    first = PARTITION_EPOCH + ((old - PARTITION_EPOCH) // WEEK) * WEEK
+    expected = [f"raw_signals_p{first + i * WEEK:%Y%m%d}" for i in range(5)]
+    assert set(expected) <= set(created)
+    for name in expected:
+        lo, hi = ranges[name]
+        assert hi - lo == WEEK and (lo - PARTITION_EPOCH) % WEEK == timedelta(0)
+    assert ranges[expected[0]][0] <= old < ranges[expected[0]][1]
+    assert ranges[expected[-1]][0] <= now + 2 * WEEK < ranges[expected[-1]][1]
+    assert SyncOrm.ensure_partitions("raw_signals", now, WEEK, ahead=2) == []
+
+    with sync_orm.sync_engine.connect() as conn:
+        # строка переехала из DEFAULT в свою секцию
+        assert conn.execute(text("SELECT count(*) FROM raw_signals_default WHERE case_id = :c"),
+                            {"c": case_id}).scalar() == 0
+        assert conn.execute(text(f"SELECT count(*) FROM {expected[0]} WHERE case_id = :c"),
+                            {"c": case_id}).scalar() == 1
+
+    # retention: удаляются только секции, целиком лежащие до cutoff
+    cutoff = ranges[expected[2]][0] + timedelta(hours=1)
+    dropped = SyncOrm.drop_partitions_before("raw_signals", cutoff)
+    assert set(expected[:2]) <= set(dropped) and expected[2] not in dropped
+    assert all(hi <= cutoff for name, (lo, hi) in ranges.items() if name in dropped)
+    SyncOrm.drop_partitions_before("raw_signals", ranges[expected[-1]][1])
+    assert not set(expected) & set(_ranges("raw_signals"))
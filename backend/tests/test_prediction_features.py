@@ -0,0 +1,60 @@
+import math
+
+from sqlalchemy import text
+
+from src.queries.sync_orm import SyncOrm, clean_features
+
+
+def test_clean_features():
+    assert clean_features(None) is None and clean_features({}) is None
+    assert clean_features({"a": 1, 2: 0.5, "nan": math.nan, "inf": -math.inf, "none": None}) == {
+        "a": 1.0, "2": 0.5, "nan": None, "inf": None, "none": None,
+    }
+
+
+def test_upgrade_moves_prediction_features_to_jsonb(db, case_id):
+    legacy = SyncOrm.insert_prediction(case_id, "m", 0.1, 0, False)
+    other = SyncOrm.insert_prediction(case_id, "m", 0.2, 0, False)
+    current = SyncOrm.insert_prediction(case_id, "m", 0.3, 1, True, {"stv": 7.0})
+    with db.begin() as conn:
+        # таблица в том виде, в каком её создавали прежние версии
+        conn.execute(text("DROP TABLE IF EXISTS prediction_features, prediction_features_migrated"))
+        conn.execute(text(
+            "CREATE TABLE prediction_features ("
+            " id SERIAL PRIMARY KEY, prediction_id INTEGER NOT NULL,"
+            " key VARCHAR NOT NULL, value DOUBLE PRECISION)"
+        ))
+        conn.execute(text("CREATE INDEX ix_predfeature_key ON prediction_features (key)"))
+        conn.execute(
+            text("INSERT INTO prediction_features (prediction_id, key, value) VALUES (:p, :k, :v)"),
+            [
+                {"p": legacy.id, "k": "stv", "v": 3.5},
+                {"p": legacy.id, "k": "ltv", "v": None},
+                {"p": other.id, "k": "stv", "v": 4.0},
+                {"p": current.id, "k": "stv", "v": 1.0},
+            ],
+        )
+    select = text("SELECT id, features FROM predictions WHERE case_id = :c")
+    try:
+        SyncOrm.upgrade_schema()
+        with db.begin() as conn:
+            features = dict(conn.execute(select, {"c": case_id}).all())
+            index = conn.execute(text("SELECT to_regclass('ix_predfeature_key')")).scalar()
+            tables = conn.execute(text(
+                "SELECT to_regclass('prediction_features'), to_regclass('prediction_features_migrated')"
+            )).one()
+            conn.execute(text("UPDATE predictions SET features = NULL WHERE id = :p"), {"p": other.id})
+        # перенос записан переименованием таблицы: повторный запуск его не повторяет
+        SyncOrm.upgrade_schema()
+        with db.connect() as conn:
+            rerun = dict(conn.execute(select, {"c": case_id}).all())
+    finally:
+        with db.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS prediction_features, prediction_features_migrated"))
+    assert features[legacy.id] == {"stv": 3.5, "ltv": None}
+    assert features[other.id] == {"stv": 4.0}
+    # уже записанные в JSONB признаки не перезаписываются
+    assert features[current.id] == {"stv": 7.0}
+    assert index is None
+    assert tables == (None, "prediction_features_migrated")
+    assert rerun[other.id] is None
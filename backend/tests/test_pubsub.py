@@ -0,0 +1,74 @@
+import asyncio
+
+from src.services.pubsub import NOTIFY_MAX_BYTES, PostgresBus
+
+
+def _bus(max_pending=10):
+    """Шина без соединений: очередь публикации и обработчики задаются напрямую."""
+    bus = PostgresBus({}, max_pending=max_pending)
+    bus._pending = asyncio.Queue(max_pending)
+    bus.delivered, bus.events = [], []
+    bus._deliver = lambda case_id, frames: bus.delivered.append((case_id, frames))
+    bus._on_event = lambda name, case_id: bus.events.append((name, case_id))
+    return bus
+
+
+def _published(bus):
+    out = []
+    while not bus._pending.empty():
+        out.append(bus._pending.get_nowait())
+    return out
+
+
+def test_payload_round_trip_between_workers():
+    sender, receiver = _bus(), _bus()
+    frames = [('{"type":"raw"}', True), ('{"type":"prediction"}', False)]
+    sender.publish(7, frames)
+    sender.publish_event("ws_auth_invalidate", 7)
+    for payload in _published(sender):
+        receiver._on_notify(None, 0, sender.channel, payload)
+    assert receiver.delivered == [(7, frames)]
+    assert receiver.events == [("ws_auth_invalidate", 7)]
+    assert receiver.received == 2
+
+
+def test_own_publications_are_ignored():
+    bus = _bus()
+    bus.publish(1, [('{"type":"raw"}', True)])
+    bus.publish_event("ws_auth_invalidate", 1)
+    for payload in _published(bus):
+        bus._on_notify(None, 0, bus.channel, payload)
+    assert bus.delivered == [] and bus.events == [] and bus.received == 0
+
+
+def test_oversized_and_overflowing_messages_are_dropped():
+    bus = _bus(max_pending=1)
+    bus.publish(1, [("x" * NOTIFY_MAX_BYTES, False)])
+    assert bus._pending.empty() and bus.dropped == 1
+    bus.publish(1, [("{}", False)])
+    bus.publish(1, [("{}", False)])
+    assert bus._pending.qsize() == 1 and bus.dropped == 2
+
+
+def test_publish_before_start_is_noop():
+    bus = PostgresBus({})
+    bus.publish(1, [("{}", False)])
+    bus.publish_event("ws_auth_invalidate", 1)
+    assert bus.dropped == 0 and bus._pending is None
+
+
+def test_auto_bus_uses_notify_only_with_several_workers(monkeypatch):
+    from src.services import pubsub
+
+    assert pubsub.resolve_backend("auto", 1) == "local"
+    assert pubsub.resolve_backend("auto", 4) == "postgres"
+    assert pubsub.resolve_backend("local", 4) == "local"
+    assert pubsub.resolve_backend("postgres", 1) == "postgres"
+
+    monkeypatch.setattr(pubsub, "WS_PUBSUB", "auto")
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert isinstance(pubsub.make_bus(), pubsub.LocalBus)
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert isinstance(pubsub.make_bus(), PostgresBus)
+    monkeypatch.setattr(pubsub, "WS_PUBSUB", "local")
+    assert isinstance(pubsub.make_bus(), pubsub.LocalBus)
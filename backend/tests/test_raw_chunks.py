@@ -0,0 +1,220 @@
+import asyncio
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.services import ingest_buffer
+from src.services.ingest_buffer import RawIngestBuffer
+from src.services.raw_chunks import (
+    CHUNK_MAX_SAMPLES,
+    ChunkBuilder,
+    RawSample,
+    decode_chunk,
+    decode_chunk_columns,
+    encode_chunk,
+    last_samples,
+)
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _builder(offsets_s, case_id=3):
+    chunk = ChunkBuilder(case_id, T0 + timedelta(seconds=offsets_s[0]))
+    for i, s in enumerate(offsets_s):
+        chunk.append(T0 + timedelta(seconds=s), 120.0 + i / 3, 10.0 + i / 7)
+    return chunk
+
+
+def test_encode_decode_round_trip():
+    offsets = [0, 1, 2, 3.5, 3.5, 4.25, 10]  # неравномерный шаг и повтор времени
+    row = _builder(offsets).seal()
+    samples = decode_chunk(3, row["start_ts"], row["n_samples"], row["data"])
+    assert [s.timestamp for s in samples] == [T0 + timedelta(seconds=s) for s in offsets]
+    assert all(s.case_id == 3 and s.id is None for s in samples)
+    # значения хранятся во float32
+    assert [s.bpm for s in samples] == pytest.approx([120.0 + i / 3 for i in range(len(offsets))], abs=1e-4)
+    assert [s.uc for s in samples] == pytest.approx([10.0 + i / 7 for i in range(len(offsets))], abs=1e-5)
+
+    times, bpm, uc = decode_chunk_columns(row["start_ts"], row["n_samples"], row["data"])
+    assert times == pytest.approx([s.timestamp.timestamp() for s in samples])
+    assert list(bpm) == [s.bpm for s in samples] and list(uc) == [s.uc for s in samples]
+
+
+def test_unknown_format_is_rejected():
+    data = encode_chunk(array("I", [0]), array("f", [1.0]), array("f", [2.0]))
+    with pytest.raises(ValueError):
+        decode_chunk(1, T0, 1, b"\x09" + data[1:])
+
+
+def test_builder_accepts():
+    chunk = _builder([0, 1, 2])
+    assert chunk.accepts(T0 + timedelta(seconds=59), 60)
+    assert not chunk.accepts(T0 + timedelta(seconds=60), 60)  # чанк покрыл span
+    assert not chunk.accepts(T0 + timedelta(seconds=1), 60)  # время пошло назад
+    full = _builder([0] * CHUNK_MAX_SAMPLES)
+    assert not full.accepts(T0, 60)
+
+
+def test_last_samples_merges_rows_and_chunks():
+    rows = [RawSample(1, T0 + timedelta(seconds=s), float(s), 0.0, id=s) for s in (0, 2, 4)]
+    samples = [RawSample(1, T0 + timedelta(seconds=s), float(s), 0.0) for s in (1, 3, 5)]
+    assert [s.bpm for s in last_samples(rows, samples, 4)] == [2.0, 3.0, 4.0, 5.0]
+    assert last_samples(rows, samples, 0) == []
+
+
+def test_segments_cover_chunk_without_overlap():
+    offsets = [0, 1, 2.5, 3, 4.75, 6]
+    chunk = _builder(offsets[:2])
+    first = chunk.segment()
+    for i, s in enumerate(offsets[2:], start=2):
+        chunk.append(T0 + timedelta(seconds=s), 120.0 + i / 3, 10.0 + i / 7)
+    second = chunk.segment()
+    assert (first["n_samples"], second["n_samples"]) == (2, 4)
+    assert second["start_ts"] == T0 + timedelta(seconds=2.5) and second["end_ts"] == T0 + timedelta(seconds=6)
+    samples = [
+        s for row in (first, second)
+        for s in decode_chunk(3, row["start_ts"], row["n_samples"], row["data"])
+    ]
+    full = chunk.seal()
+    assert samples == decode_chunk(3, full["start_ts"], full["n_samples"], full["data"])
+    assert chunk.segments == 2 and chunk.saved == len(offsets)
+
+
+class FakeChunks:
+    """AsyncOrm.insert_chunks / next_chunk_ids: только INSERT по id, replaces удаляются."""
+
+    def __init__(self):
+        self.rows = {}
+        self.batches = []
+        self.deleted = []
+        self.next_id = 100
+
+    async def next_chunk_ids(self, n):
+        ids = list(range(self.next_id, self.next_id + n))
+        self.next_id += n
+        return ids
+
+    async def insert_chunks(self, rows):
+        self.batches.append([(r["id"], r["n_samples"]) for r in rows])
+        for r in rows:
+            self.rows.setdefault(r["id"], r)
+        for r in rows:
+            for chunk_id in r.get("replaces", ()):
+                self.deleted.append(chunk_id)
+                self.rows.pop(chunk_id, None)
+        return len(rows)
+
+
+@pytest.fixture
+def fake_chunks(monkeypatch):
+    db = FakeChunks()
+    monkeypatch.setattr(ingest_buffer.AsyncOrm, "next_chunk_ids", db.next_chunk_ids)
+    monkeypatch.setattr(ingest_buffer.AsyncOrm, "insert_chunks", db.insert_chunks)
+    return db
+
+
+def test_open_chunk_is_appended_in_segments_and_compacted_on_close(fake_chunks, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(ingest_buffer.time, "monotonic", lambda: now[0])
+
+    async def main():
+        buf = RawIngestBuffer(flush_ms=10_000, storage="chunks", chunk_seconds=60, chunk_flush_seconds=5)
+        for s in range(3):
+            await buf.add(1, T0 + timedelta(seconds=s), 120.0, 10.0)
+        buf._checkpoint()  # рано: сегмент не нужен
+        await buf._write()
+        assert fake_chunks.batches == []
+
+        now[0] = 6.0
+        buf._checkpoint()
+        await buf._write()
+        for s in range(3, 5):
+            await buf.add(1, T0 + timedelta(seconds=s), 121.0, 11.0)
+        now[0] = 12.0
+        buf._checkpoint()
+        await buf._write()
+        buf._checkpoint()  # новых отсчётов нет — повторно не пишется
+        await buf._write()
+        # сегменты — новые строки только с новыми отсчётами
+        assert fake_chunks.batches == [[(100, 3)], [(101, 2)]]
+        assert sorted(fake_chunks.rows) == [100, 101]
+        await buf.stop()
+
+    asyncio.run(main())
+    # при закрытии — одна строка на весь чанк, сегменты удалены
+    assert fake_chunks.batches[2:] == [[(102, 5)]]
+    assert fake_chunks.deleted == [100, 101]
+    row = fake_chunks.rows[102]
+    assert [s.timestamp for s in decode_chunk(1, row["start_ts"], row["n_samples"], row["data"])] == [
+        T0 + timedelta(seconds=s) for s in range(5)
+    ]
+    assert list(fake_chunks.rows) == [102]
+
+
+def test_single_segment_covering_the_chunk_is_kept(fake_chunks, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(ingest_buffer.time, "monotonic", lambda: now[0])
+
+    async def main():
+        buf = RawIngestBuffer(flush_ms=10_000, storage="chunks", chunk_seconds=60, chunk_flush_seconds=5)
+        for s in range(3):
+            await buf.add(1, T0 + timedelta(seconds=s), 120.0, 10.0)
+        now[0] = 6.0
+        buf._checkpoint()
+        await buf._write()
+        await buf.stop()
+
+    asyncio.run(main())
+    assert fake_chunks.batches == [[(100, 3)]] and fake_chunks.deleted == []
+
+
+def test_segments_of_chunk_closed_in_the_same_batch_are_not_written(fake_chunks, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(ingest_buffer.time, "monotonic", lambda: now[0])
+
+    async def main():
+        buf = RawIngestBuffer(flush_ms=10_000, storage="chunks", chunk_seconds=60, chunk_flush_seconds=5)
+        await buf.add(1, T0, 120.0, 10.0)
+        now[0] = 6.0
+        buf._checkpoint()
+        await buf.add(1, T0 + timedelta(seconds=1), 120.0, 10.0)
+        await buf.add(2, T0, 130.0, 20.0)
+        await buf.flush()  # сегмент и закрытие чанка 1 в одном пакете
+        await buf.stop()
+
+    asyncio.run(main())
+    assert len(fake_chunks.batches) == 1
+    assert sorted(fake_chunks.batches[0]) == [(100, 2), (101, 1)]
+    assert fake_chunks.deleted == []
+
+
+def test_failed_write_is_retried_with_the_same_ids(fake_chunks, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(ingest_buffer.time, "monotonic", lambda: now[0])
+    fail = [True, False]  # вторая запись (итоговая строка) падает
+    insert = fake_chunks.insert_chunks
+
+    async def flaky_insert(rows):
+        if fail.pop() if fail else False:
+            raise ConnectionError("db down")
+        return await insert(rows)
+
+    monkeypatch.setattr(ingest_buffer.AsyncOrm, "insert_chunks", flaky_insert)
+
+    async def main():
+        buf = RawIngestBuffer(flush_ms=10_000, storage="chunks", chunk_seconds=60, chunk_flush_seconds=5)
+        await buf.add(1, T0, 120.0, 10.0)
+        now[0] = 6.0
+        buf._checkpoint()
+        await buf._write()
+        await buf.add(1, T0 + timedelta(seconds=1), 120.0, 10.0)
+        buf._seal(1)
+        with pytest.raises(ConnectionError):
+            await buf._write()
+        await buf._write()
+
+    asyncio.run(main())
+    # итоговая строка после повтора всё ещё заменяет записанный сегмент
+    assert fake_chunks.batches == [[(100, 1)], [(101, 2)]]
+    assert fake_chunks.deleted == [100] and list(fake_chunks.rows) == [101]
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from src.services import window_buffer
+from src.services.raw_chunks import RawSample
+from src.services.window_buffer import CaseWindow, WindowBuffers
+
+
+def test_partial_window_is_in_order():
+    win = CaseWindow(4)
+    for i in range(3):
+        win.append(100.0 + i, 140.0 + i, 10.0 + i)
+    assert len(win) == 3 and not win.full
+    assert win.arrays() == ([100.0, 101.0, 102.0], [140.0, 141.0, 142.0], [10.0, 11.0, 12.0])
+
+
+def test_full_window_keeps_last_points_after_wraparound():
+    win = CaseWindow(4)
+    for i in range(11):
+        win.append(float(i), 100.0 + i, 0.0)
+    t, bpm, _ = win.arrays()
+    assert win.full
+    assert t == [7.0, 8.0, 9.0, 10.0]
+    assert bpm == [107.0, 108.0, 109.0, 110.0]
+    assert win.last_ts == 10.0
+
+
+def test_time_going_backwards_restarts_window():
+    win = CaseWindow(4)
+    for i in range(6):
+        win.append(50.0 + i, 140.0, 10.0)
+    win.append(1.0, 150.0, 20.0)  # повтор CSV: новая временная шкала
+    assert win.arrays() == ([1.0], [150.0], [20.0])
+
+
+def test_window_payload_is_relative_to_window_start():
+    win = CaseWindow(3)
+    for i in range(5):
+        win.append(1000.0 + i, 140.0, 10.0)
+    assert win.window_payload()["t"] == [0.0, 1.0, 2.0]
+    assert CaseWindow(3).window_payload() == {"t": [], "bpm": [], "uc": []}
+
+
+def test_buffers_fill_from_db_once_and_drop_after_last_release(monkeypatch):
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    stored = [RawSample(7, t0 + timedelta(seconds=i), 130.0 + i, 5.0) for i in range(5)]
+    calls = []
+
+    async def get_window(case_id, limit):
+        calls.append(("window", case_id, limit))
+        return stored[-limit:]
+
+    async def flush(case_id=None):
+        calls.append(("flush", case_id))
+
+    monkeypatch.setattr(window_buffer.AsyncOrm, "get_window", get_window)
+    monkeypatch.setattr(window_buffer.raw_ingest, "flush", flush)
+
+    async def main():
+        buffers = WindowBuffers(3)
+        first = await buffers.acquire(7)
+        second = await buffers.acquire(7)
+        assert first is second
+        assert first.arrays()[1] == [132.0, 133.0, 134.0]
+        await buffers.release(7)
+        assert 7 in buffers._windows
+        await buffers.release(7)
+        assert 7 not in buffers._windows
+
+    asyncio.run(main())
+    # очередь записи сбрасывается до чтения окна из БД, и только при первом acquire
+    assert calls == [("flush", 7), ("window", 7, 3)]
+
+
+def _slow_db(monkeypatch, gates):
+    """get_window ждёт gates[case_id] (если есть), чтобы держать заполнение открытым."""
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    loads = []
+
+    async def get_window(case_id, limit):
+        loads.append(case_id)
+        if case_id in gates:
+            await gates[case_id].wait()
+        return [RawSample(case_id, t0 + timedelta(seconds=i), 120.0 + case_id, 5.0) for i in range(limit)]
+
+    async def flush(case_id=None):
+        pass
+
+    monkeypatch.setattr(window_buffer.AsyncOrm, "get_window", get_window)
+    monkeypatch.setattr(window_buffer.raw_ingest, "flush", flush)
+    return loads
+
+
+def test_slow_fill_does_not_block_other_cases(monkeypatch):
+    async def main():
+        gates = {1: asyncio.Event()}
+        loads = _slow_db(monkeypatch, gates)
+        buffers = WindowBuffers(3)
+        slow = asyncio.create_task(buffers.acquire(1))
+        await asyncio.sleep(0)
+        # обследование 2 заполняется, пока чтение окна 1 висит
+        other = await asyncio.wait_for(buffers.acquire(2), timeout=1)
+        assert other.arrays()[1] == [122.0] * 3
+        assert not slow.done()
+        gates[1].set()
+        assert (await slow).arrays()[1] == [121.0] * 3
+        assert loads == [1, 2]
+
+    asyncio.run(main())
+
+
+def test_concurrent_acquires_of_one_case_share_the_fill(monkeypatch):
+    async def main():
+        gates = {1: asyncio.Event()}
+        loads = _slow_db(monkeypatch, gates)
+        buffers = WindowBuffers(3)
+        waiters = [asyncio.create_task(buffers.acquire(1)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # отмена одного ожидающего не отменяет заполнение для остальных
+        waiters[0].cancel()
+        gates[1].set()
+        wins = await asyncio.gather(*waiters[1:])
+        assert wins[0] is wins[1]
+        assert waiters[0].cancelled()
+        assert loads == [1]
+        assert buffers._refs == {1: 2}
+        await buffers.release(1)
+        await buffers.release(1)
+        assert buffers._windows == {} and buffers._refs == {}
+
+    asyncio.run(main())
+
+
+def test_release_during_fill_does_not_keep_window(monkeypatch):
+    async def main():
+        gates = {1: asyncio.Event()}
+        _slow_db(monkeypatch, gates)
+        buffers = WindowBuffers(3)
+        waiter = asyncio.create_task(buffers.acquire(1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        gates[1].set()
+        await asyncio.sleep(0.01)
+        assert buffers._windows == {} and buffers._refs == {} and buffers._loading == {}
+
+    asyncio.run(main())
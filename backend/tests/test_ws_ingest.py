@@ -0,0 +1,111 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi import WebSocketDisconnect
+
+from src.routers import ws as ws_router
+from src.services.window_buffer import CaseWindow
+from src.services.ws_manager import WS_SEND_QUEUE
+
+POINTS = 2 * WS_SEND_QUEUE  # prediction + alert на отсчёт: больше, чем влезает в очередь подписчика
+
+
+class Publisher:
+    """Источник (как usb_bridge): присылает отсчёты и никогда не читает сокет."""
+
+    def __init__(self, points: int):
+        self.query_params = {"H": "5", "stride": "1"}
+        self.points = iter(range(points))
+        self.closed_with = None
+        self.stuck = asyncio.Event()  # отправка в сокет висит: клиент не читает
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        await asyncio.sleep(0)
+        try:
+            n = next(self.points)
+        except StopIteration:
+            raise WebSocketDisconnect(1000) from None
+        if self.closed_with is not None:
+            raise WebSocketDisconnect(self.closed_with)
+        return {"t": n, "bpm": 140.0, "uc": 10.0}
+
+    async def send_text(self, text):
+        await self.stuck.wait()
+
+    async def send_json(self, data):
+        await self.stuck.wait()
+
+    async def close(self, code=None):
+        self.closed_with = code
+
+
+class Viewer:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=None):
+        pass
+
+
+def test_non_reading_publisher_keeps_ingesting(monkeypatch):
+    ingested = []
+
+    async def add(case_id, ts, bpm, uc):
+        ingested.append(ts)
+
+    async def flush(case_id=None):
+        pass
+
+    async def acquire(case_id):
+        return CaseWindow(5)
+
+    async def release(case_id):
+        pass
+
+    async def get_policy(case_id):
+        return None
+
+    async def predict(payload, case_id=None):
+        return {"proba": 0.9, "label": 1, "alert": 1}
+
+    async def insert_prediction(**kwargs):
+        return SimpleNamespace(created_at=datetime.now(timezone.utc), probability=kwargs["probability"],
+                               alert=int(kwargs["alert"]))
+
+    monkeypatch.setattr(ws_router.raw_ingest, "add", add)
+    monkeypatch.setattr(ws_router.raw_ingest, "flush", flush)
+    monkeypatch.setattr(ws_router.window_buffers, "acquire", acquire)
+    monkeypatch.setattr(ws_router.window_buffers, "release", release)
+    monkeypatch.setattr(ws_router.AsyncOrm, "get_case_feature_policy", get_policy)
+    monkeypatch.setattr(ws_router.AsyncOrm, "insert_prediction", insert_prediction)
+    monkeypatch.setattr(ws_router.ml_client, "predict", predict)
+    manager = ws_router.manager
+
+    async def main():
+        viewer = Viewer()
+        await manager.join(5, viewer)
+        publisher = Publisher(POINTS)
+        await ws_router.ws_case(publisher, 5, user=SimpleNamespace(id=1))
+        await asyncio.sleep(0.01)
+        room = dict(manager._rooms.get(5, {}))
+        evicted = manager.evicted
+        await manager.leave(5, viewer)
+        await manager.stop()
+        return publisher, viewer, room, evicted
+
+    publisher, viewer, room, evicted = asyncio.run(main())
+    # источник не отключён как отстающий и дослал все отсчёты
+    assert publisher.closed_with is None and evicted == 0
+    assert len(ingested) == POINTS
+    # зритель получил рассылку по всем отсчётам, источник в комнате не остался
+    assert sum(m["type"] == "raw" for m in viewer.sent) == POINTS
+    assert sum(m["type"] == "prediction" for m in viewer.sent) == POINTS - 4
+    assert list(room) == [viewer]
@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+from fastapi import status
+
+from src.services import ws_manager
+from src.services.ws_manager import Subscriber, WSManager, encode
+
+
+class FakeWS:
+    """WebSocket: отправленные тексты в sent; gate задерживает отправку (медленный клиент)."""
+
+    def __init__(self, gate: asyncio.Event = None):
+        self.sent = []
+        self.closed_with = None
+        self.gate = gate
+
+    async def send_text(self, text):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=None):
+        self.closed_with = code
+
+
+def _queued(sub):
+    return [json.loads(text)["n"] for _, _, text in sub._queue]
+
+
+def test_full_queue_drops_oldest_raw():
+    sub = Subscriber(FakeWS(), max_queue=3)
+    sub.offer(encode({"type": "raw", "n": 1}), True)
+    sub.offer(encode({"type": "prediction", "n": 2}), False)
+    sub.offer(encode({"type": "raw", "n": 3}), True)
+    assert sub.offer(encode({"type": "alert", "n": 4}), False)
+    assert _queued(sub) == [2, 3, 4]
+    assert sub.dropped == 1
+
+
+def test_full_queue_of_important_messages():
+    sub = Subscriber(FakeWS(), max_queue=2)
+    sub.offer(encode({"type": "prediction", "n": 1}), False)
+    sub.offer(encode({"type": "alert", "n": 2}), False)
+    # новый raw отбрасывается, подписчик остаётся
+    assert sub.offer(encode({"type": "raw", "n": 3}), True)
+    assert _queued(sub) == [1, 2] and sub.dropped == 1
+    # важное сообщение некуда положить — подписчик должен быть отключён
+    assert not sub.offer(encode({"type": "prediction", "n": 4}), False)
+
+
+def test_lagging_subscriber_is_rejected(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ws_manager.time, "monotonic", lambda: now[0])
+    sub = Subscriber(FakeWS(), max_queue=10, max_lag_s=5.0)
+    assert sub.offer(encode({"type": "raw", "n": 1}), True)
+    now[0] += 4.0
+    assert sub.offer(encode({"type": "raw", "n": 2}), True)
+    now[0] += 2.0  # самое старое сообщение ждёт 6 с
+    assert not sub.offer(encode({"type": "raw", "n": 3}), True)
+
+
+def test_slow_subscriber_is_evicted_without_blocking_others(monkeypatch):
+    monkeypatch.setattr(ws_manager, "WS_SEND_QUEUE", 4)
+
+    async def main():
+        manager = WSManager()
+        fast, slow = FakeWS(), FakeWS(gate=asyncio.Event())
+        await manager.join(1, fast)
+        slow_sub = await manager.join(1, slow)
+        slow_sub.max_queue = 4
+        for n in range(8):
+            await manager.broadcast(1, {"type": "prediction", "n": n})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        return manager, fast, slow
+
+    manager, fast, slow = asyncio.run(main())
+    assert [m["n"] for m in fast.sent] == list(range(8))
+    assert slow.closed_with == status.WS_1013_TRY_AGAIN_LATER
+    assert manager.evicted == 1
+    assert 1 in manager._rooms and len(manager._rooms[1]) == 1
+
+
+def test_batch_subscriber_gets_one_frame_per_sample():
+    async def main():
+        manager = WSManager()
+        plain, batched = FakeWS(), FakeWS()
+        await manager.join(1, plain)
+        await manager.join(1, batched, batch=True)
+        await manager.broadcast_many(1, [{"type": "prediction", "n": 1}, {"type": "raw", "n": 2}])
+        await asyncio.sleep(0.01)
+        await manager.stop()
+        return plain, batched
+
+    plain, batched = asyncio.run(main())
+    assert [m["n"] for m in plain.sent] == [1, 2]
+    assert batched.sent == [{"type": "batch", "payload": [{"type": "prediction", "n": 1}, {"type": "raw", "n": 2}]}]
+
+
+def test_broadcast_encodes_each_message_once(monkeypatch):
+    calls = []
+
+    def counting_encode(message):
+        calls.append(message["n"])
+        return encode(message)
+
+    monkeypatch.setattr(ws_manager, "encode", counting_encode)
+    messages = [{"type": "prediction", "n": 1}, {"type": "alert", "n": 2}, {"type": "raw", "n": 3}]
+
+    async def main():
+        manager = WSManager()
+        published = []
+        monkeypatch.setattr(manager.bus, "publish", lambda case_id, frames: published.append((case_id, frames)))
+        plain = [FakeWS() for _ in range(3)]
+        batched = [FakeWS() for _ in range(2)]
+        subs = [await manager.join(1, ws) for ws in plain] + [await manager.join(1, ws, batch=True) for ws in batched]
+        await manager.broadcast_many(1, messages)
+        # один конверт на всех batch-подписчиков, тексты сообщений — одни и те же объекты
+        envelopes = [sub._queue[0][2] for sub in subs[3:]]
+        singles = [[text for _, _, text in sub._queue] for sub in subs[:3]]
+        assert envelopes[0] is envelopes[1]
+        assert all(s[i] is singles[0][i] for s in singles for i in range(3))
+        assert [t for t, _ in published[0][1]] == singles[0]
+        await asyncio.sleep(0.01)
+        await manager.stop()
+        return plain, batched, published
+
+    plain, batched, published = asyncio.run(main())
+    assert calls == [1, 2, 3]
+    assert all(ws.sent == messages for ws in plain)
+    assert all(ws.sent == [{"type": "batch", "payload": messages}] for ws in batched)
+    # в шину уходят тексты с признаком «можно отбросить» (только raw)
+    assert published[0][0] == 1 and [d for _, d in published[0][1]] == [False, False, True]
+
+
+def test_single_message_is_not_wrapped_and_envelope_droppability():
+    async def main():
+        manager = WSManager()
+        ws = FakeWS()
+        sub = await manager.join(1, ws, batch=True)
+        await manager.broadcast(1, {"type": "raw", "n": 1, "note": "схватка"})
+        assert sub._queue[0][1] is True
+        # конверт можно отбросить только целиком из raw
+        await manager.broadcast_many(1, [{"type": "raw", "n": 2}, {"type": "raw", "n": 3}])
+        await manager.broadcast_many(1, [{"type": "raw", "n": 4}, {"type": "prediction", "n": 5}])
+        assert [d for _, d, _ in sub._queue][-2:] == [True, False]
+        await asyncio.sleep(0.01)
+        await manager.stop()
+        return ws
+
+    ws = asyncio.run(main())
+    assert ws.sent[0] == {"type": "raw", "n": 1, "note": "схватка"}
+    assert [m["type"] for m in ws.sent] == ["raw", "batch", "batch"]
+
+
+def test_encode_without_orjson(monkeypatch):
+    message = {"type": "prediction", "case_id": 3, "proba": 0.25, "note": "децелерация", "features": {"a": None}}
+    fast = encode(message)
+    monkeypatch.setattr(ws_manager, "orjson", None)
+    slow = encode(message)
+    assert json.loads(fast) == json.loads(slow) == message
+    assert "децелерация" in slow and " " not in slow
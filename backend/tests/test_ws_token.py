@@ -0,0 +1,100 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from src.queries import sync_orm
+from src.queries.sync_orm import SyncOrm
+
+OLD_KEY = "previous-fingerprint-key"
+
+
+@pytest.fixture
+def owner_case(db):
+    """(user_id, case_id) нового обследования."""
+    user = SyncOrm.create_user(f"ws-{uuid.uuid4().hex}@example.com", "password")
+    patient = SyncOrm.create_patient(user.id, "Test patient")
+    return user.id, SyncOrm.create_case(patient.id).id
+
+
+@pytest.fixture
+def bcrypt_calls(monkeypatch):
+    calls = []
+    verify = SyncOrm._verify_ws_token
+
+    def counting(plain, hashed):
+        calls.append(hashed)
+        return verify(plain, hashed)
+
+    monkeypatch.setattr(SyncOrm, "_verify_ws_token", staticmethod(counting))
+    return calls
+
+
+def _fingerprint_of(db, case_id):
+    with db.connect() as conn:
+        return conn.execute(text("SELECT token_fingerprint FROM ws_static_tokens WHERE case_id = :c"),
+                            {"c": case_id}).scalar()
+
+
+def _set_fingerprint(db, case_id, value):
+    with db.begin() as conn:
+        conn.execute(text("UPDATE ws_static_tokens SET token_fingerprint = :f WHERE case_id = :c"),
+                     {"f": value, "c": case_id})
+
+
+def test_token_is_found_by_fingerprint(db, owner_case, bcrypt_calls):
+    user_id, case_id = owner_case
+    token = SyncOrm.create_ws_token(user_id, case_id)
+    user = SyncOrm.find_user_by_ws_token(case_id, token)
+    assert user is not None and user.id == user_id
+    assert len(bcrypt_calls) == 1
+    assert SyncOrm.get_ws_token_record(user_id, case_id).last_seen_at is not None
+
+
+def test_unknown_token_costs_no_bcrypt(db, owner_case, bcrypt_calls):
+    user_id, case_id = owner_case
+    for _ in range(3):
+        SyncOrm.create_ws_token(user_id, case_id)
+        SyncOrm.revoke_ws_token(user_id, case_id)
+    SyncOrm.create_ws_token(user_id, case_id)
+    assert SyncOrm.find_user_by_ws_token(case_id, "not-a-token") is None
+    assert bcrypt_calls == []
+
+
+def test_token_without_fingerprint_is_backfilled_once(db, owner_case, bcrypt_calls):
+    user_id, case_id = owner_case
+    token = SyncOrm.create_ws_token(user_id, case_id)
+    _set_fingerprint(db, case_id, None)  # запись создана до появления отпечатков
+
+    assert SyncOrm.find_user_by_ws_token(case_id, "not-a-token") is None
+    assert len(bcrypt_calls) == 1  # перебор только по записи без отпечатка
+    assert SyncOrm.find_user_by_ws_token(case_id, token).id == user_id
+    assert _fingerprint_of(db, case_id) == SyncOrm._ws_token_fingerprint(token)
+
+    # дальше — по индексу, перебора нет
+    bcrypt_calls.clear()
+    assert SyncOrm.find_user_by_ws_token(case_id, "not-a-token") is None
+    assert bcrypt_calls == []
+
+
+def test_rotated_key_is_found_through_old_keys(db, owner_case, bcrypt_calls, monkeypatch):
+    user_id, case_id = owner_case
+    token = SyncOrm.create_ws_token(user_id, case_id)
+    _set_fingerprint(db, case_id, SyncOrm._ws_token_fingerprint(token, OLD_KEY))
+
+    # без прежнего ключа запись с чужим отпечатком не перебирается
+    assert SyncOrm.find_user_by_ws_token(case_id, token) is None
+    assert bcrypt_calls == []
+
+    monkeypatch.setattr(sync_orm.settings, "WS_TOKEN_FINGERPRINT_OLD_KEYS", f"other-old-key-000, {OLD_KEY}")
+    assert SyncOrm.find_user_by_ws_token(case_id, token).id == user_id
+    assert len(bcrypt_calls) == 1
+    # отпечаток переписан текущим ключом
+    assert _fingerprint_of(db, case_id) == SyncOrm._ws_token_fingerprint(token)
+
+
+def test_revoked_token_is_rejected(db, owner_case):
+    user_id, case_id = owner_case
+    token = SyncOrm.create_ws_token(user_id, case_id)
+    SyncOrm.revoke_ws_token(user_id, case_id)
+    assert SyncOrm.find_user_by_ws_token(case_id, token) is None
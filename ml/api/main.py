@@ -2,15 +2,22 @@
 FastAPI-приложение для онлайн-инференса КТГ.
 """
 
+import asyncio
 from fastapi import FastAPI
 import os
 from inference.core import CTGInference
-from inference.postprocess import AlarmConfig, AlarmState
-from api.schemas import WindowRequest, PredictionResponse
+from inference.postprocess import AlarmConfig, AlarmStore
+from inference.batching import MicroBatcher
+from features.registry import resolve_feature_names
+from api.schemas import WindowRequest, PredictionResponse, BatchPredictRequest, BatchPredictResponse
 
 app = FastAPI(title="ML service")
 
-model = CTGInference(os.path.join("inference", "models", "model_v1.cbm"))
+# признаки сверх нужных модели, возвращаемые в ответе (UI, хранение): "ui", "all" или список
+model = CTGInference(
+    os.getenv("ML_MODEL_PATH", os.path.join("inference", "models", "model_v1.cbm")),
+    extra_features=resolve_feature_names(os.getenv("ML_EXTRA_FEATURES", "ui")),
+)
 
 cfg = AlarmConfig(
     on_thr=0.80,      # включаем тревогу
@@ -20,14 +27,34 @@ cfg = AlarmConfig(
     on_ratio=0.80,
     off_ratio=1.00
 )
-alarm = AlarmState(cfg, stride_s=1)
+# состояние тревоги отдельно для каждого обследования (case_id)
+alarms = AlarmStore(
+    cfg,
+    stride_s=1,
+    max_entries=int(os.getenv("ALARM_MAX_CASES", "1000")),
+    idle_ttl_s=float(os.getenv("ALARM_IDLE_TTL_S", "1800")),
+)
+
+# коалесценция одиночных /predict в пакеты: до ML_BATCH_MAX_SIZE окон
+# или ML_BATCH_MAX_WAIT_MS мс ожидания, один вызов модели на пакет
+batcher = MicroBatcher(
+    model.predict_batch,
+    max_batch=int(os.getenv("ML_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("ML_BATCH_MAX_WAIT_MS", "5")),
+)
+
+def _pick_features(features: dict, keys) -> dict:
+    """Признаки для ответа: все (keys=None) или только запрошенные."""
+    if keys is None:
+        return features
+    return {k: features[k] for k in keys if k in features}
 
 @app.post("/predict", response_model=PredictionResponse)
-def predict(req: WindowRequest):
-    result = model.predict_from_json(req.model_dump(), horizon_min=req.H)
+async def predict(req: WindowRequest):
+    result = await batcher.submit(req.model_dump(), req.H)
     proba = float(result["proba"])
-    alert = alarm.update(proba)
-    features = result.get("features", {})
+    alert = alarms.update(req.case_id, proba)
+    features = _pick_features(result.get("features", {}), req.features)
 
     return PredictionResponse(
         proba=proba,
@@ -36,6 +63,42 @@ def predict(req: WindowRequest):
         features=features
     )
 
+@app.post("/predict/batch", response_model=BatchPredictResponse)
+async def predict_batch(req: BatchPredictRequest):
+    """
+    Пакетный инференс: N окон (разные обследования или горизонты),
+    один вызов модели. Результаты возвращаются в порядке items.
+    Модель считается в пуле потоков, как пакеты MicroBatcher для /predict.
+    """
+    results = await asyncio.get_running_loop().run_in_executor(
+        None,
+        lambda: model.predict_batch(
+            [item.model_dump() for item in req.items],
+            horizons=[item.H for item in req.items],
+        ),
+    )
+
+    out = []
+    for item, result in zip(req.items, results):
+        proba = float(result["proba"])
+        out.append(PredictionResponse(
+            proba=proba,
+            label=int(result["label"]),
+            alert=alarms.update(item.case_id, proba),
+            features=_pick_features(result.get("features", {}), item.features)
+        ))
+    return BatchPredictResponse(results=out)
+
+@app.get("/features")
+def feature_names():
+    """Признаки ответа /predict: нужные модели и ML_EXTRA_FEATURES (план вычисления)."""
+    return {"features": model.builder.plan.outputs}
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    """Метрики микробатчинга /predict: число и размеры пакетов."""
+    return batcher.stats()
+
 @app.get("/health")
 def health_check():
     return {"status": "ok", "service": "ml"}
\ No newline at end of file
@@ -5,7 +5,7 @@ Pydantic для валидации данных.
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 
 
 class Window(BaseModel):
@@ -17,6 +17,12 @@ class Window(BaseModel):
 class WindowRequest(BaseModel):
     window: Window
     H: float = Field(5, ge=1, le=15, description="Горизонт прогноза в минутах")
+    case_id: Optional[Union[int, str]] = Field(
+        None, description="Идентификатор обследования/сессии: ключ состояния тревоги"
+    )
+    features: Optional[List[str]] = Field(
+        None, description="Какие признаки вернуть в ответе: None — все, [] — никаких"
+    )
 
 
 class PredictionResponse(BaseModel):
@@ -24,3 +30,11 @@ class PredictionResponse(BaseModel):
     label: int
     alert: Optional[int] = None
     features: Optional[Dict[str, Optional[float]]] = None
+
+
+class BatchPredictRequest(BaseModel):
+    items: List[WindowRequest] = Field(..., min_length=1, description="Окна для пакетного инференса")
+
+
+class BatchPredictResponse(BaseModel):
+    results: List[PredictionResponse]
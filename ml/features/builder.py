@@ -1,16 +1,19 @@
 """
 Объединение всех признаков в единый словарь.
 
-Импортирует функции из common, uc_features, figo_rules, extra
-и вызывает их в едином пайплайне.
+Признаки из common, uc_features, figo_rules, extra вычисляются по плану
+из реестра (features.registry): только нужные модели и явно запрошенные.
+Для потока по одному отсчёту — инкрементальный режим push() на базе
+features.streaming.
 """
 
-import pandas as pd
 import numpy as np
+import pandas as pd
+from typing import Iterable, Optional
 from config import Params
-from features.extra import compute_window_extra_features
-from features.common import compute_window_basic_features
-from features.figo_rules import summarize_events_on_window
+from features.context import WindowContext
+from features.registry import build_plan
+from features.streaming import StreamingFeatureState
 
 
 class CTGFeatureBuilder:
@@ -18,10 +21,16 @@ class CTGFeatureBuilder:
     Класс-обёртка для извлечения признаков из окна КТГ.
     """
 
-    def __init__(self, params: Params):
+    def __init__(self, params: Params, features: Optional[Iterable[str]] = None):
+        """
+        Args:
+            params (Params): параметры предобработки и детекторов.
+            features (Iterable[str] | None): нужные признаки (например,
+                model.feature_names_ и признаки для UI); None — все признаки.
+        """
         self.params = params
-
-    
+        self.plan = build_plan(features)
+        self._stream = StreamingFeatureState(params)
 
     def extract_features(self, df: pd.DataFrame) -> dict:
         """
@@ -33,26 +42,44 @@ class CTGFeatureBuilder:
         Returns:
             dict: словарь признаков.
         """
-        # базовые агрегаты
-        feats = compute_window_basic_features(df, self.params)
+        return self.extract_from_context(WindowContext.from_frame(df, self.params))
 
-        # события по FIGO
-        counts, cons, decels, accels = summarize_events_on_window(df, self.params)
-        feats.update({f"evt_{k}": v for k, v in counts.items()})
+    def extract_from_arrays(self, t: np.ndarray, bpm: np.ndarray, uc: np.ndarray) -> dict:
+        """
+        Вычисляет признаки по окну, заданному массивами (без DataFrame).
 
-        # дополнительные динамические и спектральные признаки
-        extra_feats = compute_window_extra_features(df, self.params)
-        feats.update({f"extra_{k}": v for k, v in extra_feats.items()})
+        Args:
+            t, bpm, uc (np.ndarray): предобработанные сигналы окна.
 
-        # # лаги поздних деселераций
-        # lags = [d["lag_to_uc_peak_s"] for d in decels if d["type"] == "late" and d["lag_to_uc_peak_s"] is not None]
-        # base_feats["evt_late_mean_lag_s"] = float(np.mean(lags)) if lags else 0.0
-        # base_feats["evt_late_max_lag_s"]  = float(np.max(lags)) if lags else 0.0
+        Returns:
+            dict: словарь признаков.
+        """
+        return self.extract_from_context(WindowContext(t, bpm, uc, self.params))
+
+    def extract_from_context(self, ctx: WindowContext) -> dict:
+        """
+        Вычисляет признаки плана по контексту окна: общие производные величины
+        (медианы, SD, разности, baseline) считаются один раз и переиспользуются.
+        """
+        return self.plan.run(ctx)
+
+    def push(self, t: float, bpm: float, uc: float) -> Optional[dict]:
+        """
+        Инкрементальный режим: добавляет один сырой отсчёт потока и возвращает
+        признаки по последнему окну (как extract_features), либо None,
+        пока окно не заполнено.
 
-        # глубина деселераций и высота акцелераций
-        drops = [d["drop_bpm"] for d in decels]
-        rises = [a["rise_bpm"] for a in accels]
-        feats["evt_decel_mean_drop"] = float(np.mean(drops)) if drops else 0.0
-        feats["evt_accel_mean_rise"] = float(np.mean(rises)) if rises else 0.0
+        Состояние (кольцевой буфер, суммы, квантили, baseline) хранится в builder,
+        поэтому один экземпляр обслуживает один поток; reset() — начать заново.
+        Инкрементально обновляются только статистики bpm, признаки уровня окна
+        пересчитываются, шаг примерно на 20% дешевле extract_features
+        (см. features.streaming).
+        """
+        state = self._stream
+        if not state.push(t, bpm, uc):
+            return None
+        return self.extract_from_context(state.context())
 
-        return feats
\ No newline at end of file
+    def reset(self):
+        """Сбрасывает состояние инкрементального режима."""
+        self._stream.reset()
@@ -6,34 +6,34 @@
 - общей вариабельности (SDNN, IQR, STV),
 - спектральных характеристик (низкие/высокие частоты).
 - кросс-коррелиция.
+
+Все функции принимают общий контекст окна ctx (features.context.WindowContext).
 """
 
 import numpy as np
-import pandas as pd
 from scipy.signal import welch
 
-def compute_baseline(x: np.ndarray) -> float:
+from features.correlation import xcorr
+
+def compute_baseline(ctx) -> float:
     """Глобальный baseline (медиана)"""
-    return float(np.nanmedian(x))
+    return ctx.bpm_median
 
 
-def compute_variability(bpm: np.ndarray, p) -> dict:
+def compute_variability(ctx) -> dict:
     """Статистические признаки вариабельности"""
     f = {}
-    f["bpm_sd"]  = float(np.nanstd(bpm))
-    f["bpm_iqr"] = float(np.nanpercentile(bpm, 75) - np.nanpercentile(bpm, 25))
-    sec = bpm[::int(p.fs)] if p.fs >= 1 else bpm
-    if len(sec) > 1 and np.isfinite(sec).sum() > 1:
-        f["stv"] = float(np.nanmean(np.abs(np.diff(sec))))
-    else:
-        f["stv"] = np.nan
+    f["bpm_sd"]  = ctx.bpm_std
+    f["bpm_iqr"] = ctx.bpm_iqr
+    f["stv"] = ctx.bpm_stv
     return f
 
 
-def compute_psd(bpm: np.ndarray, p) -> dict:
+def compute_psd(ctx) -> dict:
     """Спектральные признаки HRV (low/high frequency)"""
+    p = ctx.params
     f = {}
-    detr = bpm - np.nanmedian(bpm)
+    detr = ctx.bpm - ctx.bpm_median
     if len(detr) >= p.fs*60:
         freqs, Pxx = welch(detr, fs=p.fs, nperseg=int(p.fs*60))
         lf_mask = (freqs >= 0.04) & (freqs < 0.15)
@@ -46,20 +46,18 @@ def compute_psd(bpm: np.ndarray, p) -> dict:
     return f
 
 
-def compute_coupling(bpm: np.ndarray, uc: np.ndarray) -> dict:
+def compute_coupling(ctx) -> dict:
     """Кросс-коррелиция: анализ взаимосвязи между двумя сигналами (FHR и UC)"""
-    b0 = (bpm - np.nanmean(bpm)) / (np.nanstd(bpm) + 1e-6)
-    u0 = (uc - np.nanmean(uc)) / (np.nanstd(uc) + 1e-6)
-    xcorr = np.correlate(b0, u0, mode="full") / len(b0)
-    return {"xcorr_absmax": float(np.nanmax(np.abs(xcorr))) if len(xcorr) else np.nan}
+    b0 = (ctx.bpm - ctx.bpm_mean) / (ctx.bpm_std + 1e-6)
+    u0 = (ctx.uc - ctx.uc_mean) / (ctx.uc_std + 1e-6)
+    xc = xcorr(b0, u0) / len(b0)
+    return {"xcorr_absmax": float(np.nanmax(np.abs(xc))) if len(xc) else np.nan}
 
 
-def compute_window_basic_features(seg: pd.DataFrame, p) -> dict:
-    bpm = seg.bpm.values
-    uc  = seg.uc.values
+def compute_window_basic_features(ctx) -> dict:
     feats = {}
-    feats["baseline"] = compute_baseline(bpm)
-    feats.update(compute_variability(bpm, p))
-    feats.update(compute_psd(bpm, p))
-    feats.update(compute_coupling(bpm, uc))
-    return feats
\ No newline at end of file
+    feats["baseline"] = compute_baseline(ctx)
+    feats.update(compute_variability(ctx))
+    feats.update(compute_psd(ctx))
+    feats.update(compute_coupling(ctx))
+    return feats
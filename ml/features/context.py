@@ -0,0 +1,197 @@
+"""
+Общий контекст окна КТГ для всех семейств признаков.
+
+WindowContext создаётся один раз на окно и лениво вычисляет производные
+массивы и скаляры (медианы, SD, разности, baseline, скользящее SD, ...).
+Каждая величина считается не более одного раза и переиспользуется
+в common, extra, figo_rules и uc_features.
+
+Величины можно передать заранее (known), например из потокового
+состояния features.streaming — тогда они не пересчитываются.
+"""
+
+from functools import cached_property
+
+import math
+import numpy as np
+
+from config import Params
+from features.extra import ordinal_patterns, linear_trend, PERM_M, perm_tau
+from features.figo_rules import estimate_baseline_exp, rolling_sd, LOW_VAR_WIN_S
+
+
+class WindowContext:
+    """
+    Окно сигнала (t, bpm, uc) после предобработки и кэш производных величин.
+    """
+
+    def __init__(self, t, bpm, uc, params: Params, **known):
+        self.t = np.asarray(t, dtype=float)
+        self.bpm = np.asarray(bpm, dtype=float)
+        self.uc = np.asarray(uc, dtype=float)
+        self.params = params
+        for name, value in known.items():
+            if not isinstance(getattr(type(self), name, None), cached_property):
+                raise AttributeError(f"WindowContext has no derived quantity '{name}'")
+            self.__dict__[name] = value
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame", params: Params, **known) -> "WindowContext":
+        """Контекст из DataFrame с колонками t, bpm, uc."""
+        return cls(df.t.values, df.bpm.values, df.uc.values, params, **known)
+
+    # =============================
+    #       ЧСС: статистики
+    # =============================
+    @cached_property
+    def bpm_median(self) -> float:
+        return float(np.nanmedian(self.bpm))
+
+    @cached_property
+    def bpm_mean(self) -> float:
+        return float(np.nanmean(self.bpm))
+
+    @cached_property
+    def bpm_var(self) -> float:
+        return float(np.nanvar(self.bpm))
+
+    @cached_property
+    def bpm_std(self) -> float:
+        return float(np.sqrt(self.bpm_var))
+
+    @cached_property
+    def bpm_iqr(self) -> float:
+        return float(np.nanpercentile(self.bpm, 75) - np.nanpercentile(self.bpm, 25))
+
+    @cached_property
+    def bpm_mad(self) -> float:
+        """Нормированный MAD."""
+        return float(np.nanmedian(np.abs(self.bpm - self.bpm_median)) * 1.4826)
+
+    @cached_property
+    def bpm_outlier_ratio(self) -> float:
+        """Доля выбросов: |robust z| > 3."""
+        rz = (self.bpm - self.bpm_median) / (self.bpm_mad + 1e-9)
+        return float(np.mean(np.abs(rz) > 3)) if np.isfinite(rz).any() else np.nan
+
+    @cached_property
+    def bpm_skew(self) -> float:
+        """Асимметрия (как scipy.stats.skew, nan_policy="omit")."""
+        m2, m3, _ = self._bpm_moments
+        return float(m3 / m2 ** 1.5) if m2 > 0 else np.nan
+
+    @cached_property
+    def bpm_kurt(self) -> float:
+        """Эксцесс Фишера (как scipy.stats.kurtosis, nan_policy="omit")."""
+        m2, _, m4 = self._bpm_moments
+        return float(m4 / m2 ** 2 - 3.0) if m2 > 0 else np.nan
+
+    @cached_property
+    def _bpm_moments(self) -> tuple:
+        """
+        Центральные моменты m2, m3, m4 без NaN.
+        Почти постоянный ряд (m2 в пределах точности float64) даёт m2 = 0,
+        как в scipy.stats.
+        """
+        x = self.bpm[~np.isnan(self.bpm)]
+        if len(x) == 0:
+            return 0.0, np.nan, np.nan
+        mean = x.mean()
+        d = x - mean
+        d2 = d * d
+        m2 = d2.mean()
+        if m2 <= (np.finfo(float).resolution * mean) ** 2:
+            m2 = 0.0
+        return float(m2), float((d2 * d).mean()), float((d2 * d2).mean())
+
+    # =============================
+    #        ЧСС: разности
+    # =============================
+    @cached_property
+    def bpm_diff(self) -> np.ndarray:
+        return np.diff(self.bpm)
+
+    @cached_property
+    def bpm_diff_var(self) -> float:
+        return float(np.nanvar(self.bpm_diff))
+
+    @cached_property
+    def bpm_diff_sq_mean(self) -> float:
+        d = self.bpm_diff
+        return float(np.nanmean(d * d))
+
+    @cached_property
+    def bpm_stv(self) -> float:
+        """Кратковременная вариабельность: среднее |Δ| посекундного ряда."""
+        fs = self.params.fs
+        step = int(fs) if fs >= 1 else 1
+        sec = self.bpm[::step]
+        if len(sec) > 1 and np.isfinite(sec).sum() > 1:
+            d = self.bpm_diff if step == 1 else np.diff(sec)
+            return float(np.nanmean(np.abs(d)))
+        return np.nan
+
+    @cached_property
+    def bpm_turn_rate(self) -> float:
+        """Частота смены знака производной."""
+        dx = self.bpm_diff
+        return float(np.mean(dx[:-1] * dx[1:] < 0)) if len(dx) > 2 else np.nan
+
+    @cached_property
+    def hjorth_dx_var(self) -> float:
+        """Дисперсия первой производной diff(x, prepend=x[0])·fs."""
+        return float(np.nanvar(self._hjorth_dx))
+
+    @cached_property
+    def hjorth_ddx_var(self) -> float:
+        """Дисперсия второй производной diff(dx, prepend=dx[0])·fs."""
+        dx = self._hjorth_dx
+        return float(np.nanvar(np.diff(dx, prepend=dx[0]) * self.params.fs))
+
+    @cached_property
+    def _hjorth_dx(self) -> np.ndarray:
+        return np.concatenate(([0.0], self.bpm_diff)) * self.params.fs
+
+    # =============================
+    #     ЧСС: тренд и сложность
+    # =============================
+    @cached_property
+    def trend_fit(self) -> tuple:
+        """(наклон, R²) линейного тренда."""
+        return linear_trend(self.bpm, self.params, mean=self.bpm_mean)
+
+    @cached_property
+    def perm_counts(self) -> np.ndarray:
+        """Гистограмма порядковых паттернов для энтропии перестановок."""
+        codes = ordinal_patterns(self.bpm, PERM_M, perm_tau(self.params))
+        return np.bincount(codes, minlength=math.factorial(PERM_M))
+
+    # =============================
+    #         ЧСС: FIGO
+    # =============================
+    @cached_property
+    def baseline_exp(self) -> np.ndarray:
+        return estimate_baseline_exp(self.bpm, self.params)
+
+    @cached_property
+    def rolling_sd(self) -> np.ndarray:
+        return rolling_sd(self.bpm, win_s=LOW_VAR_WIN_S, p=self.params)
+
+    # =============================
+    #            UC
+    # =============================
+    @cached_property
+    def uc_mean(self) -> float:
+        return float(np.nanmean(self.uc))
+
+    @cached_property
+    def uc_std(self) -> float:
+        return float(np.nanstd(self.uc))
+
+    @cached_property
+    def uc_median(self) -> float:
+        return float(np.median(self.uc))
+
+    @cached_property
+    def uc_mad(self) -> float:
+        return float(np.median(np.abs(self.uc - self.uc_median)))
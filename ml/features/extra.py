@@ -7,19 +7,23 @@
 - вариабельность сердечного ритма (RMSSD, Poincaré plot)
 - нелинейный анализ (энтропия, параметры Хорса)
 - автокорреляционный анализ
+
+Функции признаков принимают общий контекст окна ctx (features.context.WindowContext),
+ядра (linear_trend, ordinal_patterns, permutation_entropy) работают с массивами.
 """
 
-import pandas as pd
 import numpy as np
 import math
-from scipy.stats import skew, kurtosis
-from scipy.signal import correlate
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
+
+from features.correlation import acorr
 
-def robust_stats(x) -> dict:
+def robust_stats(ctx) -> dict:
     """Вычисляет робастные статистические характеристики сигнала.
     
     Args:
-        x: Входной сигнал ЧСС плода
+        ctx: Контекст окна (WindowContext) с сигналом ЧСС плода
         
     Returns:
         Словарь с характеристиками:
@@ -28,82 +32,131 @@ def robust_stats(x) -> dict:
         - bpm_kurt: коэффициент эксцесса
         - outlier_ratio: доля выбросов (>3 MAD)
     """
-    x = np.asarray(x)
-    med = np.nanmedian(x)
-    mad = np.nanmedian(np.abs(x - med)) * 1.4826  # нормированный MAD
-    skews = skew(x, nan_policy="omit")
-    kurt = kurtosis(x, fisher=True, nan_policy="omit")
-    # robust z
-    rz = (x - med) / (mad + 1e-9)
-    outlier_ratio = np.mean(np.abs(rz) > 3) if np.isfinite(rz).any() else np.nan
     return {
-        "bpm_mad": float(mad),
-        "bpm_skew": float(skews),
-        "bpm_kurt": float(kurt),
-        "outlier_ratio": float(outlier_ratio),
+        "bpm_mad": ctx.bpm_mad,
+        "bpm_skew": ctx.bpm_skew,
+        "bpm_kurt": ctx.bpm_kurt,
+        "outlier_ratio": ctx.bpm_outlier_ratio,
     }
 
-def trend_features(x, p) -> dict:
-    """Анализ трендовых характеристик сигнала.
+def linear_trend(x, p, mean=None) -> tuple:
+    """Линейный тренд сигнала по МНК.
     
     Args:
         x: Входной сигнал
-        fs: Частота дискретизации (Гц)
+        p: Параметры (частота дискретизации fs)
+        mean: Готовое среднее x (nanmean), если уже посчитано
         
     Returns:
-        Словарь с трендовыми характеристиками:
-        - trend_slope: наклон линейного тренда (уд/мин/сек)
-        - trend_r2: коэффициент детерминации тренда
-        - deriv_zero_cross_rate: частота смены направления производной
+        tuple: (slope, r2) - наклон (уд/мин/сек) и коэффициент детерминации
     """
     t = np.arange(len(x)) / p.fs
-    xm = np.nanmean(x); xs = x - xm
     # линейная регрессия по формуле нормальных уравнений
     A = np.vstack([t, np.ones_like(t)]).T
     coef, _, _, _ = np.linalg.lstsq(A, x, rcond=None)
     slope = coef[0]
     # R^2
     yhat = A @ coef
+    if mean is None:
+        mean = np.nanmean(x)
     ss_res = np.nansum((x - yhat)**2)
-    ss_tot = np.nansum((x - np.nanmean(x))**2) + 1e-12
+    ss_tot = np.nansum((x - mean)**2) + 1e-12
     r2 = 1.0 - ss_res/ss_tot
-    # частота смены направления (по производной)
-    dx = np.diff(x)
-    zcr = np.mean(dx[:-1] * dx[1:] < 0) if len(dx) > 2 else np.nan
+    return float(slope), float(r2)
+
+def trend_features(ctx) -> dict:
+    """Анализ трендовых характеристик сигнала.
+    
+    Args:
+        ctx: Контекст окна (WindowContext)
+        
+    Returns:
+        Словарь с трендовыми характеристиками:
+        - trend_slope: наклон линейного тренда (уд/мин/сек)
+        - trend_r2: коэффициент детерминации тренда
+        - deriv_zero_cross_rate: частота смены направления производной
+    """
+    slope, r2 = ctx.trend_fit
     return {
-        "trend_slope": float(slope),
-        "trend_r2": float(r2),
-        "deriv_zero_cross_rate": float(zcr),
+        "trend_slope": slope,
+        "trend_r2": r2,
+        "deriv_zero_cross_rate": ctx.bpm_turn_rate,
     }
 
 # HRV / нелинейка
-def rmssd(x) -> float:
+def rmssd(ctx) -> float:
     """Root Mean Square of Successive Differences - мера кратковременной вариабельности.
     
     Args:
-        x: Входной сигнал ЧСС
+        ctx: Контекст окна (WindowContext)
         
     Returns:
         RMSSD в единицах измерения сигнала
     """
-    d = np.diff(x)
-    return float(np.sqrt(np.nanmean(d*d)))
+    return float(np.sqrt(ctx.bpm_diff_sq_mean))
 
-def poincare_sd1_sd2(x) -> tuple:
+def poincare_sd1_sd2(ctx) -> tuple:
     """Параметры SD1 и SD2 из анализа Poincaré plot.
     
     Args:
-        x: Входной сигнал ЧСС
+        ctx: Контекст окна (WindowContext)
         
     Returns:
         tuple: (SD1, SD2, SD1/SD2) - меры кратковременной и долговременной вариабельности
     """
-    x1, x2 = x[:-1], x[1:]
-    dif = x2 - x1
-    sd1 = np.sqrt(np.nanvar(dif) / 2.0)
-    sd2 = np.sqrt(2*np.nanvar(x) - (np.nanvar(dif)/2.0))
+    var_dif = ctx.bpm_diff_var
+    sd1 = np.sqrt(var_dif / 2.0)
+    sd2 = np.sqrt(2*ctx.bpm_var - (var_dif/2.0))
     return float(sd1), float(sd2), float(sd1/(sd2+1e-9))
 
+PERM_M = 3  # размерность паттерна энтропии перестановок
+
+def perm_tau(p) -> int:
+    """Задержка паттерна энтропии перестановок (~0.5 с)."""
+    return max(1, int(0.5*p.fs))
+
+def ordinal_patterns(x, m=3, tau=1, idx=None) -> np.ndarray:
+    """Коды порядковых паттернов (перестановок argsort) временного ряда.
+
+    Вложение строится через stride tricks без копирования, паттерн каждой
+    позиции — номер перестановки в факториальной системе (код Лемера, 0..m!-1).
+    Равные значения упорядочиваются по позиции (устойчивая сортировка).
+
+    Args:
+        x: Входной сигнал
+        m: Размерность паттерна
+        tau: Задержка дискретизации
+        idx: Позиции паттернов (начала вложений); по умолчанию — все
+
+    Returns:
+        Массив целых кодов паттернов
+    """
+    x = np.asarray(x, dtype=float)
+    span = (m - 1) * tau + 1
+    if len(x) < span:
+        return np.empty(0, dtype=np.int64)
+    emb = sliding_window_view(x, span)[:, ::tau]
+    if idx is not None:
+        emb = emb[idx]
+    perm = np.argsort(emb, axis=1, kind="stable")
+    # цифра Лемера k: сколько элементов правее позиции k меньше perm[k]
+    inversions = (perm[:, None, :] < perm[:, :, None]) & np.triu(np.ones((m, m), dtype=bool), 1)
+    weights = np.array([math.factorial(m - 1 - k) for k in range(m)], dtype=np.int64)
+    return inversions.sum(axis=2) @ weights
+
+
+def permutation_entropy_from_counts(counts, m=3) -> float:
+    """Нормализованная энтропия перестановок по гистограмме паттернов."""
+    counts = np.asarray(counts, dtype=float)
+    p = counts[counts > 0]
+    if p.size == 0:
+        return np.nan
+    p /= p.sum()
+    H = -np.sum(p*np.log2(p))
+    Hmax = np.log2(math.factorial(m))
+    return float(H / (Hmax + 1e-12))
+
+
 def permutation_entropy(x, m=3, tau=1) -> float:
     """Энтропия перестановок - мера сложности временного ряда.
     
@@ -115,55 +168,78 @@ def permutation_entropy(x, m=3, tau=1) -> float:
     Returns:
         Нормализованная энтропия перестановок [0, 1]
     """
-    x = np.asarray(x)
-    n = len(x) - (m-1)*tau
-    if n <= 0:
+    codes = ordinal_patterns(x, m, tau)
+    if codes.size == 0:
         return np.nan
-    patterns = {}
-    for i in range(n):
-        pat = tuple(np.argsort(x[i:i+m*tau:tau]))
-        patterns[pat] = patterns.get(pat, 0) + 1
-    p = np.array(list(patterns.values()), dtype=float)
-    p /= p.sum()
-    H = -np.sum(p*np.log2(p))
-    Hmax = np.log2(math.factorial(m))
-    return float(H / (Hmax + 1e-12))
+    return permutation_entropy_from_counts(np.bincount(codes, minlength=math.factorial(m)), m)
+
+
+class SlidingPermutationEntropy:
+    """Энтропия перестановок по скользящему окну с инкрементальной гистограммой.
+
+    На каждый новый отсчёт добавляется код завершившегося паттерна и
+    удаляется код паттерна, вышедшего из окна: O(m!) на шаг вместо O(window).
+    Значение совпадает с permutation_entropy по последним window отсчётам.
+    """
 
-def hjorth_params(x, p) -> tuple:
+    def __init__(self, window: int, m=3, tau=1):
+        self.window = window
+        self.m = m
+        self.tau = tau
+        self.span = (m - 1) * tau + 1
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(math.factorial(self.m), dtype=np.int64)
+        self._tail = deque(maxlen=self.span)
+        self._codes = deque()
+
+    def push(self, value: float) -> float:
+        """Добавляет отсчёт и возвращает энтропию по текущему окну (NaN, пока паттернов нет)."""
+        self._tail.append(float(value))
+        if len(self._tail) == self.span:
+            code = int(ordinal_patterns(np.fromiter(self._tail, dtype=float, count=self.span), self.m, self.tau)[0])
+            self._codes.append(code)
+            self.counts[code] += 1
+            # в окне из window отсчётов помещается window - span + 1 паттернов
+            if len(self._codes) > self.window - self.span + 1:
+                self.counts[self._codes.popleft()] -= 1
+        return self.entropy()
+
+    def entropy(self) -> float:
+        return permutation_entropy_from_counts(self.counts, self.m)
+
+def hjorth_params(ctx) -> tuple:
     """Параметры Хорса - активность, мобильность, сложность.
     
     Args:
-        x: Входной сигнал
+        ctx: Контекст окна (WindowContext)
         
     Returns:
         tuple: (activity, mobility, complexity) - параметры Хорса
     """
-    x = np.asarray(x)
-    dx = np.diff(x, prepend=x[0]) * p.fs
-    ddx = np.diff(dx, prepend=dx[0]) * p.fs
-    var_x = np.nanvar(x); var_dx = np.nanvar(dx); var_ddx = np.nanvar(ddx)
+    var_x = ctx.bpm_var; var_dx = ctx.hjorth_dx_var; var_ddx = ctx.hjorth_ddx_var
     activity = var_x
     mobility = np.sqrt(var_dx/(var_x+1e-12))
     complexity = np.sqrt(var_ddx/(var_dx+1e-12)) / (mobility + 1e-12)
     return float(activity), float(mobility), float(complexity)
 
 # Автокорреляция
-def autocorr_features(x, p, max_lag_s=120) -> tuple:
+def autocorr_features(ctx, max_lag_s=120) -> tuple:
     """Анализ автокорреляционной функции сигнала ЧСС.
     
     Args:
-        x: Входной сигнал
-        fs: Частота дискретизации (Гц)
+        ctx: Контекст окна (WindowContext)
         max_lag_s: Максимальный лаг для анализа (секунды)
         
     Returns:
         tuple: (ac_peak_lag, ac_decay) - лаг первого пика и время спада до 1/e
     """
-    x = np.asarray(x) - np.nanmean(x)
+    p = ctx.params
+    x = ctx.bpm - ctx.bpm_mean
     x = np.nan_to_num(x)
-    n = len(x)
     max_lag = int(max_lag_s*p.fs)
-    ac = correlate(x, x, mode="full")[n-1:n+max_lag]
+    ac = acorr(x, max_lag)
     ac /= ac[0] + 1e-12
     # первый локальный пик после нулевого лага
     # найдём максимум на интервале [1..]
@@ -179,28 +255,27 @@ def autocorr_features(x, p, max_lag_s=120) -> tuple:
     return float(ac_peak_lag), float(ac_decay)
 
 
-def compute_window_extra_features(seg: pd.DataFrame, p) -> dict:
-    bpm = seg.bpm.values
+def compute_window_extra_features(ctx) -> dict:
     feats = {}
-    feats.update(robust_stats(bpm))
-    feats.update(trend_features(bpm, p))
-    sd1, sd2, ratio = poincare_sd1_sd2(bpm)
+    feats.update(robust_stats(ctx))
+    feats.update(trend_features(ctx))
+    sd1, sd2, ratio = poincare_sd1_sd2(ctx)
     feats.update({
-        "rmssd": rmssd(bpm),
+        "rmssd": rmssd(ctx),
         "poincare_sd1": sd1,
         "poincare_sd2": sd2,
         "sd1_sd2_ratio": ratio,
-        "perm_entropy": permutation_entropy(bpm, m=3, tau=max(1, int(0.5*p.fs))),  # ~0.5с лаг
+        "perm_entropy": permutation_entropy_from_counts(ctx.perm_counts, m=PERM_M),
     })
-    act, mob, comp = hjorth_params(bpm, p)
+    act, mob, comp = hjorth_params(ctx)
     feats.update({
         "hjorth_activity": act,
         "hjorth_mobility": mob,
         "hjorth_complexity": comp,
     })
-    ac_lag, ac_decay = autocorr_features(bpm, p)
+    ac_lag, ac_decay = autocorr_features(ctx)
     feats.update({
         "ac_peak_lag": ac_lag,
         "ac_decay_time": ac_decay,
     })
-    return feats
\ No newline at end of file
+    return feats
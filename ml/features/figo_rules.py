@@ -6,98 +6,106 @@
 - detect_accelerations: поиск акцелераций,
 - summarize_events_on_window: сводка по окну (схватки, деселерации, акцелерации,
   вариабельность, тахикардия/брадикардия).
+
+Участки, надиры и пики событий выделяются векторно (features.segments).
 """
 
-import pandas as pd
 import numpy as np
-from scipy.ndimage import label
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
 from features.uc_features import detect_contractions
+from features.segments import mask_runs, run_argmin, run_argmax
+
+LOW_VAR_WIN_S = 60  # окно скользящего SD для низкой вариабельности, сек
 
 def rolling_sd(x: np.ndarray, win_s: int, p) -> np.ndarray:
     """
     Скользящее стандартное отклонение (вариабельность FHR).
     win_s: длина окна в секундах
     fs: частота дискретизации (по умолчанию 1 Гц)
+    Первые win-1 значений (неполное окно) и окна с NaN — NaN,
+    как у pd.Series.rolling(win, min_periods=win).std().
     """
+    x = np.asarray(x, dtype=float)
     win = int(win_s * p.fs)
-    return pd.Series(x).rolling(win, min_periods=win).std().values
+    out = np.full(len(x), np.nan)
+    if 2 <= win <= len(x):
+        out[win - 1:] = sliding_window_view(x, win).std(axis=1, ddof=1)
+    return out
 
 def estimate_baseline_exp(bpm: np.ndarray, p) -> np.ndarray:
     """
     Экспоненциально сглаженный baseline FHR.
     Этот метод присваивает больший вес более последним наблюдениям,
     эффективно фильтруя кратковременные вариации (акселерации, децелерации) и выделяя долгосрочный тренд (базовый уровень).
+    Рекурсия base[i] = α·bpm[i] + (1-α)·base[i-1], base[0] = bpm[0]
+    считается IIR-фильтром первого порядка (lfilter) без цикла на Python.
     """
+    bpm = np.asarray(bpm, dtype=float)
+    if len(bpm) == 0:
+        return np.zeros(0)
     alpha = p.alpha
-    base = np.zeros_like(bpm, dtype=float)
-    base[0] = bpm[0]
-    for i in range(1, len(bpm)):
-        base[i] = alpha * bpm[i] + (1 - alpha) * base[i-1]
+    base, _ = lfilter([alpha], [1.0, -(1.0 - alpha)], bpm, zi=[(1.0 - alpha) * bpm[0]])
     return base
 
 
-def detect_decelerations(df: pd.DataFrame, contractions, p) -> list:
+def detect_decelerations(ctx, contractions) -> list:
     """
     Возвращает список деселераций с типом FIGO.
+    ctx: контекст окна (WindowContext), baseline берётся из него.
     """
-    t = df.t.values
-    fhr = df.bpm.values
+    p = ctx.params
+    t = ctx.t
+    fhr = ctx.bpm
     # базовый уровень
-    base = estimate_baseline_exp(fhr, p)
+    base = ctx.baseline_exp
 
     # всё что ниже базового уровня - порог
-    below = (fhr <= (base - p.decel_min_drop_bpm)).astype(int)
-    labels, n = label(below)
-    decels = []
+    below = fhr <= (base - p.decel_min_drop_bpm)
+    starts, ends = mask_runs(below)
+    dur = t[ends] - t[starts]
 
-    for k in range(1, n+1):
-        idx = np.where(labels == k)[0]
-        seg_t = t[idx]
-        seg_f = fhr[idx]
-        dur_s = seg_t[-1] - seg_t[0]
+    # кратковременные выбросы не учитывем
+    keep = dur >= p.decel_min_duration_s
+    starts, ends, dur = starts[keep], ends[keep], dur[keep]
 
-        # кратковременные выбросы не учитывем
-        if dur_s < p.decel_min_duration_s:
-            continue
+    # надир и падение
+    nadirs = run_argmin(fhr, starts, ends)
+    drops = base[nadirs] - fhr[nadirs]
+    keep = drops >= p.decel_min_drop_bpm
+    starts, ends, dur, nadirs, drops = starts[keep], ends[keep], dur[keep], nadirs[keep], drops[keep]
 
-        # надир и падание
-        nadir_i = idx[np.argmin(seg_f)]
-        drop = float(base[nadir_i] - fhr[nadir_i])
-    
-        if drop < p.decel_min_drop_bpm:
-            continue
+    # пересечение каждой деселерации со схватками (k × m)
+    uc_start = np.array([uc["start"] for uc in contractions], dtype=float)
+    uc_end = np.array([uc["end"] for uc in contractions], dtype=float)
+    ovl = np.maximum(0.0, np.minimum(t[ends][:, None], uc_end) - np.maximum(t[starts][:, None], uc_start))
 
+    decels = []
+    for k, (s_i, e_i, nadir_i, dur_s) in enumerate(zip(starts, ends, nadirs, dur)):
         # по умолчанию (нестрашно)
         dec_type, uc_idx, lag_to_uc_peak = "variable", None, None
 
         if dur_s >= p.prolonged_decel_min_s:
             dec_type = "prolonged"
-        else:
-            # ищем пересечение со схватками
-            uc_idx, max_overlap = None, 0.0
-            for idx_uc, uc in enumerate(contractions):
-                ovl = max(0.0, min(seg_t[-1], uc["end"]) - max(seg_t[0], uc["start"]))
-                if ovl > max_overlap:
-                    max_overlap, uc_idx = ovl, idx_uc
-
-            if uc_idx is not None and max_overlap > 0:
-                uc = contractions[uc_idx]
-                lag_to_uc_peak = float(t[nadir_i] - uc["peak"])
-
-                near_peak = abs(lag_to_uc_peak) <= 10.0
-                ends_after_uc = t[idx[-1]] > uc["end"]
-                starts_with_uc = t[idx[0]] >= uc["start"] - 5.0
-
-                if near_peak and starts_with_uc and not ends_after_uc:
-                    dec_type = "early"
-                elif lag_to_uc_peak > 0 and ends_after_uc:
-                    dec_type = "late"
+        elif len(contractions) and ovl[k].max() > 0:
+            uc_idx = int(np.argmax(ovl[k]))
+            uc = contractions[uc_idx]
+            lag_to_uc_peak = float(t[nadir_i] - uc["peak"])
+
+            near_peak = abs(lag_to_uc_peak) <= 10.0
+            ends_after_uc = t[e_i] > uc["end"]
+            starts_with_uc = t[s_i] >= uc["start"] - 5.0
+
+            if near_peak and starts_with_uc and not ends_after_uc:
+                dec_type = "early"
+            elif lag_to_uc_peak > 0 and ends_after_uc:
+                dec_type = "late"
 
         decels.append(dict(
-            start=float(seg_t[0]),
+            start=float(t[s_i]),
             nadir=float(t[nadir_i]),
-            end=float(seg_t[-1]),
-            drop_bpm=drop,
+            end=float(t[e_i]),
+            drop_bpm=float(drops[k]),
             duration_s=dur_s,
             type=dec_type,
             uc_idx=uc_idx,
@@ -106,39 +114,35 @@ def detect_decelerations(df: pd.DataFrame, contractions, p) -> list:
     return decels
 
 
-def detect_accelerations(df: pd.DataFrame, p) -> list:
+def detect_accelerations(ctx) -> list:
     """
     Поиск акцелераций:
     - ≥ accel_min_rise_bpm над baseline
     - длительность ≥ accel_min_duration_s
+    ctx: контекст окна (WindowContext), baseline берётся из него.
     """
-    t = df.t.values
-    fhr = df.bpm.values
+    p = ctx.params
+    t = ctx.t
+    fhr = ctx.bpm
     # база
-    base = estimate_baseline_exp(fhr, p)
+    base = ctx.baseline_exp
 
     # маска выше baseline
-    above = (fhr >= (base + p.accel_min_rise_bpm)).astype(int)
-    labels, n = label(above)
-
-    accels = []
-    for k in range(1, n+1):
-        idx = np.where(labels == k)[0]
-        seg_t = t[idx]
-        seg_f = fhr[idx]
-        duration_s = seg_t[-1] - seg_t[0]
+    above = fhr >= (base + p.accel_min_rise_bpm)
+    starts, ends = mask_runs(above)
+    dur = t[ends] - t[starts]
 
-        # короткие не учитываем
-        if duration_s < p.accel_min_duration_s:
-            continue
-
-        peak_i_rel = int(np.argmax(seg_f))
-        peak_i = idx[peak_i_rel]
+    # короткие не учитываем
+    keep = dur >= p.accel_min_duration_s
+    starts, ends, dur = starts[keep], ends[keep], dur[keep]
+    peaks = run_argmax(fhr, starts, ends)
 
+    accels = []
+    for s_i, e_i, peak_i, duration_s in zip(starts, ends, peaks, dur):
         accels.append(dict(
-            start=float(seg_t[0]),
+            start=float(t[s_i]),
             peak=float(t[peak_i]),
-            end=float(seg_t[-1]),
+            end=float(t[e_i]),
             rise_bpm=float(fhr[peak_i] - base[peak_i]),
             duration_s=duration_s
         ))
@@ -146,13 +150,36 @@ def detect_accelerations(df: pd.DataFrame, p) -> list:
     return accels
 
 
-def summarize_events_on_window(seg: pd.DataFrame, p) -> dict:
+def decel_type_counts(decels: list) -> dict:
+    """Число деселераций всего и по типам FIGO."""
+    return dict(
+        decel_total     = len(decels),
+        decel_early     = sum(1 for d in decels if d["type"] == "early"),
+        decel_late      = sum(1 for d in decels if d["type"] == "late"),
+        decel_variable  = sum(1 for d in decels if d["type"] == "variable"),
+        decel_prolonged = sum(1 for d in decels if d["type"] == "prolonged"),
+    )
+
+
+def low_variability(ctx) -> tuple:
+    """
+    Низкая вариабельность по скользящему SD (окно LOW_VAR_WIN_S).
+
+    Returns:
+        tuple: (доля времени с SD < low_var_bpm, среднее скользящее SD).
+    """
+    sd_series = ctx.rolling_sd
+    if np.isfinite(sd_series).sum() > 0:
+        return float(np.mean(sd_series < ctx.params.low_var_bpm)), float(np.nanmean(sd_series))
+    return np.nan, np.nan
+
+
+def summarize_events_on_window(ctx) -> dict:
     """
     Сводка событий за окно.
 
     Args:
-        seg (pd.DataFrame): окно с сигналами (t, bpm, uc).
-        p (Params): параметры проекта.
+        ctx (WindowContext): контекст окна с сигналами (t, bpm, uc) и параметрами.
 
     Returns:
         tuple:
@@ -161,26 +188,21 @@ def summarize_events_on_window(seg: pd.DataFrame, p) -> dict:
             decels (list): деселерации.
             accels (list): акцелерации.
     """
-    fs = p.fs
+    p = ctx.params
 
     # UC и схватки
-    cons = detect_contractions(seg, p)
+    cons = detect_contractions(ctx)
 
     # Деселерации и акцелерации
-    decels = detect_decelerations(seg, cons, p)
-    accels = detect_accelerations(seg, p)
+    decels = detect_decelerations(ctx, cons)
+    accels = detect_accelerations(ctx)
 
     # Вариабельность
-    fhr = seg.bpm.values
-    var_sd = float(np.nanstd(fhr))
+    fhr = ctx.bpm
+    var_sd = ctx.bpm_std
 
     # низкая вариабельность: доля времени, где SD < порога (по окну 60с)
-    sd_series = rolling_sd(fhr, win_s=60, p=p)
-    if np.isfinite(sd_series).sum() > 0:
-        low_var_ratio = float(np.mean(sd_series < p.low_var_bpm))
-        low_var_mean  = float(np.nanmean(sd_series))
-    else:
-        low_var_ratio, low_var_mean = np.nan, np.nan
+    low_var_ratio, low_var_mean = low_variability(ctx)
 
     # тахикардия / брадикардия
     tachy_ratio = float(np.mean(fhr > p.tachy_bpm))
@@ -188,11 +210,7 @@ def summarize_events_on_window(seg: pd.DataFrame, p) -> dict:
 
     counts = dict(
         cons_total      = len(cons),
-        decel_total     = len(decels),
-        decel_early     = sum(1 for d in decels if d["type"] == "early"),
-        decel_late      = sum(1 for d in decels if d["type"] == "late"),
-        decel_variable  = sum(1 for d in decels if d["type"] == "variable"),
-        decel_prolonged = sum(1 for d in decels if d["type"] == "prolonged"),
+        **decel_type_counts(decels),
         accel_total     = len(accels),
         contractions    = len(cons),
         low_var_ratio   = low_var_ratio,
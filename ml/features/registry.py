@@ -0,0 +1,274 @@
+"""
+Реестр признаков и план вычисления.
+
+Каждая группа признаков объявляет имя, выходные признаки, зависимости
+(другие группы или промежуточные узлы — например, найденные схватки)
+и относительную стоимость. По списку нужных признаков (model.feature_names_
+плюс явно запрошенные для UI/хранения) build_plan строит план, который
+вычисляет только нужные группы и их зависимости.
+
+Порядок ключей результата совпадает с исходным пайплайном (FEATURE_ORDER).
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from features.common import compute_baseline, compute_variability, compute_psd, compute_coupling
+from features.extra import (
+    robust_stats, trend_features, rmssd, poincare_sd1_sd2, hjorth_params,
+    autocorr_features, permutation_entropy_from_counts, PERM_M,
+)
+from features.figo_rules import (
+    detect_decelerations, detect_accelerations, decel_type_counts, low_variability,
+)
+from features.uc_features import detect_contractions
+
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    """
+    Узел реестра.
+
+    name: имя узла (на него ссылаются deps),
+    outputs: имена признаков; пустой кортеж — промежуточный узел,
+    deps: узлы, значения которых передаются в fn после ctx,
+    cost: относительная стоимость (для оценки плана),
+    fn: fn(ctx, *deps) -> dict признаков (или значение промежуточного узла).
+    """
+    name: str
+    outputs: tuple
+    deps: tuple
+    cost: float
+    fn: Callable
+
+
+REGISTRY: dict = {}
+
+
+def register(name: str, outputs: Iterable[str] = (), deps: Iterable[str] = (), cost: float = 1.0):
+    """Декоратор регистрации узла; зависимости должны быть зарегистрированы раньше."""
+    def wrap(fn):
+        deps_t = tuple(deps)
+        for d in deps_t:
+            if d not in REGISTRY:
+                raise ValueError(f"feature node '{name}' depends on unknown node '{d}'")
+        REGISTRY[name] = FeatureSpec(name, tuple(outputs), deps_t, float(cost), fn)
+        return fn
+    return wrap
+
+
+# =============================
+#        Базовые признаки
+# =============================
+@register("baseline", outputs=["baseline"])
+def _baseline(ctx):
+    return {"baseline": compute_baseline(ctx)}
+
+
+register("variability", outputs=["bpm_sd", "bpm_iqr", "stv"], cost=2)(compute_variability)
+register("psd", outputs=["psd_low", "psd_high", "psd_lf_hf"], cost=4)(compute_psd)
+register("coupling", outputs=["xcorr_absmax"], cost=3)(compute_coupling)
+
+
+# =============================
+#      События FIGO (evt_)
+# =============================
+register("contractions", cost=4)(detect_contractions)
+register("decelerations", deps=["contractions"], cost=2)(detect_decelerations)
+register("accelerations", cost=2)(detect_accelerations)
+
+
+@register("evt_contractions", outputs=["evt_cons_total", "evt_contractions"], deps=["contractions"])
+def _evt_contractions(ctx, cons):
+    return {"evt_cons_total": len(cons), "evt_contractions": len(cons)}
+
+
+@register("evt_decelerations",
+          outputs=["evt_decel_total", "evt_decel_early", "evt_decel_late",
+                   "evt_decel_variable", "evt_decel_prolonged", "evt_decel_mean_drop"],
+          deps=["decelerations"])
+def _evt_decelerations(ctx, decels):
+    feats = {f"evt_{k}": v for k, v in decel_type_counts(decels).items()}
+    drops = [d["drop_bpm"] for d in decels]
+    feats["evt_decel_mean_drop"] = float(np.mean(drops)) if drops else 0.0
+    return feats
+
+
+@register("evt_accelerations", outputs=["evt_accel_total", "evt_accel_mean_rise"], deps=["accelerations"])
+def _evt_accelerations(ctx, accels):
+    rises = [a["rise_bpm"] for a in accels]
+    return {
+        "evt_accel_total": len(accels),
+        "evt_accel_mean_rise": float(np.mean(rises)) if rises else 0.0,
+    }
+
+
+@register("evt_low_var", outputs=["evt_low_var_ratio", "evt_low_var_mean"], cost=4)
+def _evt_low_var(ctx):
+    ratio, mean = low_variability(ctx)
+    return {"evt_low_var_ratio": ratio, "evt_low_var_mean": mean}
+
+
+@register("evt_rate", outputs=["evt_sd_overall", "evt_tachy_ratio", "evt_brady_ratio"])
+def _evt_rate(ctx):
+    p = ctx.params
+    return {
+        "evt_sd_overall": ctx.bpm_std,
+        "evt_tachy_ratio": float(np.mean(ctx.bpm > p.tachy_bpm)),
+        "evt_brady_ratio": float(np.mean(ctx.bpm < p.brady_bpm)),
+    }
+
+
+# =============================
+#    Дополнительные (extra_)
+# =============================
+@register("extra_robust",
+          outputs=["extra_bpm_mad", "extra_bpm_skew", "extra_bpm_kurt", "extra_outlier_ratio"], cost=3)
+def _extra_robust(ctx):
+    return {f"extra_{k}": v for k, v in robust_stats(ctx).items()}
+
+
+@register("extra_trend", outputs=["extra_trend_slope", "extra_trend_r2", "extra_deriv_zero_cross_rate"], cost=2)
+def _extra_trend(ctx):
+    return {f"extra_{k}": v for k, v in trend_features(ctx).items()}
+
+
+@register("extra_hrv", outputs=["extra_rmssd", "extra_poincare_sd1", "extra_poincare_sd2", "extra_sd1_sd2_ratio"])
+def _extra_hrv(ctx):
+    sd1, sd2, ratio = poincare_sd1_sd2(ctx)
+    return {
+        "extra_rmssd": rmssd(ctx),
+        "extra_poincare_sd1": sd1,
+        "extra_poincare_sd2": sd2,
+        "extra_sd1_sd2_ratio": ratio,
+    }
+
+
+@register("extra_perm_entropy", outputs=["extra_perm_entropy"], cost=2)
+def _extra_perm_entropy(ctx):
+    return {"extra_perm_entropy": permutation_entropy_from_counts(ctx.perm_counts, m=PERM_M)}
+
+
+@register("extra_hjorth", outputs=["extra_hjorth_activity", "extra_hjorth_mobility", "extra_hjorth_complexity"])
+def _extra_hjorth(ctx):
+    act, mob, comp = hjorth_params(ctx)
+    return {
+        "extra_hjorth_activity": act,
+        "extra_hjorth_mobility": mob,
+        "extra_hjorth_complexity": comp,
+    }
+
+
+@register("extra_autocorr", outputs=["extra_ac_peak_lag", "extra_ac_decay_time"], cost=2)
+def _extra_autocorr(ctx):
+    lag, decay = autocorr_features(ctx)
+    return {"extra_ac_peak_lag": lag, "extra_ac_decay_time": decay}
+
+
+# порядок ключей исходного пайплайна: basic, evt_ (counts), extra_, средние событий
+FEATURE_ORDER = (
+    "baseline", "bpm_sd", "bpm_iqr", "stv", "psd_low", "psd_high", "psd_lf_hf", "xcorr_absmax",
+    "evt_cons_total", "evt_decel_total", "evt_decel_early", "evt_decel_late",
+    "evt_decel_variable", "evt_decel_prolonged", "evt_accel_total", "evt_contractions",
+    "evt_low_var_ratio", "evt_low_var_mean", "evt_sd_overall", "evt_tachy_ratio", "evt_brady_ratio",
+    "extra_bpm_mad", "extra_bpm_skew", "extra_bpm_kurt", "extra_outlier_ratio",
+    "extra_trend_slope", "extra_trend_r2", "extra_deriv_zero_cross_rate",
+    "extra_rmssd", "extra_poincare_sd1", "extra_poincare_sd2", "extra_sd1_sd2_ratio",
+    "extra_perm_entropy",
+    "extra_hjorth_activity", "extra_hjorth_mobility", "extra_hjorth_complexity",
+    "extra_ac_peak_lag", "extra_ac_decay_time",
+    "evt_decel_mean_drop", "evt_accel_mean_rise",
+)
+
+# признаки, которые показывает дашборд (frontend, Dashboard.jsx)
+UI_FEATURES = (
+    "baseline", "bpm_sd", "bpm_iqr", "stv",
+    "evt_accel_total", "evt_decel_total", "evt_decel_early", "evt_decel_late",
+    "evt_decel_variable", "evt_decel_prolonged", "evt_contractions",
+    "evt_tachy_ratio", "evt_brady_ratio", "evt_low_var_ratio", "evt_low_var_mean", "evt_sd_overall",
+    "extra_rmssd", "extra_poincare_sd1", "extra_poincare_sd2", "extra_sd1_sd2_ratio",
+    "extra_ac_peak_lag", "extra_ac_decay_time",
+)
+
+
+def resolve_feature_names(spec: str) -> tuple:
+    """
+    Разбор списка признаков из строки (переменная окружения ML_EXTRA_FEATURES).
+
+    "all" — все признаки, "ui" — признаки дашборда, "" — ничего;
+    иначе имена через запятую (можно смешивать с "ui").
+    """
+    names = []
+    for item in (x.strip() for x in spec.split(",")):
+        if item == "all":
+            return FEATURE_ORDER
+        if item == "ui":
+            names.extend(UI_FEATURES)
+        elif item:
+            names.append(item)
+    return tuple(dict.fromkeys(names))
+
+
+PRODUCER = {out: spec.name for spec in REGISTRY.values() for out in spec.outputs}
+assert set(PRODUCER) == set(FEATURE_ORDER), "FEATURE_ORDER is out of sync with REGISTRY"
+
+
+class FeaturePlan:
+    """
+    План вычисления: узлы реестра в порядке регистрации (зависимости раньше)
+    и выходные признаки в порядке FEATURE_ORDER.
+    """
+
+    def __init__(self, nodes: list, outputs: list, unknown: list):
+        self.nodes = nodes
+        self.outputs = outputs
+        self.unknown = unknown
+
+    @property
+    def cost(self) -> float:
+        """Суммарная относительная стоимость плана."""
+        return sum(spec.cost for spec in self.nodes)
+
+    def run(self, ctx) -> dict:
+        """Вычисляет признаки плана по контексту окна."""
+        values, feats = {}, {}
+        for spec in self.nodes:
+            value = spec.fn(ctx, *(values[d] for d in spec.deps))
+            if spec.outputs:
+                feats.update(value)
+            else:
+                values[spec.name] = value
+        return {name: feats[name] for name in self.outputs}
+
+    def __repr__(self) -> str:
+        return f"FeaturePlan(nodes={[s.name for s in self.nodes]}, outputs={len(self.outputs)}, cost={self.cost:g})"
+
+
+def build_plan(features: Optional[Iterable[str]] = None) -> FeaturePlan:
+    """
+    План для заданного набора признаков; None — все признаки реестра.
+
+    Имена, которых нет в реестре (например, горизонт "H" из feature_names_
+    модели), пропускаются и возвращаются в plan.unknown.
+    """
+    if features is None:
+        wanted = set(FEATURE_ORDER)
+        unknown = []
+    else:
+        features = list(features)
+        wanted = {f for f in features if f in PRODUCER}
+        unknown = [f for f in features if f not in PRODUCER]
+
+    needed = set()
+    stack = [PRODUCER[f] for f in wanted]
+    while stack:
+        name = stack.pop()
+        if name not in needed:
+            needed.add(name)
+            stack.extend(REGISTRY[name].deps)
+
+    nodes = [spec for name, spec in REGISTRY.items() if name in needed]
+    outputs = [f for f in FEATURE_ORDER if f in wanted]
+    return FeaturePlan(nodes, outputs, unknown)
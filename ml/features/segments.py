@@ -0,0 +1,105 @@
+"""
+Сегментация сигнала на события.
+
+Векторные примитивы для детекторов figo_rules и uc_features:
+- mask_runs: границы всех непрерывных участков маски за один проход,
+- run_argmin / run_argmax: положение экстремума в каждом участке (reduceat),
+- level_crossings: ближайшие к центрам пересечения уровня слева и справа
+  (разреженная таблица минимумов, O(log n) на центр).
+"""
+
+import numpy as np
+
+
+def mask_runs(mask: np.ndarray) -> tuple:
+    """
+    Непрерывные участки True в маске.
+
+    Returns:
+        tuple: (starts, ends) — индексы начала и конца (включительно)
+        каждого участка, в порядке следования.
+    """
+    m = np.asarray(mask, dtype=bool).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], m, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return starts, ends
+
+
+def _run_arg(x: np.ndarray, starts: np.ndarray, ends: np.ndarray, ufunc) -> np.ndarray:
+    """Индекс первого экстремума ufunc (minimum/maximum) в каждом участке."""
+    if len(starts) == 0:
+        return np.zeros(0, dtype=int)
+    lengths = ends - starts + 1
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    run_id = np.repeat(np.arange(len(starts)), lengths)
+    idx = np.arange(lengths.sum()) - offsets[run_id] + starts[run_id]
+    vals = x[idx]
+    best = ufunc.reduceat(vals, offsets)
+    hit = np.flatnonzero(vals == best[run_id])
+    first = np.concatenate(([True], run_id[hit][1:] != run_id[hit][:-1]))
+    return idx[hit[first]]
+
+
+def run_argmin(x: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Индекс минимума в каждом участке [start, end] (первый при равенстве, как np.argmin)."""
+    return _run_arg(x, starts, ends, np.minimum)
+
+
+def run_argmax(x: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Индекс максимума в каждом участке [start, end] (первый при равенстве, как np.argmax)."""
+    return _run_arg(x, starts, ends, np.maximum)
+
+
+def _range_min_table(x: np.ndarray) -> list:
+    """
+    Разреженная таблица минимумов: table[j][i] = min(x[i:i + 2**j]).
+    NaN заменяется на -inf: как в цикле «while x[i] > level», NaN
+    останавливает поиск (считается пересечением уровня).
+    """
+    table = [np.where(np.isnan(x), -np.inf, x)]
+    size = 1
+    while 2 * size <= len(x):
+        prev = table[-1]
+        table.append(np.minimum(prev[:-size], prev[size:]))
+        size *= 2
+    return table
+
+
+def level_crossings(x: np.ndarray, centers: np.ndarray, levels: np.ndarray) -> tuple:
+    """
+    Границы участков выше уровня вокруг центров.
+
+    Для каждого центра c с уровнем L:
+      - left: последний i в [1, c] с x[i] <= L (или NaN), иначе 0,
+      - right: первый j в [c, len(x)-2] с x[j] <= L (или NaN), иначе len(x)-1.
+    Поиск — спуском по разреженной таблице минимумов: O(n log n) на таблицу
+    и O(log n) на центр, все центры обрабатываются вместе.
+    """
+    x = np.asarray(x, dtype=float)
+    centers = np.asarray(centers, dtype=int)
+    levels = np.asarray(levels, dtype=float)
+    n = len(x)
+    if len(centers) == 0 or n == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    table = _range_min_table(x)
+
+    # left: сдвигаем начало lo участка [lo, c], где все x > L, влево блоками 2**j
+    lo = centers + 1
+    # right: сдвигаем конец hi участка [c, hi), где все x > L, вправо блоками 2**j
+    hi = centers.copy()
+    for j in range(len(table) - 1, -1, -1):
+        size = 1 << j
+        mins = table[j]
+        a = lo - size
+        ok = a >= 1
+        ok[ok] = mins[a[ok]] > levels[ok]
+        lo = np.where(ok, a, lo)
+        ok = hi + size - 1 <= n - 2
+        ok[ok] = mins[hi[ok]] > levels[ok]
+        hi = np.where(ok, hi + size, hi)
+
+    left = lo - 1
+    left = np.where((left >= 1) & (table[0][np.clip(left, 0, n - 1)] <= levels), left, 0)
+    right = np.where((hi <= n - 2) & (table[0][np.clip(hi, 0, n - 1)] <= levels), hi, n - 1)
+    return left, right
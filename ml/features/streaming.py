@@ -0,0 +1,357 @@
+"""
+Инкрементальный (потоковый) расчёт статистик окна КТГ.
+
+Вместо пересчёта статистик bpm по полному окну на каждом шаге хранит
+состояние скользящего окна:
+- кольцевой буфер сырых отсчётов (t, bpm, uc),
+- суммы степеней bpm и его разностей (SD, асимметрия, эксцесс, RMSSD, Poincaré, Hjorth),
+- гистограмма порядковых паттернов (энтропия перестановок),
+- члены линейной регрессии тренда,
+- отсортированное окно для медианы, квантилей, MAD и доли выбросов,
+- скользящее SD (60 с) и экспоненциальный baseline.
+
+После предобработки (интерполяция + медианный фильтр) новое окно сравнивается
+с предыдущим, сдвинутым на один отсчёт. Отличаются только края окна
+(паддинг медианного фильтра, заполнение пропусков), поэтому состояние
+обновляется по нескольким «грязным» позициям, а не по всему окну.
+Для ограничения накопления ошибки округления состояние периодически
+пересчитывается с нуля.
+
+Статистики передаются в WindowContext, поэтому признаки считаются теми же
+функциями, что и в CTGFeatureBuilder.extract_features, и совпадают с ними
+с точностью до погрешности вычислений с плавающей точкой.
+
+Шаг не O(1): предобработка окна выполняется целиком (O(n)), а признаки
+уровня окна — спектр (Welch), связь bpm/uc, схватки, децелерации и
+акцелерации — по-прежнему считаются по всему окну, инкрементальных версий
+у них нет. Поддержание состояния тоже стоит порядка миллисекунды (numpy
+на коротких массивах). Измерено на окне 300 отсчётов (5 мин при 1 Гц, configs/default.yaml):
+шаг push() с признаками ~2.0–3.0 мс против ~2.5–3.9 мс полного пересчёта,
+то есть выигрыш около 20%, а не в разы.
+"""
+
+import bisect
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import Params
+from preprocessing.loaders import preprocess_signals
+from features.context import WindowContext
+from features.extra import ordinal_patterns, PERM_M, perm_tau
+from features.figo_rules import estimate_baseline_exp, rolling_sd, LOW_VAR_WIN_S
+
+
+class _SlidingSums:
+    """
+    Суммы членов производного ряда S окна x, где S[j] зависит от x[j..j+span-1].
+
+    series(x, idx) -> значения S в позициях idx,
+    terms(S) -> массив (k, len(S)) суммируемых членов.
+    При weighted=True дополнительно хранит Σ j·terms(S[j]) (для регрессии по времени).
+    """
+
+    def __init__(self, span: int, series, terms, weighted: bool = False):
+        self.span = span
+        self.series = series
+        self.terms = terms
+        self.weighted = weighted
+        self.sums = None
+        self.wsums = None
+
+    def sync(self, x: np.ndarray):
+        idx = np.arange(len(x) - self.span + 1)
+        T = self.terms(self.series(x, idx))
+        self.sums = T.sum(axis=1)
+        if self.weighted:
+            self.wsums = T @ idx
+
+    def slide(self, old: np.ndarray, new: np.ndarray, dirty: np.ndarray):
+        """
+        old — предыдущее окно, new — текущее (сдвиг на один отсчёт),
+        dirty — позиции new[:-1], значения которых отличаются от old[1:].
+        """
+        L = len(new) - self.span + 1
+        j = (dirty[:, None] - np.arange(self.span)[None, :]).ravel()
+        j = np.unique(j[(j >= 0) & (j <= L - 2)])
+
+        first_old = self.terms(self.series(old, np.array([0])))[:, 0]
+        last_new = self.terms(self.series(new, np.array([L - 1])))[:, 0]
+        t_old = self.terms(self.series(old, j + 1))
+        t_new = self.terms(self.series(new, j))
+
+        kept = self.sums - first_old  # Σ по old[1:], т.е. по сдвинутому окну
+        self.sums = kept - t_old.sum(axis=1) + t_new.sum(axis=1) + last_new
+        if self.weighted:
+            # Σ j·S_old[j+1] = Σ k·S_old[k] - Σ S_old[k], k ≥ 1
+            self.wsums = self.wsums - kept + (t_new - t_old) @ j + (L - 1) * last_new
+
+
+def _series_diff(x, idx):
+    return x[idx + 1] - x[idx]
+
+
+def _series_diff2(x, idx):
+    return x[idx + 2] - 2.0 * x[idx + 1] + x[idx]
+
+
+def _series_turn(x, idx):
+    return ((x[idx + 1] - x[idx]) * (x[idx + 2] - x[idx + 1]) < 0).astype(float)
+
+
+def _lerp(a: float, b: float, w: float) -> float:
+    """Линейная интерполяция в том же виде, что и в np.percentile."""
+    d = b - a
+    return b - d * (1.0 - w) if w >= 0.5 else a + d * w
+
+
+class StreamingFeatureState:
+    """
+    Состояние скользящего окна одного потока (одного обследования).
+
+    push(t, bpm, uc) добавляет отсчёт; когда окно заполнено, context() возвращает
+    WindowContext текущего окна с готовыми инкрементальными статистиками.
+    """
+
+    def __init__(self, params: Params, window: int = None, resync_every: int = None):
+        self.params = params
+        self.n = int(window or round(params.baseline_minutes * 60 * params.fs))
+        self.resync_every = int(resync_every or self.n)
+        self._lv_win = int(LOW_VAR_WIN_S * params.fs)
+        self._decay = (1.0 - params.alpha) ** np.arange(self.n + 1)
+
+        self._sx = _SlidingSums(1, self._series_x, lambda y: np.vstack([y, y * y, y ** 3, y ** 4]), weighted=True)
+        self._sd = _SlidingSums(2, _series_diff, lambda d: np.vstack([d, d * d, np.abs(d)]))
+        self._se = _SlidingSums(3, _series_diff2, lambda e: (e * e)[None, :])
+        self._sz = _SlidingSums(3, _series_turn, lambda z: z[None, :])
+        # гистограмма паттернов: суммы one-hot по кодам
+        tau = perm_tau(params)
+        n_codes = math.factorial(PERM_M)
+        self._sp = _SlidingSums(
+            (PERM_M - 1) * tau + 1,
+            lambda x, idx: ordinal_patterns(x, PERM_M, tau, idx=idx),
+            lambda codes: np.eye(n_codes)[codes].T,
+        )
+        self._accs = (self._sx, self._sd, self._se, self._sz, self._sp)
+        self.reset()
+
+    def reset(self):
+        """Сбрасывает буфер и статистики (например, при переподключении потока)."""
+        # каждый отсчёт пишется дважды, чтобы окно всегда было непрерывным срезом
+        self._raw = np.zeros((3, 2 * self.n))
+        self._count = 0
+        self._since_sync = 0
+        self._finite = False
+        self._t = self._x = self._uc = None
+        self._shift = 0.0
+        self._sorted = []
+        self._base = None
+        self._rsd = None
+
+    # -----------------------------
+    #        приём отсчётов
+    # -----------------------------
+    def push(self, t: float, bpm: float, uc: float) -> bool:
+        """
+        Добавляет отсчёт. Возвращает True, если окно заполнено и состояние актуально.
+        """
+        i = self._count % self.n
+        self._raw[:, i] = self._raw[:, i + self.n] = (t, bpm, uc)
+        self._count += 1
+        if self._count < self.n:
+            return False
+
+        s = self._count % self.n
+        t_w, x, uc_w = preprocess_signals(*self._raw[:, s:s + self.n])
+        prev = self._x if self._finite else None
+        self._t, self._x, self._uc = t_w, x, uc_w
+        self._finite = bool(np.isfinite(x).all())
+        if not self._finite:
+            return True
+
+        self._since_sync += 1
+        if prev is None or self._since_sync >= self.resync_every:
+            self._sync(x)
+        else:
+            self._slide(prev, x)
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return self._count >= self.n
+
+    @property
+    def t(self) -> np.ndarray:
+        return self._t
+
+    @property
+    def bpm(self) -> np.ndarray:
+        return self._x
+
+    @property
+    def uc(self) -> np.ndarray:
+        return self._uc
+
+    # -----------------------------
+    #      обновление состояния
+    # -----------------------------
+    def _series_x(self, x, idx):
+        return x[idx] - self._shift
+
+    def _sync(self, x: np.ndarray):
+        """Полный пересчёт состояния по окну."""
+        self._since_sync = 0
+        # сдвиг к медиане уменьшает потерю точности в суммах старших степеней
+        self._shift = float(np.median(x))
+        for acc in self._accs:
+            acc.sync(x)
+        self._sorted = sorted(x.tolist())
+        self._base = estimate_baseline_exp(x, self.params)
+        self._rsd = rolling_sd(x, win_s=LOW_VAR_WIN_S, p=self.params)
+
+    def _slide(self, old: np.ndarray, new: np.ndarray):
+        """Обновление состояния при сдвиге окна на один отсчёт."""
+        n = self.n
+        dirty = np.flatnonzero(new[:-1] != old[1:])
+
+        for acc in self._accs:
+            acc.slide(old, new, dirty)
+
+        # отсортированное окно
+        s = self._sorted
+        leaving = [old[0]] + old[dirty + 1].tolist()
+        entering = new[dirty].tolist() + [new[-1]]
+        for v in leaving:
+            del s[bisect.bisect_left(s, v)]
+        for v in entering:
+            bisect.insort(s, v)
+
+        # baseline: base_new[i] = base_old[i+1] + (1-α)^(i+1)·(old[1]-old[0]),
+        # затем поправки от изменившихся отсчётов и один шаг рекурсии для нового
+        alpha, decay = self.params.alpha, self._decay
+        base = self._base[1:] + decay[1:n] * (old[1] - old[0])
+        for j in dirty:
+            delta = new[j] - old[j + 1]
+            w = decay[:n - 1 - j] if j == 0 else alpha * decay[:n - 1 - j]
+            base[j:] += delta * w
+        self._base = np.append(base, alpha * new[-1] + (1 - alpha) * base[-1])
+
+        # скользящее SD: сдвиг и пересчёт только окон, задевающих изменения
+        w = self._lv_win
+        rsd = np.empty(n)
+        rsd[:-1] = self._rsd[1:]
+        rsd[:w - 1] = np.nan
+        k = (dirty[:, None] + np.arange(w)[None, :]).ravel()
+        k = np.unique(np.append(k[(k >= w - 1) & (k <= n - 2)], n - 1))
+        rsd[k] = sliding_window_view(new, w)[k - w + 1].std(axis=1, ddof=1)
+        self._rsd = rsd
+
+    # -----------------------------
+    #     статистики и признаки
+    # -----------------------------
+    def _quantile(self, q: float) -> float:
+        s = self._sorted
+        pos = q * (len(s) - 1)
+        lo = int(math.floor(pos))
+        hi = min(lo + 1, len(s) - 1)
+        return _lerp(s[lo], s[hi], pos - lo)
+
+    def _median(self) -> float:
+        s, n = self._sorted, len(self._sorted)
+        return s[n // 2] if n % 2 else (s[n // 2 - 1] + s[n // 2]) / 2.0
+
+    def _kth_abs_dev(self, med: float, k: int) -> float:
+        """
+        k-е (с нуля) по возрастанию значение |x - med| за O(log n):
+        слева и справа от медианы отклонения уже отсортированы.
+        """
+        s = self._sorted
+        split = bisect.bisect_left(s, med)
+        na, nb = split, len(s) - split
+        A = lambda i: med - s[split - 1 - i]
+        B = lambda i: s[split + i] - med
+        lo, hi = max(0, k + 1 - nb), min(k + 1, na)
+        while True:
+            i = (lo + hi) // 2
+            j = k + 1 - i
+            if i < na and j > 0 and B(j - 1) > A(i):
+                lo = i + 1
+            elif i > 0 and j < nb and A(i - 1) > B(j):
+                hi = i - 1
+            else:
+                return max(A(i - 1) if i > 0 else -math.inf, B(j - 1) if j > 0 else -math.inf)
+
+    def _moments(self) -> tuple:
+        """Среднее и центральные моменты 2–4 порядка окна bpm."""
+        n = self.n
+        s1, s2, s3, s4 = self._sx.sums / n
+        mu = s1
+        m2 = max(s2 - mu * mu, 0.0)
+        m3 = s3 - 3 * mu * s2 + 2 * mu ** 3
+        m4 = s4 - 4 * mu * s3 + 6 * mu * mu * s2 - 3 * mu ** 4
+        return mu + self._shift, m2, m3, m4
+
+    def context(self) -> WindowContext:
+        """
+        Контекст текущего окна. Если окно конечное, все статистики,
+        поддерживаемые инкрементально, передаются в контекст готовыми.
+        """
+        p = self.params
+        if not self._finite:
+            return WindowContext(self._t, self._x, self._uc, p)
+
+        n, fs = self.n, p.fs
+        x = self._x
+        mean, var, m3, m4 = self._moments()
+
+        # робастная статистика
+        med = self._median()
+        half = n // 2
+        if n % 2:
+            mad = self._kth_abs_dev(med, half)
+        else:
+            mad = (self._kth_abs_dev(med, half - 1) + self._kth_abs_dev(med, half)) / 2.0
+        mad *= 1.4826
+        zero = var <= (np.finfo(float).eps * mean) ** 2
+        thr = 3 * (mad + 1e-9)
+        outliers = bisect.bisect_left(self._sorted, med - thr) + (n - bisect.bisect_right(self._sorted, med + thr))
+
+        # тренд: МНК по t = j / fs
+        s_y = self._sx.sums[0]
+        s_jy = self._sx.wsums[0]
+        s_tt = n * (n * n - 1) / 12.0 / fs ** 2
+        s_ty = (s_jy - (n - 1) / 2.0 * s_y) / fs
+        ss_tot = n * var + 1e-12
+        ss_res = max(n * var - s_ty * s_ty / s_tt, 0.0)
+
+        # разности
+        m = n - 1
+        sum_d, sum_d2, sum_abs_d = self._sd.sums
+
+        # Hjorth: dx = diff(x, prepend=x[0])·fs, ddx = diff(dx, prepend=dx[0])·fs
+        d_first, d_last = x[1] - x[0], x[-1] - x[-2]
+        sum_ddx = fs ** 2 * d_last
+        sum_ddx2 = fs ** 4 * (d_first ** 2 + self._se.sums[0])
+
+        known = dict(
+            bpm_median=med,
+            bpm_mean=mean,
+            bpm_var=var,
+            bpm_iqr=self._quantile(0.75) - self._quantile(0.25),
+            bpm_mad=mad,
+            bpm_outlier_ratio=outliers / n,
+            bpm_skew=np.nan if zero else float(m3 / var ** 1.5),
+            bpm_kurt=np.nan if zero else float(m4 / var ** 2 - 3.0),
+            bpm_diff_var=max(sum_d2 / m - (sum_d / m) ** 2, 0.0),
+            bpm_diff_sq_mean=sum_d2 / m,
+            bpm_turn_rate=float(self._sz.sums[0] / (n - 2)) if n > 3 else np.nan,
+            hjorth_dx_var=fs ** 2 * (sum_d2 / n - (sum_d / n) ** 2),
+            hjorth_ddx_var=max(sum_ddx2 / n - (sum_ddx / n) ** 2, 0.0),
+            trend_fit=(float(s_ty / s_tt), float(1.0 - ss_res / ss_tot)),
+            perm_counts=np.rint(self._sp.sums).astype(np.int64),
+            baseline_exp=self._base,
+            rolling_sd=self._rsd,
+        )
+        if p.fs < 2:
+            known["bpm_stv"] = sum_abs_d / m
+        return WindowContext(self._t, x, self._uc, p, **known)
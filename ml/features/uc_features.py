@@ -9,18 +9,22 @@
 import numpy as np
 from scipy.signal import find_peaks
 
-def detect_contractions(df, p) -> list:
+from features.segments import level_crossings
+
+def detect_contractions(ctx) -> list:
     """
     Детектор схваток (UC):
       - ищем пики по prominence и высоте,
       - для каждого пика определяем start/end как точки пересечения с уровнем base+rel*h.
+    ctx: контекст окна (WindowContext).
     """
-    uc = df.uc.values
-    t  = df.t.values
+    p = ctx.params
+    uc = ctx.uc
+    t  = ctx.t
 
     # робастная статистика
-    med = float(np.median(uc))
-    mad = float(np.median(np.abs(uc - med)) + 1e-6)
+    med = ctx.uc_median
+    mad = ctx.uc_mad + 1e-6
 
     # пороги
     prom_abs = max(p.uc_prominence_min, p.uc_prominence_k_mad * mad)
@@ -35,47 +39,48 @@ def detect_contractions(df, p) -> list:
     )
 
     contractions = []
+    if len(peaks) == 0:
+        return contractions
     # окно для поиска вокруг пика
     win = int(p.uc_local_base_window_s * p.fs)
 
-    for pk, prom in zip(peaks, props["prominences"]):
+    # база: медиана окрестности пика без ±2 отсчётов вокруг него;
+    # для пиков вдали от краёв окрестности одной длины — одна матричная медиана
+    n = len(uc)
+    inner = (peaks - win >= 0) & (peaks + win <= n) & (win > 2)
+    bases = np.empty(len(peaks))
+    if inner.any():
+        offs = np.r_[-win:-2, 2:win]
+        bases[inner] = np.median(uc[peaks[inner][:, None] + offs], axis=1)
+    for k in np.flatnonzero(~inner):
+        pk = peaks[k]
         left = max(0, pk - win)
-        right = min(len(uc), pk + win)
+        right = min(n, pk + win)
         local = np.r_[uc[left:pk-2], uc[pk+2:right]] if pk+2 < right and pk-2 > left else uc[left:right]
-        # база
-        base = float(np.median(local)) if len(local) > 0 else med
+        bases[k] = float(np.median(local)) if len(local) > 0 else med
+
+    heights = uc[peaks] - bases
+    levels = bases + p.uc_rel_start * heights
+    # start/end: пересечения уровня base+rel*h слева и справа от пика
+    start_idx, end_idx = level_crossings(uc, peaks, levels)
 
-        peak_val = float(uc[pk])
-        h = peak_val - base
+    for k, pk in enumerate(peaks):
+        h = float(heights[k])
         if h <= 0:
             continue
 
-        level = base + p.uc_rel_start * h
-
-        # влево
-        i = pk
-        while i > 0 and uc[i] > level:
-            i -= 1
-        start_idx = i
-
-        # вправо
-        j = pk
-        while j < len(uc) - 1 and uc[j] > level:
-            j += 1
-        end_idx = j
-
         # если это были кратковременные схватки, тогда не учитывем
-        duration = float(t[end_idx] - t[start_idx])
+        duration = float(t[end_idx[k]] - t[start_idx[k]])
         if duration < p.uc_min_width_s:
             continue
 
         contractions.append(dict(
-            start=float(t[start_idx]),
+            start=float(t[start_idx[k]]),
             peak=float(t[pk]),
-            end=float(t[end_idx]),
-            duration=float(t[end_idx] - t[start_idx]),
-            height=float(h),
-            base=base,
-            prominence=float(prom),
+            end=float(t[end_idx[k]]),
+            duration=duration,
+            height=h,
+            base=float(bases[k]),
+            prominence=float(props["prominences"][k]),
         ))
     return contractions
@@ -0,0 +1,126 @@
+"""
+Микробатчинг запросов инференса.
+
+MicroBatcher собирает одиночные запросы /predict в пакеты: первый запрос
+открывает пакет, дальше ждём не более max_wait_ms или до max_batch
+запросов. Пакет считается одним CTGInference.predict_batch (признаки по
+каждому окну и один вызов predict_proba) в пуле потоков, после чего
+каждый ожидающий получает свой результат.
+
+Пока пакет считается, новые запросы копятся в очереди и образуют
+следующий пакет — при росте нагрузки размер пакета растёт сам.
+"""
+
+import asyncio
+from collections import Counter
+from typing import Callable, Optional
+
+
+class MicroBatcher:
+    """
+    Очередь с коалесценцией запросов в пакеты.
+
+    predict_batch: функция (payloads, horizons=...) -> list результатов
+        в том же порядке (CTGInference.predict_batch).
+    """
+
+    def __init__(self, predict_batch: Callable, *, max_batch: int = 32, max_wait_ms: float = 5.0):
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.predict_batch = predict_batch
+        self.max_batch = int(max_batch)
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # метрики
+        self.batches = 0
+        self.items = 0
+        self.sizes = Counter()
+
+    async def submit(self, payload: dict, horizon_min: float) -> dict:
+        """Ставит окно в очередь и ждёт результат (формат predict_from_json)."""
+        self._ensure_worker()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, horizon_min, fut))
+        return await fut
+
+    def _ensure_worker(self):
+        """Фоновая задача сборки пакетов; создаётся в цикле событий первого запроса."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _collect(self) -> list:
+        """Первый запрос ждём без ограничения, остальные — до дедлайна пакета."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_s
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # отменённые клиентом запросы не считаем
+            batch = [item for item in batch if not item[2].done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.sizes[len(batch)] += 1
+
+            payloads = [item[0] for item in batch]
+            horizons = [item[1] for item in batch]
+            try:
+                results = await loop.run_in_executor(None, self._predict, payloads, horizons)
+            except Exception as e:  # noqa: BLE001 — ошибка уходит каждому ожидающему
+                results = [e] * len(batch)
+
+            for (_, _, fut), res in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(res, Exception):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+
+    def _predict(self, payloads: list, horizons: list) -> list:
+        """
+        Пакетный инференс; при ошибке пакет пересчитывается поштучно,
+        чтобы некорректное окно не роняло чужие запросы.
+        """
+        try:
+            return self.predict_batch(payloads, horizons=horizons)
+        except Exception:
+            if len(payloads) == 1:
+                raise
+        results = []
+        for p, h in zip(payloads, horizons):
+            try:
+                results.append(self.predict_batch([p], horizons=[h])[0])
+            except Exception as e:  # noqa: BLE001
+                results.append(e)
+        return results
+
+    def stats(self) -> dict:
+        """Метрики коалесценции: число пакетов, запросов и распределение размеров пакета."""
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batch_sizes": dict(sorted(self.sizes.items())),
+        }
@@ -3,35 +3,83 @@
 
 Назначение:
 - загрузка обученной CatBoost модели один раз при старте,
-- преобразование входного JSON окна в DataFrame,
-- вычисление признаков через CTGFeatureBuilder,
-- получение вероятности и метки от модели.
+- предобработка входного JSON окна в массивы NumPy (без DataFrame),
+- вычисление признаков через CTGFeatureBuilder: только тех, что использует
+  модель (model.feature_names_), и явно запрошенных для UI/хранения,
+- получение вероятности и метки от модели,
+- пакетный инференс нескольких окон одним вызовом модели.
 """
 
-import pandas as pd
+import logging
+import time
+import numpy as np
+from typing import Iterable
 from catboost import CatBoostClassifier
-from preprocessing.loaders import load_window_from_json
+from preprocessing.loaders import preprocess_signals
 from features.builder import CTGFeatureBuilder
+from features.registry import FEATURE_ORDER, UI_FEATURES
 from config import P
 
+logger = logging.getLogger(__name__)
+
 
 class CTGInference:
     """
     Класс-обёртка для инференса модели КТГ.
     """
 
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, extra_features: Iterable[str] = UI_FEATURES):
         """
         Загружает CatBoost модель из файла и инициализирует экстрактор признаков.
 
         Args:
             model_path str: путь к файлу с моделью (.cbm).
+            extra_features (Iterable[str]): признаки сверх нужных модели,
+                которые возвращаются в ответе (UI, хранение).
         """
 
         self.model = CatBoostClassifier()
         self.model.load_model(model_path)
 
-        self.builder = CTGFeatureBuilder(P)
+        # колонки модели в порядке обучения; "H" — горизонт, не признак окна
+        names = list(self.model.feature_names_ or [])
+        window_names = [n for n in names if n != "H"]
+        unknown = [n for n in window_names if n not in FEATURE_ORDER]
+        if not window_names or len(unknown) == len(window_names):
+            # модель обучена без имён колонок: порядок признаков позиционный
+            logger.warning("model feature names are not recognized, computing all features")
+            self.columns = [*FEATURE_ORDER, "H"]
+            self.builder = CTGFeatureBuilder(P)
+        elif unknown:
+            raise ValueError(f"model expects features that are not in the registry: {unknown}")
+        else:
+            self.columns = names
+            self.builder = CTGFeatureBuilder(P, features=[*window_names, *extra_features])
+        logger.info("feature plan: %r", self.builder.plan)
+
+        # раскладка матрицы модели: позиции признаков окна и горизонта H
+        self._feat_names = [n for n in self.columns if n != "H"]
+        self._feat_pos = [i for i, n in enumerate(self.columns) if n != "H"]
+        self._h_pos = self.columns.index("H") if "H" in self.columns else None
+
+        # потоки CatBoost на вызов predict_proba (-1 — все ядра); в pre-fork
+        # режиме задаётся на воркер, чтобы воркеры не делили ядра (serve.py)
+        self.thread_count = -1
+
+    def warmup(self, n: int = 300) -> float:
+        """
+        Прогревочный инференс синтетического окна: импорты, кэши планов
+        (FFT, порядок колонок), инициализация модели. Возвращает время, с.
+        """
+        t = np.arange(n, dtype=float)
+        window = {
+            "t": t.tolist(),
+            "bpm": (140.0 + 5.0 * np.sin(2 * np.pi * t / 60.0)).tolist(),
+            "uc": (20.0 + 10.0 * np.maximum(0.0, np.sin(2 * np.pi * t / 180.0))).tolist(),
+        }
+        t0 = time.perf_counter()
+        self.predict_batch([{"window": window}])
+        return time.perf_counter() - t0
 
     def predict_from_json(self, payload: dict, *, horizon_min: int = 5, threshold: float = 0.7) -> dict:
         """
@@ -57,16 +105,44 @@ class CTGInference:
                   "features": dict  # словарь признаков
                 }
         """
-        # загрузка окна
-        df = load_window_from_json(payload)
+        return self.predict_batch([payload], horizons=[horizon_min], threshold=threshold)[0]
+
+    def predict_batch(self, payloads: list, *, horizons: list = None, threshold: float = 0.7) -> list:
+        """
+        Делает предсказания по нескольким JSON-окнам одним вызовом модели.
+
+        Признаки считаются для каждого окна, затем собираются в одну
+        матрицу N×F и оцениваются одним predict_proba.
+
+        Args:
+            payloads (list): список словарей того же формата, что и в predict_from_json.
+            horizons (list): горизонты H (мин) для каждого окна; по умолчанию 5.
+            threshold (float): порог классификации (по вероятности).
+
+        Returns:
+            list: результаты в том же порядке, что и payloads (формат predict_from_json).
+        """
+        if not payloads:
+            return []
+        if horizons is None:
+            horizons = [5] * len(payloads)
+        if len(horizons) != len(payloads):
+            raise ValueError("horizons must have the same length as payloads")
 
-        # извлечение признаков
-        feats = self.builder.extract_features(df)
+        # признаки по каждому окну: JSON-списки -> массивы -> контекст окна
+        feats = []
+        for p in payloads:
+            w = p["window"]
+            feats.append(self.builder.extract_from_arrays(*preprocess_signals(w["t"], w["bpm"], w["uc"])))
 
-        # инференс
-        X = pd.DataFrame([feats])
-        X["H"] = int(horizon_min)
-        proba = float(self.model.predict_proba(X)[:, 1][0])
-        label = int(proba > threshold)
+        # матрица N×F в порядке колонок модели, инференс одним вызовом
+        X = np.empty((len(feats), len(self.columns)))
+        X[:, self._feat_pos] = [[f[n] for n in self._feat_names] for f in feats]
+        if self._h_pos is not None:
+            X[:, self._h_pos] = [int(h) for h in horizons]
+        probas = self.model.predict_proba(X, thread_count=self.thread_count)[:, 1]
 
-        return {"proba": proba, "label": label, "features": feats}
+        return [
+            {"proba": float(pr), "label": int(pr > threshold), "features": f}
+            for pr, f in zip(probas, feats)
+        ]
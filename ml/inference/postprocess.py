@@ -1,9 +1,21 @@
 """
 Модуль постобработки предсказаний модели.
+
+- AlarmState: гистерезис тревоги для одного потока (обследования),
+- AlarmStore: состояния тревоги по ключу обследования/сессии
+  с вытеснением по LRU и по времени простоя, общие для воркеров serve.py.
 """
 
+import fcntl
+import hashlib
+import mmap
+import tempfile
+import threading
+import time
 from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass
+from typing import Hashable
 import numpy as np
 
 STRIDE_S = 1  # шаг поступления окон, сек
@@ -30,20 +42,156 @@ class AlarmState:
         # Буферы последних окон под каждое правило
         self.buf_on  = deque(maxlen=self.on_n)
         self.buf_off = deque(maxlen=self.off_n)
+        # Счётчики единиц в буферах (вместо sum() по deque на каждом шаге)
+        self.cnt_on = 0
+        self.cnt_off = 0
         self.is_on = False  # текущее состояние тревоги
 
+    @staticmethod
+    def _push(buf: deque, value: int) -> int:
+        """Добавляет индикатор в буфер и возвращает изменение суммы буфера."""
+        delta = value
+        if len(buf) == buf.maxlen:
+            delta -= buf[0]
+        buf.append(value)
+        return delta
+
     def update(self, proba: float) -> int:
         # Обновляем буферы индикаторами
-        self.buf_on.append(  1 if proba > self.cfg.on_thr  else 0 )
-        self.buf_off.append( 1 if proba < self.cfg.off_thr else 0 )
+        self.cnt_on  += self._push(self.buf_on,  1 if proba > self.cfg.on_thr  else 0)
+        self.cnt_off += self._push(self.buf_off, 1 if proba < self.cfg.off_thr else 0)
 
         if not self.is_on:
             # Условие включения: достаточно истории + k из n выше on_thr
-            if len(self.buf_on) == self.buf_on.maxlen and sum(self.buf_on) >= self.on_k:
+            if len(self.buf_on) == self.buf_on.maxlen and self.cnt_on >= self.on_k:
                 self.is_on = True
         else:
             # Условие выключения: достаточно истории + k из n ниже off_thr
-            if len(self.buf_off) == self.buf_off.maxlen and sum(self.buf_off) >= self.off_k:
+            if len(self.buf_off) == self.buf_off.maxlen and self.cnt_off >= self.off_k:
                 self.is_on = False
 
         return int(self.is_on)
+
+
+class AlarmStore:
+    """
+    Хранилище состояний тревоги по ключу обследования/сессии в общей памяти.
+
+    Состояния лежат в анонимном mmap (MAP_SHARED) — таблице слотов фиксированного
+    размера, поэтому хранилище, созданное до fork (serve.py импортирует api.main
+    в родителе), общее для всех воркеров: окна одного case_id, попавшие в разные
+    процессы, обновляют один и тот же гистерезис. Доступ сериализуется блокировкой
+    записи fcntl (между процессами; снимается ядром, если воркер убит посреди
+    обновления) и threading.Lock (между потоками процесса).
+
+    - max_entries: ограничение памяти, при превышении вытесняется давно не обновлявшийся ключ (LRU),
+    - idle_ttl_s: состояние ключа без обновлений дольше TTL удаляется.
+
+    Ключ хранится как 64-битный хэш repr(key) (blake2b).
+    """
+
+    def __init__(self, cfg: AlarmConfig, stride_s: int = STRIDE_S,
+                 max_entries: int = 1000, idle_ttl_s: float = 1800.0):
+        self.cfg = cfg
+        self.stride_s = stride_s
+        self.max_entries = max_entries
+        self.idle_ttl_s = idle_ttl_s
+        # параметры правил — как у AlarmState
+        proto = AlarmState(cfg, stride_s=stride_s)
+        self.on_n, self.off_n, self.on_k, self.off_k = proto.on_n, proto.off_n, proto.on_k, proto.off_k
+
+        dtype = np.dtype([
+            ("key", np.uint64), ("used", np.bool_), ("is_on", np.bool_),
+            ("tick", np.uint64),                     # порядок обращений (LRU)
+            ("seen", np.float64),                    # время последнего обновления
+            ("cnt_on", np.int32), ("cnt_off", np.int32),
+            ("n", np.int64),                         # число окон в истории ключа
+            ("buf_on", np.uint8, (max(self.on_n, 1),)),
+            ("buf_off", np.uint8, (max(self.off_n, 1),)),
+        ])
+        capacity = max(1, max_entries)
+        self._mem = mmap.mmap(-1, 8 + dtype.itemsize * capacity)
+        self._clock = np.frombuffer(self._mem, dtype=np.uint64, count=1)
+        self._slots = np.frombuffer(self._mem, dtype=dtype, count=capacity, offset=8)
+        self._lockfile = tempfile.TemporaryFile()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.lockf(self._lockfile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lockfile, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(key: Hashable) -> np.uint64:
+        return np.uint64(int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "little"))
+
+    def _find(self, h: np.uint64) -> int:
+        idx = np.flatnonzero(self._slots["used"] & (self._slots["key"] == h))
+        return int(idx[0]) if len(idx) else -1
+
+    def update(self, key: Hashable, proba: float) -> int:
+        """Обновляет состояние тревоги ключа и возвращает флаг тревоги (0/1)."""
+        now = time.monotonic()
+        h = self._hash(key)
+        with self._locked():
+            slots = self._slots
+            # вытеснение по простою
+            slots["used"] &= ~(now - slots["seen"] > self.idle_ttl_s)
+            i = self._find(h)
+            if i < 0:
+                free = np.flatnonzero(~slots["used"])
+                if len(free):
+                    i = int(free[0])
+                else:
+                    # LRU: слот с самым старым обращением
+                    i = int(np.argmin(slots["tick"]))
+                slots[i] = 0
+                slots["key"][i] = h
+                slots["used"][i] = True
+            self._clock[0] += 1
+            slots["tick"][i] = self._clock[0]
+            slots["seen"][i] = now
+            return self._step(slots[i:i + 1], proba)
+
+    def _step(self, slot: np.ndarray, proba: float) -> int:
+        """Шаг гистерезиса AlarmState.update над слотом таблицы (кольцевые буферы)."""
+        n = int(slot["n"][0])
+        bit_on = 1 if proba > self.cfg.on_thr else 0
+        bit_off = 1 if proba < self.cfg.off_thr else 0
+        for buf, cnt, size, bit in (("buf_on", "cnt_on", self.on_n, bit_on),
+                                    ("buf_off", "cnt_off", self.off_n, bit_off)):
+            if size == 0:
+                continue
+            ring = slot[buf][0]
+            pos = n % size
+            slot[cnt] += bit - (int(ring[pos]) if n >= size else 0)
+            ring[pos] = bit
+        slot["n"] = n + 1
+
+        if not slot["is_on"][0]:
+            # Условие включения: достаточно истории + k из n выше on_thr
+            if n + 1 >= self.on_n and slot["cnt_on"][0] >= self.on_k:
+                slot["is_on"] = True
+        else:
+            # Условие выключения: достаточно истории + k из n ниже off_thr
+            if n + 1 >= self.off_n and slot["cnt_off"][0] >= self.off_k:
+                slot["is_on"] = False
+        return int(slot["is_on"][0])
+
+    def drop(self, key: Hashable) -> bool:
+        """Удаляет состояние ключа (например, по окончании обследования)."""
+        h = self._hash(key)
+        with self._locked():
+            i = self._find(h)
+            if i < 0:
+                return False
+            self._slots["used"][i] = False
+            return True
+
+    def __len__(self) -> int:
+        with self._locked():
+            return int(self._slots["used"].sum())
@@ -3,6 +3,8 @@
 
 Используется в онлайн-инференсе: получает пакет длительностью ~5 минут,
 подготавливает его и возвращает DataFrame для подачи в модель.
+Путь инференса использует preprocess_signals напрямую — только NumPy,
+без построения DataFrame.
 """
 
 import numpy as np
@@ -34,19 +36,57 @@ def load_window_from_json(payload: dict) -> pd.DataFrame:
             - "uc": сокращения матки.
     """
     window = payload["window"]
-    df = pd.DataFrame({
-        "t":   window["t"],
-        "bpm": window["bpm"],
-        "uc":  window["uc"]
-    })
+    t, bpm, uc = preprocess_signals(window["t"], window["bpm"], window["uc"])
+    return pd.DataFrame({"t": t, "bpm": bpm, "uc": uc})
+
+
+def preprocess_signals(t, bpm, uc) -> tuple:
+    """
+    Предобработка сырых сигналов окна без построения DataFrame.
+
+    Args:
+        t, bpm, uc: последовательности одинаковой длины (время, ЧСС, UC).
+
+    Returns:
+        tuple: (t, bpm, uc) — массивы float после удаления аномалий bpm,
+            интерполяции пропусков и медианного сглаживания.
+    """
+    t = np.ascontiguousarray(t, dtype=float)
 
     # удаление аномалий bpm
-    bpm = df["bpm"].to_numpy(dtype=float)
+    bpm = np.array(bpm, dtype=float)
     bpm[(bpm < 50) | (bpm > 210)] = np.nan
-    bpm = pd.Series(bpm).interpolate(limit=8).bfill().ffill().values
+    bpm = fill_gaps(bpm, limit=8)
 
     # сглаживание
     bpm = medfilt(bpm, kernel_size=P.kernel_size)
-    uc = medfilt(df["uc"].to_numpy(dtype=float), kernel_size=P.kernel_size)
+    uc = medfilt(np.ascontiguousarray(uc, dtype=float), kernel_size=P.kernel_size)
+
+    return t, bpm, uc
+
+
+def fill_gaps(x: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Заполнение пропусков (NaN), эквивалентное
+    pd.Series(x).interpolate(limit=limit).bfill().ffill():
+      - внутри пропуска первые limit значений — линейная интерполяция
+        между соседними валидными точками, остальные — следующее валидное,
+      - пропуски в начале — первое валидное, в конце — последнее валидное.
+    Полностью пустой ряд возвращается без изменений.
+    """
+    nan = np.isnan(x)
+    if not nan.any():
+        return x
+    valid = np.flatnonzero(~nan)
+    if len(valid) == 0:
+        return x
+    idx = np.arange(len(x))
+    # np.interp линейно интерполирует внутри и держит крайние значения снаружи
+    out = np.interp(idx, valid, x[valid])
 
-    return pd.DataFrame({"t": df["t"].values, "bpm": bpm, "uc": uc})
\ No newline at end of file
+    # позиция внутри пропуска (1 — первый NaN после валидной точки)
+    last_valid = np.maximum.accumulate(np.where(nan, -1, idx))
+    beyond = nan & (last_valid >= 0) & (idx - last_valid > limit) & (idx < valid[-1])
+    if beyond.any():
+        out[beyond] = x[valid[np.searchsorted(valid, idx[beyond])]]
+    return out
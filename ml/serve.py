@@ -0,0 +1,140 @@
+"""
+Pre-fork запуск ML-сервиса на нескольких процессах.
+
+Родитель один раз загружает модель, конфиг и прогревает кэши
+(импорт api.main + CTGInference.warmup), открывает слушающий сокет
+и форкает воркеры. Страницы модели и кэшей делятся между воркерами
+copy-on-write, поэтому память не растёт в N раз.
+
+Каждый воркер:
+  - получает свою долю ядер для CatBoost (thread_count),
+  - делает прогревочный запрос до начала приёма соединений,
+  - обслуживает общий сокет через uvicorn.
+
+Родитель перезапускает упавшие воркеры и завершает их по SIGTERM/SIGINT.
+
+Запуск (из каталога ml/):
+    python serve.py --host 0.0.0.0 --port 8000 --workers 4
+
+Состояние тревоги (AlarmStore) создаётся в родителе при импорте api.main
+и лежит в общей памяти (mmap), поэтому окна одного case_id, попавшие
+в разные воркеры, обновляют один гистерезис.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+logger = logging.getLogger("ml.serve")
+
+
+def _catboost_threads(workers: int) -> int:
+    """Потоки CatBoost на воркер: ML_CATBOOST_THREADS или ядра поровну."""
+    env = os.getenv("ML_CATBOOST_THREADS")
+    if env:
+        return max(1, int(env))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _run_worker(sock: socket.socket, threads: int, log_level: str):
+    """Тело воркера после fork: прогрев и приём соединений."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    from api.main import app, model
+
+    model.thread_count = threads
+    took = model.warmup()
+    logger.info("worker %d ready (catboost threads=%d, warm-up %.1f ms)", os.getpid(), threads, took * 1000)
+
+    config = uvicorn.Config(app, log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, threads: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, threads, log_level)
+        except BaseException:  # noqa: BLE001 — воркер не должен вернуться в цикл родителя
+            logger.exception("worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork ML service")
+    parser.add_argument("--host", default=os.getenv("ML_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ML_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ML_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--log-level", default=os.getenv("ML_LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    workers = max(1, args.workers)
+    threads = _catboost_threads(workers)
+
+    # модель, конфиг, кэши и общая память тревог — один раз в родителе, до fork
+    from api.main import model
+    model.thread_count = 1  # пул потоков CatBoost в родителе не поднимаем
+    took = model.warmup()
+    logger.info("model loaded and warmed up in parent (%.1f ms)", took * 1000)
+
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.set_inheritable(True)
+
+    # объекты, созданные до fork, не трогаем сборщиком — меньше копирования страниц
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for _ in range(workers):
+        pid = _spawn(sock, threads, args.log_level)
+        children[pid] = time.monotonic()
+    logger.info("serving on %s:%d with %d workers", args.host, args.port, workers)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        logger.warning("worker %d exited with status %d, restarting", pid, status)
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)  # не крутим fork в цикле, если воркер падает сразу
+        children[_spawn(sock, threads, args.log_level)] = time.monotonic()
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Тесты ML-сервиса запускаются из каталога ml/ (как serve.py и uvicorn):
+модули импортируются как config, features, inference, а конфиг
+читается по относительному пути configs/default.yaml.
+
+    cd ml && python -m pytest -q tests
+"""
+
+import os
+import sys
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_DIR)
+os.chdir(ML_DIR)
+
+
+import numpy as np
+import pytest
+
+
+def synthetic_window(n=300, seed=0):
+    """Сырое окно КТГ (t, bpm, uc) с аномалиями bpm (0 — потеря сигнала)."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n, dtype=float)
+    bpm = 140 + 8 * np.sin(t / 25 + seed) + rng.normal(0, 2, n)
+    uc = 20 + 15 * np.maximum(0, np.sin(t / 60 + seed)) + rng.normal(0, 1, n)
+    bpm[[0, 1, 40, 41, 42, 120]] = 0
+    bpm[200:215] = 0
+    return t, bpm, uc
+
+
+@pytest.fixture(scope="session")
+def window():
+    return synthetic_window
+
+
+@pytest.fixture(scope="session")
+def model_path(tmp_path_factory):
+    """Небольшая модель CatBoost на признаках реестра (вместо inference/models/model_v1.cbm)."""
+    import pandas as pd
+    from catboost import CatBoostClassifier
+    from config import P
+    from features.builder import CTGFeatureBuilder
+    from features.registry import FEATURE_ORDER
+    from preprocessing.loaders import preprocess_signals
+
+    tmp = tmp_path_factory.mktemp("model")
+    builder = CTGFeatureBuilder(P)
+    rows = [builder.extract_from_arrays(*preprocess_signals(*synthetic_window(seed=s))) for s in range(12)]
+    columns = [FEATURE_ORDER[0], FEATURE_ORDER[2], FEATURE_ORDER[7], FEATURE_ORDER[11], "H"]
+    frame = pd.DataFrame([{**r, "H": 5 + s % 3 * 5} for s, r in enumerate(rows)])[columns]
+    model = CatBoostClassifier(iterations=30, depth=3, verbose=False, train_dir=str(tmp))
+    model.fit(frame, [s % 2 for s in range(12)])
+    path = tmp / "model.cbm"
+    model.save_model(str(path))
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def api(model_path):
+    """Модуль api.main с моделью model_path (ML_MODEL_PATH читается при импорте)."""
+    os.environ["ML_MODEL_PATH"] = model_path
+    import api.main
+    return api.main
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(api):
+    with TestClient(api.app) as client:
+        yield client
+
+
+def test_batch_equals_single_predictions(client, window):
+    def _item(seed, H, case_id, features):
+        t, bpm, uc = window(seed=seed)
+        return {"window": {"t": t.tolist(), "bpm": bpm.tolist(), "uc": uc.tolist()},
+                "H": H, "case_id": case_id, "features": features}
+
+    horizons = [5, 10, 15, 5, 10]
+    features = [None, [], ["bpm_median"], None, ["nope"]]
+    single = [
+        client.post("/predict", json=_item(s, h, f"single-{s}", f)).json()
+        for s, (h, f) in enumerate(zip(horizons, features))
+    ]
+    batch = client.post("/predict/batch", json={
+        "items": [_item(s, h, f"batch-{s}", f) for s, (h, f) in enumerate(zip(horizons, features))],
+    })
+    assert batch.status_code == 200
+    assert batch.json()["results"] == single
+    assert len({r["proba"] for r in single}) > 1
+
+
+def test_batch_rejects_empty_items(client):
+    assert client.post("/predict/batch", json={"items": []}).status_code == 422
+
+
+def test_features_lists_the_response_features(client, window):
+    names = client.get("/features").json()["features"]
+    t, bpm, uc = window()
+    result = client.post("/predict", json={"window": {"t": t.tolist(), "bpm": bpm.tolist(), "uc": uc.tolist()}})
+    assert names == list(result.json()["features"])
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from inference.batching import MicroBatcher
+
+
+class FakeModel:
+    """predict_batch, падающий на окнах с ключом "bad"."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, payloads, horizons):
+        self.calls.append(len(payloads))
+        if any(p.get("bad") for p in payloads):
+            raise ValueError("bad window")
+        return [{"id": p["id"], "H": h} for p, h in zip(payloads, horizons)]
+
+
+def test_requests_are_coalesced_into_one_batch():
+    model = FakeModel()
+
+    async def main():
+        batcher = MicroBatcher(model, max_batch=8, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit({"id": i}, 5) for i in range(5)))
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert [r["id"] for r in results] == list(range(5))
+    assert model.calls == [5]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_batch_is_limited_by_max_batch():
+    model = FakeModel()
+
+    async def main():
+        batcher = MicroBatcher(model, max_batch=2, max_wait_ms=50)
+        return await asyncio.gather(*(batcher.submit({"id": i}, 5) for i in range(5)))
+
+    asyncio.run(main())
+    assert model.calls == [2, 2, 1]
+
+
+def test_bad_window_falls_back_to_per_item():
+    model = FakeModel()
+
+    async def main():
+        batcher = MicroBatcher(model, max_batch=8, max_wait_ms=50)
+        return await asyncio.gather(
+            batcher.submit({"id": 0}, 5),
+            batcher.submit({"id": 1, "bad": True}, 5),
+            batcher.submit({"id": 2}, 10),
+            return_exceptions=True,
+        )
+
+    ok0, err, ok2 = asyncio.run(main())
+    assert ok0 == {"id": 0, "H": 5}
+    assert isinstance(err, ValueError)
+    assert ok2 == {"id": 2, "H": 10}
+    # пакет целиком, затем каждое окно отдельно
+    assert model.calls == [3, 1, 1, 1]
+
+
+def test_cancelled_requests_are_not_scored():
+    model = FakeModel()
+
+    async def main():
+        batcher = MicroBatcher(model, max_batch=8, max_wait_ms=50)
+        cancelled = asyncio.create_task(batcher.submit({"id": 0}, 5))
+        kept = asyncio.create_task(batcher.submit({"id": 1}, 5))
+        await asyncio.sleep(0.01)  # оба в очереди, пакет ещё собирается
+        cancelled.cancel()
+        result = await kept
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return batcher, result
+
+    batcher, result = asyncio.run(main())
+    assert result == {"id": 1, "H": 5}
+    assert model.calls == [1]
+    assert batcher.stats()["items"] == 1
+
+
+def test_error_of_whole_batch_reaches_every_caller():
+    def broken(payloads, horizons):
+        raise RuntimeError("model is down")
+
+    async def main():
+        batcher = MicroBatcher(broken, max_batch=8, max_wait_ms=20)
+        return await asyncio.gather(*(batcher.submit({"id": i}, 5) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from config import P
+from features.common import compute_coupling
+from features.context import WindowContext
+from features.correlation import CorrelationPlan, acorr, get_plan, xcorr
+from features.extra import autocorr_features
+from preprocessing.loaders import preprocess_signals
+
+
+def _signal(n, seed):
+    return np.random.default_rng(seed).normal(0, 1, n).cumsum()
+
+
+def _sliced(full, m, max_lag):
+    return full if max_lag is None else full[max(m - 1 - max_lag, 0):m + max_lag]
+
+
+@pytest.mark.parametrize("n,m", [(300, 300), (300, 17), (17, 300), (1, 50), (50, 1), (1000, 999)])
+@pytest.mark.parametrize("max_lag", [None, 0, 5, 120, 5000])
+def test_fft_xcorr_matches_direct(n, m, max_lag):
+    x, y = _signal(n, 1), _signal(m, 2)
+    expected = _sliced(np.correlate(x, y, mode="full"), m, max_lag)
+    got = CorrelationPlan(n, m).xcorr(x, y, max_lag)  # всегда через БПФ
+    np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-9 * np.abs(expected).max())
+    np.testing.assert_allclose(xcorr(x, y, max_lag), expected, rtol=1e-9, atol=1e-9 * np.abs(expected).max())
+
+
+@pytest.mark.parametrize("n", [2, 300, 2401])
+@pytest.mark.parametrize("max_lag", [None, 0, 1, 120, 10_000])
+def test_fft_acorr_matches_direct(n, max_lag):
+    x = _signal(n, 3)
+    hi = n - 1 if max_lag is None else min(max_lag, n - 1)
+    expected = np.correlate(x, x, mode="full")[n - 1:n + hi]
+    got = CorrelationPlan(n, hi + 1).acorr(x, hi)
+    np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-9 * expected[0])
+    np.testing.assert_allclose(acorr(x, max_lag), expected, rtol=1e-9, atol=1e-9 * expected[0])
+
+
+def test_method_choice():
+    """Окно сервиса (300 отсчётов) считается напрямую, длинные записи — через БПФ."""
+    assert get_plan(300, 300).prefer_direct(300 * 300)
+    assert get_plan(300, 121).prefer_direct(300 * 300)
+    assert not get_plan(4000, 4000).prefer_direct(4000 * 4000)
+    assert not get_plan(4000, 121).prefer_direct(4000 * 4000)
+
+
+def test_nan_falls_back_to_direct():
+    x, y = _signal(3000, 4), _signal(3000, 5)
+    x[10] = np.nan
+    expected = np.correlate(x, y, mode="full")
+    got = xcorr(x, y)
+    np.testing.assert_array_equal(np.isnan(got), np.isnan(expected))
+    assert np.isnan(acorr(x, 50)).all()
+
+
+def test_empty():
+    assert xcorr([], [1.0]).size == 0 and acorr([]).size == 0
+
+
+def test_long_window_features_through_fft():
+    """Признаки корреляции на 40-минутном окне (путь БПФ) равны прямому расчёту."""
+    n = 2400
+    t = np.arange(n, dtype=float)
+    rng = np.random.default_rng(6)
+    bpm = 140 + 10 * np.sin(t / 90) + rng.normal(0, 2, n)
+    uc = 20 + 30 * np.maximum(0, np.sin(t / 180)) + rng.normal(0, 1, n)
+    ctx = WindowContext(*preprocess_signals(t, bpm, uc), P)
+    assert not get_plan(n, n).prefer_direct(n * n)
+
+    b0 = (ctx.bpm - ctx.bpm_mean) / (ctx.bpm_std + 1e-6)
+    u0 = (ctx.uc - ctx.uc_mean) / (ctx.uc_std + 1e-6)
+    direct = np.abs(np.correlate(b0, u0, mode="full") / n).max()
+    assert compute_coupling(ctx)["xcorr_absmax"] == pytest.approx(direct, rel=1e-9)
+
+    x = np.nan_to_num(ctx.bpm - ctx.bpm_mean)
+    max_lag = int(120 * P.fs)
+    ac = np.correlate(x, x, mode="full")[n - 1:n + max_lag]
+    ac /= ac[0] + 1e-12
+    peak = (1 + np.argmax(ac[1:])) / P.fs
+    decay = np.flatnonzero(ac <= 1 / np.e)
+    assert autocorr_features(ctx) == pytest.approx((peak, decay[0] / P.fs if decay.size else np.nan), nan_ok=True)
@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from config import P
+from features.builder import CTGFeatureBuilder
+from features.context import WindowContext
+from features.figo_rules import rolling_sd
+from preprocessing.loaders import fill_gaps, preprocess_signals
+
+
+def _window(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n, dtype=float)
+    bpm = 140 + 8 * np.sin(t / 25) + rng.normal(0, 2, n)
+    uc = 20 + 15 * np.maximum(0, np.sin(t / 60)) + rng.normal(0, 1, n)
+    bpm[[0, 1, 40, 41, 42, 120]] = np.nan
+    bpm[200:215] = 0  # аномалия -> NaN, пропуск длиннее limit
+    bpm[-3:] = np.nan
+    return t, bpm, uc
+
+
+@pytest.mark.parametrize("limit", [1, 3, 8])
+def test_fill_gaps_matches_pandas(limit):
+    _, bpm, _ = _window()
+    bpm[(bpm < 50) | (bpm > 210)] = np.nan
+    expected = pd.Series(bpm).interpolate(limit=limit).bfill().ffill().to_numpy()
+    np.testing.assert_allclose(fill_gaps(bpm.copy(), limit), expected)
+
+
+def test_fill_gaps_all_nan_is_unchanged():
+    x = np.full(5, np.nan)
+    assert np.isnan(fill_gaps(x, 8)).all()
+
+
+def test_rolling_sd_matches_pandas():
+    x = np.random.default_rng(1).normal(140, 5, 300)
+    x[100] = np.nan
+    expected = pd.Series(x).rolling(60, min_periods=60).std().to_numpy()
+    np.testing.assert_allclose(rolling_sd(x, 60, P), expected, equal_nan=True)
+
+
+def test_moments_match_scipy():
+    t, bpm, uc = preprocess_signals(*_window())
+    ctx = WindowContext(t, bpm, uc, P)
+    assert math.isclose(ctx.bpm_skew, stats.skew(bpm, nan_policy="omit"), rel_tol=1e-9)
+    assert math.isclose(ctx.bpm_kurt, stats.kurtosis(bpm, nan_policy="omit"), rel_tol=1e-9)
+
+
+def test_predict_batch_matches_dataframe_scoring(tmp_path):
+    """Матрица N×F собирается в порядке колонок модели, как DataFrame по именам."""
+    from catboost import CatBoostClassifier
+    from features.registry import FEATURE_ORDER
+    from inference.core import CTGInference
+
+    windows = [_window(seed=s) for s in range(6)]
+    builder = CTGFeatureBuilder(P)
+    feats = [builder.extract_from_arrays(*preprocess_signals(*w)) for w in windows]
+    # колонки в порядке, отличном от реестра, горизонт H в середине
+    columns = [FEATURE_ORDER[7], FEATURE_ORDER[2], "H", FEATURE_ORDER[0], FEATURE_ORDER[11]]
+    horizons = [5, 10, 5, 15, 10, 5]
+    frame = pd.DataFrame([{**f, "H": h} for f, h in zip(feats, horizons)])[columns]
+
+    model = CatBoostClassifier(iterations=20, depth=2, verbose=False, train_dir=str(tmp_path))
+    model.fit(frame, [0, 1, 0, 1, 1, 0])
+    path = tmp_path / "model.cbm"
+    model.save_model(str(path))
+
+    inference = CTGInference(str(path))
+    payloads = [{"window": {"t": t.tolist(), "bpm": b.tolist(), "uc": u.tolist()}} for t, b, u in windows]
+    results = inference.predict_batch(payloads, horizons=horizons)
+
+    expected = model.predict_proba(frame)[:, 1]
+    np.testing.assert_allclose([r["proba"] for r in results], expected, rtol=1e-9)
@@ -0,0 +1,71 @@
+"""
+Признаки окна против эталона, посчитанного исходной реализацией
+(pandas-окно, цикловые детекторы событий, np.correlate — до WindowContext,
+FFT-корреляции, векторной сегментации и реестра признаков).
+
+Эталон tests/data/golden_features.json получен прежним
+CTGFeatureBuilder.extract_features на окнах из golden_windows().
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import P
+from features.builder import CTGFeatureBuilder
+from preprocessing.loaders import preprocess_signals
+
+DEMO_CSV = os.path.join(os.path.dirname(os.getcwd()), "backend", "src", "demo.csv")
+GOLDEN = os.path.join("tests", "data", "golden_features.json")
+
+
+def golden_windows(csv_path: str, n: int = 300) -> dict:
+    """Окна эталона: участки демо-записи и синтетические крайние случаи."""
+    raw = pd.read_csv(csv_path, usecols=["t", "bpm", "uc"]).to_numpy()
+    out = {}
+    for off in (0, 900, 2100, 3300, 4700, 6000, 7400, 8800, 10100, 11400):
+        w = raw[off:off + n]
+        out[f"demo_{off}"] = (w[:, 0] - w[0, 0], w[:, 1].copy(), w[:, 2].copy())
+    t = np.arange(n, dtype=float)
+    # схватка, децелерация после её пика и акцелерация
+    uc = 15 + 60 * np.exp(-((t - 120) / 25) ** 2)
+    bpm = 140 - 30 * np.exp(-((t - 150) / 15) ** 2) + 25 * np.exp(-((t - 240) / 8) ** 2)
+    out["synthetic_events"] = (t, bpm, uc)
+    out["flat"] = (t, np.full(n, 140.0), np.full(n, 10.0))
+    g = 140 + 5 * np.sin(t / 7)
+    g[100:160] = 0.0  # длинная потеря сигнала
+    out["gap"] = (t, g, 20 + 0 * t)
+    return out
+
+
+@pytest.fixture(scope="module")
+def windows():
+    if not os.path.exists(DEMO_CSV):
+        pytest.skip(f"{DEMO_CSV} not found")
+    return golden_windows(DEMO_CSV)
+
+
+def test_features_match_pre_refactor_values(windows):
+    with open(GOLDEN) as f:
+        golden = json.load(f)
+    assert golden.keys() == windows.keys()
+    builder = CTGFeatureBuilder(P)
+    bad = {}
+    for name, raw in windows.items():
+        t, bpm, uc = preprocess_signals(*raw)
+        got = builder.extract_features(pd.DataFrame({"t": t, "bpm": bpm, "uc": uc}))
+        expected = golden[name]
+        assert got.keys() == expected.keys(), name
+        for k, v in expected.items():
+            g = got[k]
+            if v is None:
+                ok = g is None or math.isnan(g)
+            else:
+                ok = g is not None and math.isclose(g, v, rel_tol=1e-9, abs_tol=1e-12)
+            if not ok:
+                bad[f"{name}.{k}"] = (g, v)
+    assert not bad
@@ -0,0 +1,80 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from features.extra import (
+    SlidingPermutationEntropy,
+    ordinal_patterns,
+    permutation_entropy,
+    permutation_entropy_from_counts,
+)
+
+
+def _loop_entropy(x, m=3, tau=1, kind=None):
+    """Прежняя реализация: argsort каждого среза в цикле (kind=None — как было)."""
+    x = np.asarray(x)
+    n = len(x) - (m - 1) * tau
+    if n <= 0:
+        return np.nan
+    patterns = {}
+    for i in range(n):
+        pat = tuple(np.argsort(x[i:i + m * tau:tau], kind=kind))
+        patterns[pat] = patterns.get(pat, 0) + 1
+    p = np.array(list(patterns.values()), dtype=float)
+    p /= p.sum()
+    H = -np.sum(p * np.log2(p))
+    return float(H / (np.log2(math.factorial(m)) + 1e-12))
+
+
+@pytest.mark.parametrize("m", [3, 4, 5, 6])
+@pytest.mark.parametrize("tau", [1, 2, 5])
+def test_distinct_values_match_loop(m, tau):
+    x = np.random.default_rng(m * 10 + tau).normal(140, 5, 400)
+    assert permutation_entropy(x, m, tau) == pytest.approx(_loop_entropy(x, m, tau), rel=1e-12)
+
+
+def test_ties_and_nan():
+    rng = np.random.default_rng(1)
+    x = np.round(rng.normal(0, 1, 400) * 2)  # много равных значений
+    # m=3: прежняя сортировка коротких срезов устойчива — результат тот же
+    assert permutation_entropy(x, 3, 2) == pytest.approx(_loop_entropy(x, 3, 2), rel=1e-12)
+    # m>=4: равные значения упорядочены по позиции (устойчивая сортировка)
+    for m in (4, 5, 6):
+        assert permutation_entropy(x, m, 2) == pytest.approx(_loop_entropy(x, m, 2, kind="stable"), rel=1e-12)
+    y = rng.normal(0, 1, 200)
+    y[[5, 50, 51, 120]] = np.nan  # NaN сортируется последним
+    assert permutation_entropy(y, 3, 1) == pytest.approx(_loop_entropy(y, 3, 1), rel=1e-12)
+
+
+def test_short_series_and_constant():
+    assert math.isnan(permutation_entropy([1.0, 2.0], 3, 1))
+    assert permutation_entropy(np.ones(50), 3, 1) == 0.0
+    assert math.isnan(permutation_entropy_from_counts(np.zeros(6)))
+
+
+@pytest.mark.parametrize("m", [3, 4, 5])
+def test_codes_enumerate_permutations(m):
+    """Каждой перестановке — свой код 0..m!-1 (код Лемера)."""
+    rows = np.array(list(itertools.permutations(range(m))), dtype=float)
+    x = rows.ravel()
+    codes = ordinal_patterns(x, m, 1, idx=np.arange(0, len(x), m))
+    assert sorted(codes.tolist()) == list(range(math.factorial(m)))
+
+
+@pytest.mark.parametrize("m,tau", [(3, 1), (3, 2), (4, 3)])
+def test_sliding_matches_recompute(m, tau):
+    window = 60
+    x = np.round(np.random.default_rng(2).normal(140, 3, 400))
+    sliding = SlidingPermutationEntropy(window, m, tau)
+    span = (m - 1) * tau + 1
+    for i, v in enumerate(x):
+        got = sliding.push(v)
+        expected = permutation_entropy(x[max(0, i + 1 - window):i + 1], m, tau)
+        if i + 1 < span:
+            assert math.isnan(got) and math.isnan(expected)
+        else:
+            assert got == pytest.approx(expected, rel=1e-12), i
+    sliding.reset()
+    assert math.isnan(sliding.push(1.0))
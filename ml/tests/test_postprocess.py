@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+
+from inference import postprocess
+from inference.postprocess import AlarmConfig, AlarmState, AlarmStore
+
+# включение после 2 окон подряд выше порога, выключение после 1 окна ниже
+CFG = AlarmConfig(on_minutes=2 / 60, off_minutes=1 / 60, on_ratio=1.0, off_ratio=1.0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_alarm_state_hysteresis():
+    state = AlarmState(CFG)
+    assert state.update(0.9) == 0  # истории ещё мало
+    assert state.update(0.9) == 1
+    assert state.update(0.7) == 1  # между порогами — тревога держится
+    assert state.update(0.5) == 0
+
+
+def test_store_keeps_state_per_key():
+    store = AlarmStore(CFG)
+    store.update("a", 0.9)
+    assert store.update("a", 0.9) == 1
+    assert store.update("b", 0.9) == 0
+    assert len(store) == 2
+
+
+def test_store_evicts_least_recently_updated():
+    store = AlarmStore(CFG, max_entries=2)
+    store.update("a", 0.9)
+    store.update("b", 0.9)
+    store.update("a", 0.9)  # "a" обновлён позже "b"
+    store.update("c", 0.9)
+    assert len(store) == 2
+    assert store.drop("b") is False
+    assert store.drop("a") is True
+
+
+def test_store_evicts_idle_keys(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(postprocess.time, "monotonic", clock)
+    store = AlarmStore(CFG, idle_ttl_s=10.0)
+    store.update("a", 0.9)
+    assert store.update("a", 0.9) == 1
+
+    clock.now = 5.0
+    store.update("b", 0.1)
+    clock.now = 12.0  # "a" простаивал 12 с, "b" — 7 с
+    store.update("b", 0.1)
+    assert len(store) == 1
+
+    # состояние "a" начато заново: тревога не унаследована
+    assert store.update("a", 0.9) == 0
+
+
+def test_store_drop():
+    store = AlarmStore(CFG)
+    store.update("a", 0.9)
+    assert store.drop("a") is True
+    assert store.drop("a") is False
+    assert len(store) == 0
+
+
+def test_store_matches_alarm_state():
+    """Кольцевые буферы слотов дают ту же последовательность тревог, что и AlarmState."""
+    rng = np.random.default_rng(0)
+    cfg = AlarmConfig(on_minutes=7 / 60, off_minutes=3 / 60, on_ratio=0.7, off_ratio=1.0)
+    store = AlarmStore(cfg, max_entries=8)
+    states = {}
+    for step in range(3000):
+        key = int(rng.integers(0, 5))
+        if rng.random() < 0.01:
+            assert store.drop(key) is (states.pop(key, None) is not None)
+            continue
+        # длинные серии высоких/низких вероятностей, чтобы тревога переключалась
+        proba = float(np.clip(0.5 + 0.45 * np.sin(step / 40 + key) + rng.normal(0, 0.1), 0, 1))
+        state = states.setdefault(key, AlarmState(cfg))
+        assert store.update(key, proba) == state.update(proba)
+    assert len(store) == len(states)
+
+
+def test_store_is_shared_across_fork():
+    store = AlarmStore(CFG)
+    store.update("a", 0.9)
+    pid = os.fork()
+    if pid == 0:
+        # воркер: второе высокое окно того же обследования
+        os._exit(0 if store.update("a", 0.9) == 1 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # родитель видит состояние, обновлённое в дочернем процессе
+    assert store.update("a", 0.7) == 1
+    assert store.update("a", 0.5) == 0
+    assert len(store) == 1
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from config import P
+from features.builder import CTGFeatureBuilder
+from features.registry import (
+    FEATURE_ORDER, PRODUCER, REGISTRY, UI_FEATURES, build_plan, resolve_feature_names,
+)
+from inference.core import CTGInference
+from preprocessing.loaders import preprocess_signals
+
+MODEL_FEATURES = [FEATURE_ORDER[0], FEATURE_ORDER[2], FEATURE_ORDER[7], FEATURE_ORDER[11]]
+
+
+def _closure(features):
+    """Узлы реестра, нужные для признаков (с зависимостями) — независимо от build_plan."""
+    needed, stack = set(), [PRODUCER[f] for f in features]
+    while stack:
+        name = stack.pop()
+        needed.add(name)
+        stack.extend(REGISTRY[name].deps)
+    return needed
+
+
+@pytest.mark.parametrize("spec", [
+    "", "ui", "all", "extra_rmssd,evt_decel_late", "ui,extra_perm_entropy", "xcorr_absmax,baseline",
+])
+def test_model_plan_is_model_features_plus_extras(model_path, window, spec):
+    extras = resolve_feature_names(spec)
+    inf = CTGInference(model_path, extra_features=extras)
+    plan = inf.builder.plan
+    wanted = set(MODEL_FEATURES) | set(extras)
+
+    assert inf.columns == [*MODEL_FEATURES, "H"]
+    assert plan.outputs == [f for f in FEATURE_ORDER if f in wanted]
+    assert plan.unknown == []
+    assert {s.name for s in plan.nodes} == _closure(wanted)
+
+    # план считает ровно эти признаки и с теми же значениями, что полный пайплайн
+    arrays = preprocess_signals(*window(seed=3))
+    got = inf.builder.extract_from_arrays(*arrays)
+    full = CTGFeatureBuilder(P).extract_from_arrays(*arrays)
+    assert list(got) == plan.outputs
+    np.testing.assert_allclose([got[k] for k in got], [full[k] for k in got], rtol=0, atol=0)
+
+    t, bpm, uc = window(seed=3)
+    res = inf.predict_from_json({"window": {"t": t.tolist(), "bpm": bpm.tolist(), "uc": uc.tolist()}})
+    assert list(res["features"]) == plan.outputs
+
+
+def test_default_extras_are_ui_features(model_path):
+    assert resolve_feature_names("ui") == UI_FEATURES
+    plan = CTGInference(model_path).builder.plan
+    assert set(plan.outputs) == set(MODEL_FEATURES) | set(UI_FEATURES)
+
+
+def test_plan_skips_unneeded_groups():
+    plan = build_plan(["baseline", "H"])
+    assert [s.name for s in plan.nodes] == ["baseline"]
+    assert plan.unknown == ["H"]
+    # события тянут промежуточные узлы, но не соседние группы
+    plan = build_plan(["evt_decel_late"])
+    assert [s.name for s in plan.nodes] == ["contractions", "decelerations", "evt_decelerations"]
+    assert plan.outputs == ["evt_decel_late"]
+    assert build_plan(None).outputs == list(FEATURE_ORDER)
+    assert build_plan([]).nodes == []
+
+
+def test_resolve_feature_names():
+    assert resolve_feature_names("") == ()
+    assert resolve_feature_names("all") == FEATURE_ORDER
+    assert resolve_feature_names(" baseline , stv,baseline ") == ("baseline", "stv")
+    assert resolve_feature_names("stv,ui")[0] == "stv" and len(resolve_feature_names("stv,ui")) == len(UI_FEATURES)
+
+
+def test_model_with_unknown_feature_is_rejected(tmp_path):
+    import pandas as pd
+    from catboost import CatBoostClassifier
+
+    frame = pd.DataFrame({"baseline": [130.0, 150.0] * 4, "not_a_feature": [0.0, 1.0] * 4, "H": [5] * 8})
+    model = CatBoostClassifier(iterations=2, depth=1, verbose=False, train_dir=str(tmp_path))
+    model.fit(frame, [0, 1] * 4)
+    model.save_model(str(tmp_path / "m.cbm"))
+    with pytest.raises(ValueError, match="not_a_feature"):
+        CTGInference(str(tmp_path / "m.cbm"))
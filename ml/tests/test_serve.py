@@ -0,0 +1,61 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/task"), reason="needs /proc to list workers")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str, payload: dict = None) -> dict:
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def _children(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return f.read().split()
+
+
+def test_serve_starts_several_workers(model_path, window):
+    port = _free_port()
+    env = {**os.environ, "ML_MODEL_PATH": model_path, "ML_CATBOOST_THREADS": "1"}
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", "2",
+         "--log-level", "warning"],
+        env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            assert proc.poll() is None, "serve.py exited"
+            try:
+                if _get(f"{base}/health")["status"] == "ok" and len(_children(proc.pid)) == 2:
+                    break
+            except OSError:
+                pass
+            assert time.monotonic() < deadline, "workers did not start"
+            time.sleep(0.2)
+
+        t, bpm, uc = window(seed=1)
+        payload = {"window": {"t": t.tolist(), "bpm": bpm.tolist(), "uc": uc.tolist()}, "H": 5, "case_id": 7}
+        results = [_get(f"{base}/predict", payload) for _ in range(8)]
+        assert all(r == results[0] for r in results)
+        assert 0.0 <= results[0]["proba"] <= 1.0
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=30) == 0
@@ -0,0 +1,63 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import P
+from features.builder import CTGFeatureBuilder
+from preprocessing.loaders import preprocess_signals
+
+DEMO_CSV = os.path.join(os.path.dirname(os.getcwd()), "backend", "src", "demo.csv")
+
+
+@pytest.fixture(scope="module")
+def record():
+    """Запись КТГ из демо-CSV бэкенда (t, bpm, uc) с пропусками и аномалиями bpm."""
+    if not os.path.exists(DEMO_CSV):
+        pytest.skip(f"{DEMO_CSV} not found")
+    raw = pd.read_csv(DEMO_CSV, usecols=["t", "bpm", "uc"]).to_numpy()[:1500].copy()
+    raw[420:424, 1] = np.nan     # короткий пропуск — интерполяция
+    raw[700:720, 1] = 0.0        # длинная аномалия — дольше limit заполнения
+    raw[1010, 1] = 250.0         # одиночный выброс
+    return raw
+
+
+def _same(a, b) -> bool:
+    if a is None or b is None or (isinstance(a, float) and math.isnan(a)):
+        return (a is None or math.isnan(a)) and (b is None or math.isnan(b))
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def test_push_matches_extract_features(record):
+    """push() по одному отсчёту даёт те же признаки, что и полный пересчёт окна."""
+    stream, full = CTGFeatureBuilder(P), CTGFeatureBuilder(P)
+    n = stream._stream.n
+    # первое окно, сразу после пропусков и аномалии, после периодического resync
+    check = {n - 1, n, 425, 430, 719, 735, 1011, 2 * n + 1, len(record) - 1}
+    seen = 0
+    for i, sample in enumerate(record):
+        got = stream.push(*sample)
+        if i < n - 1:
+            assert got is None
+            continue
+        if i not in check:
+            continue
+        t, bpm, uc = preprocess_signals(*record[i - n + 1:i + 1].T)
+        expected = full.extract_features(pd.DataFrame({"t": t, "bpm": bpm, "uc": uc}))
+        assert got.keys() == expected.keys()
+        bad = {k: (got[k], expected[k]) for k in expected if not _same(got[k], expected[k])}
+        assert not bad, f"window ending at {i}: {bad}"
+        seen += 1
+    assert seen == len(check)
+
+
+def test_reset_starts_a_new_window(record):
+    builder = CTGFeatureBuilder(P)
+    n = builder._stream.n
+    for sample in record[:n]:
+        builder.push(*sample)
+    builder.reset()
+    assert all(builder.push(*s) is None for s in record[n:2 * n - 1])
+    assert builder.push(*record[2 * n - 1]) is not None